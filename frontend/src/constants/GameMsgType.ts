@@ -4,6 +4,7 @@ export enum GameMsgType {
 
   MAZE = "maze",
   UPDATE_POS = "update_pos",
+  POS_CORRECTION = "pos_correction",
   SET_NAME = "set_name",
 
   ACCEPT_CONNECTION = "accept_connection",
@@ -44,6 +44,7 @@ export function useGameNetworkHandler(
   onFinishMaze: (username: string, place: number, timeMs: number) => void,
   onEndGame: (gameResults: { username: string; timeMs: number }[]) => void,
   onRestartGame: () => void,
+  onPosCorrection: (pos: Vector2) => void,
   posUpdateRate: number = 25,
 ): {
   otherPlayers: PlayerInfo[];
@@ -55,6 +56,8 @@ export function useGameNetworkHandler(
     [localPlayer.position],
   );
   const lastSentPos = useRef<Vector2>(ZERO_VEC);
+  const canvasSizeRef = useRef(canvasSize);
+  canvasSizeRef.current = canvasSize;
   const [otherPlayers, setOtherPlayers] = useState<PlayerInfo[]>([]);
   const playerIndexByName = useCallback(
     (name: string) => otherPlayers.findIndex((p) => p.username == name),
@@ -111,6 +114,23 @@ export function useGameNetworkHandler(
       if (posList) updatePlayerPos(posList);
     });
 
+    // the server cut a position of the local player short (too fast, or through a wall)
+    onMessage(callerId, GameMsgType.POS_CORRECTION, (msg) => {
+      const correctedPos = parseVector2(msg.data);
+      if (!correctedPos)
+        return console.error(
+          "useNetworkHandler: Invalid format for posCorrection message",
+          msg,
+        );
+
+      const pos = {
+        x: correctedPos.x * canvasSizeRef.current.width,
+        y: correctedPos.y * canvasSizeRef.current.height,
+      } as Vector2;
+      lastSentPos.current = pos;
+      onPosCorrection(pos);
+    });
+
     onMessage(callerId, GameMsgType.PLAYER_CONNECTED, (msg) => {
       const newPlayer = parsePlayerInfo(msg.data);
       if (!newPlayer) return;
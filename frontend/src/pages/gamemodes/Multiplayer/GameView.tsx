@@ -107,6 +107,7 @@ function GameView({
     onPlayerFinishMaze,
     onEndGame,
     onRestartGame,
+    (pos: Vector2) => setLocalPlayer((lp) => ({ ...lp, position: pos })),
   );
   const allPlayersReady = useMemo(
     () => isReady && !otherPlayers.find((p) => !p.isReady),
@@ -0,0 +1,81 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+import numpy as np
+
+import server_config
+
+if TYPE_CHECKING:
+    from Structures.PlayerPositions import PlayerPositions
+
+# views of the positions of a room - what a recipient of the position broadcast gets
+# FULL_VIEW: every player at the full rate, FAR_VIEW: every player at the far rate (the spectators of a large room),
+# a bucket id: the bucket of the recipient - players in the buckets around it at the full rate, the rest at the far rate
+FULL_VIEW = "full"
+FAR_VIEW = "far"
+SPECTATOR_VIEWS = {"full": FULL_VIEW, "decimated": FAR_VIEW} # server_config.AOI_SPECTATOR_VIEW -> view
+View = str | int
+
+# the id (y * grid_size + x) of the bucket of the interest grid of every normalized position
+# positions outside the maze count as in the nearest bucket
+def buckets_of_positions(xy: np.ndarray, grid_size: int = server_config.AOI_GRID_SIZE) -> np.ndarray:
+    cells = np.clip(np.floor(xy * grid_size).astype(np.int64), 0, grid_size - 1)
+    return cells[:, 1] * grid_size + cells[:, 0]
+
+# (buckets, buckets) table of whether two buckets are near - at most radius buckets apart on both axes
+def near_buckets_table(grid_size: int, radius: int) -> np.ndarray:
+    x, y = np.arange(grid_size * grid_size) % grid_size, np.arange(grid_size * grid_size) // grid_size
+    return (np.abs(x[:, None] - x[None, :]) <= radius) & (np.abs(y[:, None] - y[None, :]) <= radius)
+
+NEAR_BUCKETS = near_buckets_table(server_config.AOI_GRID_SIZE, server_config.AOI_RADIUS_BUCKETS)
+
+# the [index, x, y] snapshot rows a view sees - live rows of the players it sees at the full rate, far rows of the rest
+def view_rows(view: View, live_rows: np.ndarray, far_rows: np.ndarray, buckets: np.ndarray) -> np.ndarray:
+    if view == FULL_VIEW: return live_rows
+    return np.where(NEAR_BUCKETS[view, buckets][:, None], live_rows, far_rows)
+
+class AreaOfInterest:
+    """
+    Interest management of the position broadcast of a large room. Players are bucketed into a grid over the maze
+    every tick; each recipient gets the players in the buckets around their own at the full rate, and everyone else
+    at the far rate - a player's position goes to the far recipients every far_interval ticks (on a tick picked by
+    their index, so the far updates of a room are spread over the ticks). Recipients in the same bucket share a view,
+    so a tick builds one message per occupied bucket rather than one per recipient.
+    The far state lives in PlayerPositions.far_rows, so both the UPDATE_POS and the POS_SNAPSHOT broadcasts use it.
+    """
+    def __init__(self, far_interval: int = server_config.AOI_FAR_INTERVAL_TICKS):
+        self.far_interval = far_interval
+        self.tick_count = 0
+        self.buckets = np.zeros(0, dtype=np.int64) # the bucket of every row of the last tick
+
+    # advance the far state by a tick in which the players of the moved rows moved
+    # returns: the rows whose far update goes out this tick (they moved since their last one)
+    def begin_tick(self, positions: PlayerPositions, moved: np.ndarray) -> np.ndarray:
+        due = (self.tick_count + positions.indices) % self.far_interval == 0
+        self.tick_count += 1
+        positions.far_dirty |= moved
+        far_sent = due & positions.far_dirty
+        positions.far_rows[far_sent] = positions.snapshot_rows[far_sent]
+        positions.far_dirty[far_sent] = False
+        self.buckets = buckets_of_positions(positions.xy)
+        return far_sent
+
+    # a tick of a room that sends every position at the full rate - what everyone got is the far state
+    # returns: the rows whose far update goes out this tick (none)
+    def skip_tick(self, positions: PlayerPositions) -> np.ndarray:
+        positions.far_rows[:] = positions.snapshot_rows
+        positions.far_dirty[:] = False
+        return np.zeros(len(positions), dtype=bool)
+
+    # the view of the recipient of every row - the bucket they are in
+    def views_of(self) -> list[View]:
+        return self.buckets.tolist()
+
+    # the rows each view gets in the UPDATE_POS of this tick - view -> rows
+    def rows_to_send(self, views: set[View], moved: np.ndarray, far_sent: np.ndarray) -> dict[View, np.ndarray]:
+        rows = {FULL_VIEW: np.flatnonzero(moved)} if FULL_VIEW in views else {}
+        bucket_views = [view for view in views if not isinstance(view, str)]
+        if len(bucket_views):
+            # the near rows of every bucket view at once - (views, rows)
+            selected = (NEAR_BUCKETS[np.ix_(bucket_views, self.buckets)] & moved) | far_sent
+            rows.update((view, np.flatnonzero(selected[i])) for i, view in enumerate(bucket_views))
+        return rows
@@ -0,0 +1,95 @@
+# asyncio variant of the game server
+# accepting connections, handshakes, request dispatch and room game loops
+# all run as coroutines on a single event loop instead of a thread each
+import asyncio
+from ClientInfo import ClientInfo
+from ProtocolHelpers.AsyncEncryptedSocket import AsyncEncryptedSocket
+from server import Server
+import server_config
+import protocol
+from protocol import ResponseCode, build_response
+
+class AsyncServer(Server):
+    def __init__(self):
+        super().__init__()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.tcp_server: asyncio.Server | None = None
+        self.scheduler_task: asyncio.Task | None = None
+        self.spectator_scheduler_task: asyncio.Task | None = None
+
+    def start_server(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.key_provider.start()
+        self.maze_pool.start()
+        self.scheduler_task = self.loop.create_task(self.scheduler.run_async())
+        self.spectator_scheduler_task = self.loop.create_task(self.spectator_scheduler.run_async())
+        if self.udp_channel: await self.udp_channel.start_async()
+        self.tcp_server = await asyncio.start_server(
+            self.init_connection,
+            server_config.IP_ADDR,
+            server_config.PORT,
+            backlog=server_config.BACKLOG,
+            reuse_address=True,
+        )
+        print(f"Server listening on {server_config.IP_ADDR}:{server_config.PORT} (asyncio)")
+        async with self.tcp_server:
+            await self.tcp_server.serve_forever()
+
+    def close(self):
+        if self.tcp_server:
+            self.tcp_server.close()
+        if self.udp_channel: self.udp_channel.close()
+
+    # initialize the connection with a client - "handshake" before connection
+    async def init_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        remote_addr = writer.get_extra_info("peername")
+        print("accepted connection from", remote_addr)
+
+        # Step 1 - Handshake
+        secure_sock = AsyncEncryptedSocket(reader, writer, self.key_provider, self.ticket_manager)
+
+        print(f"Starting handshake with {remote_addr}")
+        if not await secure_sock.execute_server_handshake():
+            print(f"Handshake with {remote_addr} failed. Aborting connection.")
+            secure_sock.close()
+            return
+        print(f"Succesfully finished handshake with {remote_addr}!")
+
+        new_client = None
+        if secure_sock.resumed_session:
+            new_client = ClientInfo(secure_sock, remote_addr, secure_sock.resumed_session.account_data)
+            new_client.set_features(secure_sock.resumed_session.features)
+            self.finish_connection(new_client, True)
+            return
+
+        try:
+            while new_client == None:
+                rec_text = await secure_sock.recv_str()
+                if not rec_text:
+                    secure_sock.close()
+                    print(f"Client {remote_addr} disconnected abruptly.")
+                    return
+
+                req_type, req_data = protocol.parse_request(rec_text)
+                if not req_type: raise Exception(f"Invalid request for init - {rec_text}")
+
+                # database access blocks - keep it off the event loop
+                acc_data, error_text = await asyncio.to_thread(self.handle_auth_request, req_type, req_data)
+                if not acc_data:
+                    secure_sock.send_str(build_response(ResponseCode.ERROR, req_type, error_text))
+                    continue
+
+                new_client = ClientInfo(secure_sock, remote_addr, acc_data)
+                new_client.set_features(req_data.get("features"))
+                new_client.send(build_response(ResponseCode.SUCCESS, req_type, "Connected Successfully"))
+        except Exception as e:
+            import traceback
+            print(f"Handshake failed for {remote_addr}:", e)
+            traceback.print_exc()
+            secure_sock.close()
+            return
+
+        self.finish_connection(new_client, False)
@@ -0,0 +1,73 @@
+# Outbound bandwidth of the position broadcast of a large room, with and without the area of interest
+# Every player sits in a random room of the maze and moves every tick; the bytes queued to all the players are counted
+# over a second of ticks, for clients on UPDATE_POS json and on binary POS_SNAPSHOT deltas (acking every snapshot).
+# run from the game_server folder: python -m Benchmarks.aoi_bench
+import time
+import numpy as np
+from Benchmarks.bench_helpers import create_bench_room
+from Benchmarks.tick_bench import BenchClient
+from GameRoom import GameRoom
+from Player import Player, RoomClientRole
+
+import server_config
+
+PLAYER_COUNTS = [16, 100, 256]
+NUM_TICKS = 30 # a second of the game loop
+
+class CountingClient(BenchClient):
+    def __init__(self, account_id: int, binary_positions: bool):
+        super().__init__(account_id)
+        self.binary_positions = binary_positions
+        self.sent_bytes = 0
+
+    def send_position(self, message: str, frame: bytes | None = None):
+        self.sent_bytes += len(message)
+
+def create_room(num_players: int, binary_positions: bool) -> GameRoom:
+    room = create_bench_room(num_players)
+    for account_id in range(num_players):
+        player = Player(CountingClient(account_id, binary_positions), RoomClientRole.PLAYER)
+        room.players.append(player)
+        room.player_positions.add(player.username)
+        player.index = room.player_positions.index_of(player.username)
+    return room
+
+# returns: (bytes sent per second, send_positions time per tick in us)
+def bench(num_players: int, binary_positions: bool, area_of_interest: bool) -> tuple[int, float]:
+    server_config.AOI_MIN_PLAYERS = num_players - 1 if area_of_interest else num_players
+    room = create_room(num_players, binary_positions)
+    rng = np.random.default_rng(0)
+    positions = room.player_positions
+    max_room = (room.stored_maze.width - 1) // 2
+    positions.xy[:] = (rng.integers(0, max_room + 1, (num_players, 2)) * 2 + 0.5) * room.cell_scale
+    start = 0.
+    for tick in range(NUM_TICKS * 2):
+        if tick == NUM_TICKS: # the first second warms up the far state and the acks
+            for player in room.players: player.client_info.sent_bytes = 0
+            start = time.perf_counter()
+        positions.xy += rng.uniform(-0.1, 0.1, positions.xy.shape) * room.cell_scale
+        positions.snapshot_rows[:, 1:] = np.rint(np.clip(positions.xy, 0., 1.) * 0xFFFF)
+        positions.moved[:] = True
+        room.dirty_pos_dict = dict.fromkeys(positions.usernames)
+        room.send_positions()
+        for player in room.players:
+            if player.snapshot_views: # the client acks the snapshot it got
+                player.acked_snapshot = max(player.snapshot_views)
+                player.acked_view = player.snapshot_views.pop(player.acked_snapshot)
+    send_us = (time.perf_counter() - start) / NUM_TICKS * 1e6
+    return sum(p.client_info.sent_bytes for p in room.players), send_us
+
+def main():
+    min_players = server_config.AOI_MIN_PLAYERS
+    for binary_positions in (False, True):
+        for num_players in PLAYER_COUNTS:
+            everyone_bytes, everyone_us = bench(num_players, binary_positions, False)
+            aoi_bytes, aoi_us = bench(num_players, binary_positions, True)
+            print(f"{'snapshots' if binary_positions else 'json':>9} {num_players:4} players   "
+                  f"everyone {everyone_bytes / 1e6:7.2f} MB/s {everyone_us:8.0f} us/tick   "
+                  f"area of interest {aoi_bytes / 1e6:7.2f} MB/s {aoi_us:8.0f} us/tick   "
+                  f"({everyone_bytes / aoi_bytes:4.1f}x less)")
+    server_config.AOI_MIN_PLAYERS = min_players
+
+if __name__ == "__main__":
+    main()
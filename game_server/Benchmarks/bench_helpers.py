@@ -0,0 +1,20 @@
+# What the benchmarks (and the tests that play the same scenes) share: the checks they run before measuring, and a
+# server that only has what a GameRoom needs of it
+from types import SimpleNamespace
+from GameRoom import GameRoom
+from MazeGen.MazePool import MazePool
+
+# a check of a benchmark - a failed one stops it, before it measures anything
+def check(condition: bool, description: str):
+    print(f"  {'ok  ' if condition else 'FAIL'} {description}")
+    if not condition: raise RuntimeError(f"Check failed: {description}")
+
+# a server whose schedulers never tick the rooms - the caller ticks them
+def fake_server() -> SimpleNamespace:
+    scheduler = SimpleNamespace(add=lambda room: None, wake=lambda room: None, remove=lambda room: None)
+    return SimpleNamespace(maze_pool=MazePool(depth=0), scheduler=scheduler, spectator_scheduler=scheduler,
+                           remove_room_by_id=lambda room_id: True)
+
+# a room of a fake server (see fake_server)
+def create_bench_room(capacity: int, room_class: type[GameRoom] = GameRoom) -> GameRoom:
+    return room_class(fake_server(), "bench", capacity, None)
@@ -0,0 +1,79 @@
+# Microbenchmark of the per-message AES-GCM path
+# Compares the original per-message cipher construction + random nonce with
+# the cached cipher/counter nonce engine and the encrypt_into framing path.
+# run from the game_server folder: python -m Benchmarks.crypto_bench
+import json
+import os
+import time
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from ProtocolHelpers.GameCryptoEngine import NONCE_NUM_BYTES, GameCryptoEngine
+from ProtocolHelpers.PacketFramer import HEADER_SIZE, PacketFramer
+from protocol import NETWORK_ENCODING
+
+NUM_ROUNDS = 5 # report the best round to filter out scheduler noise
+BYTES_PER_ROUND = 50_000_000
+
+# a typical position broadcast of a full room
+POSITIONS_MESSAGE = json.dumps({
+    "msgType": "update_pos",
+    "source": "SERVER",
+    "data": {f"player{i}": {"x": 0.123456789 * i, "y": 0.987654321 / (i + 1)} for i in range(10)},
+})
+# a maze message of a big grid
+MAZE_MESSAGE = json.dumps({
+    "msgType": "maze",
+    "source": "SERVER",
+    "data": [[(x * y) % 2 for x in range(301)] for y in range(301)],
+})
+
+# the original implementation - a new cipher object and os.urandom() for every message
+def legacy_encrypt_frame(aes_key: bytes, msg_str: str) -> bytes:
+    aesgcm = AESGCM(aes_key)
+    nonce = os.urandom(NONCE_NUM_BYTES)
+    ciphertext = aesgcm.encrypt(nonce, msg_str.encode(NETWORK_ENCODING), None)
+    return PacketFramer.frame_payload(nonce + ciphertext)
+
+def legacy_decrypt(aes_key: bytes, payload: bytes) -> str:
+    aesgcm = AESGCM(aes_key)
+    return aesgcm.decrypt(payload[:NONCE_NUM_BYTES], payload[NONCE_NUM_BYTES:], None).decode(NETWORK_ENCODING)
+
+def measure(name: str, func, num_messages: int) -> float:
+    best_elapsed = float("inf")
+    for _ in range(NUM_ROUNDS):
+        start = time.perf_counter()
+        for _ in range(num_messages):
+            func()
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+    rate = num_messages / best_elapsed
+    print(f"  {name:<40} {rate:>12,.0f} msgs/sec")
+    return rate
+
+def bench_message(msg_str: str):
+    aes_key = AESGCM.generate_key(bit_length=256)
+    engine = GameCryptoEngine()
+    engine.set_session_key(aes_key)
+    framer = PacketFramer()
+    num_messages = max(100, min(100_000, BYTES_PER_ROUND // len(msg_str)))
+
+    def encrypt_into_frame():
+        plain_bytes = msg_str.encode(NETWORK_ENCODING)
+        frame = framer.frame_buffer(GameCryptoEngine.encrypted_size(len(plain_bytes)))
+        engine.encrypt_into(plain_bytes, frame[HEADER_SIZE:])
+
+    print(f"-- {num_messages:,} messages of {len(msg_str):,} bytes")
+    before = measure("encrypt before: new AESGCM + urandom", lambda: legacy_encrypt_frame(aes_key, msg_str), num_messages)
+    cached = measure("encrypt after: cached AESGCM + counter", lambda: PacketFramer.frame_payload(engine.encrypt_message(msg_str)), num_messages)
+    into = measure("encrypt after: encrypt_into frame", encrypt_into_frame, num_messages)
+    print(f"  encrypt speedup: {max(cached, into) / before:.2f}x")
+
+    payload = engine.encrypt_message(msg_str)
+    before = measure("decrypt before: new AESGCM", lambda: legacy_decrypt(aes_key, payload), num_messages)
+    after = measure("decrypt after: cached AESGCM", lambda: engine.decrypt_message(payload), num_messages)
+    print(f"  decrypt speedup: {after / before:.2f}x")
+
+def main():
+    bench_message(POSITIONS_MESSAGE)
+    bench_message(MAZE_MESSAGE)
+
+if __name__ == "__main__":
+    main()
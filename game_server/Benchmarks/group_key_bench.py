@@ -0,0 +1,113 @@
+# Cost of a room broadcast encrypted per member vs sealed once under the room group key
+# Checks that a broadcast of a room reaches every member with the key as the same frame, that members open it with
+# the key of its key id, and that the key is replaced when a member leaves. Then measures the encryption work of
+# a broadcast for growing rooms - every member's writer encrypting the message under their session key, or the room
+# sealing it once.
+# run from the game_server folder: python -m Benchmarks.group_key_bench
+import base64
+import json
+import time
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from Benchmarks.bench_helpers import check, create_bench_room
+from Benchmarks.tick_bench import BenchClient
+from Player import Player, RoomClientRole
+from ProtocolHelpers.GameCryptoEngine import NONCE_NUM_BYTES, GameCryptoEngine
+from ProtocolHelpers.PacketFramer import HEADER_SIZE, PacketFramer
+from ProtocolHelpers.RoomGroupKey import GROUP_KEY_ID_NUM_BYTES, GROUP_NONCE_MARKER, RoomGroupKey
+from protocol import MsgType, build_network_msg
+
+ROOM_SIZES = [10, 100]
+NUM_ROUNDS = 5 # report the best round
+NUM_BROADCASTS = 2000
+
+# a position broadcast of a full room
+POSITIONS_MESSAGE = build_network_msg(None, MsgType.UPDATE_POS, {f"player{i}": {"x": 0.123456789 * i, "y": 0.987654321 / (i + 1)} for i in range(10)})
+
+class RecordingClient(BenchClient):
+    def __init__(self, account_id: int, room_group_key: bool):
+        super().__init__(account_id)
+        self.room_group_key = room_group_key
+        self.sent: list[str | bytes] = []
+
+    def send(self, message: str | bytes, droppable: bool = False):
+        self.sent.append(message)
+
+    def unsubscribe_receive(self, cb_id) -> bool: return True
+    def unsubscribe_disconnect(self, cb_id) -> bool: return True
+    def unsubscribe_position(self, cb_id) -> bool: return True
+    def set_room(self, room): pass
+    def to_string(self) -> str: return self.username
+
+# the client end - opens the frames sealed under the room keys it was sent
+def open_frame(client: RecordingClient, frame: bytes) -> str:
+    keys = {msg["data"]["keyId"]: base64.b64decode(msg["data"]["key"]) for msg in map(json.loads, filter(lambda m: isinstance(m, str), client.sent))
+            if msg["msgType"] == MsgType.ROOM_KEY.value}
+    nonce, ciphertext = frame[HEADER_SIZE:HEADER_SIZE + NONCE_NUM_BYTES], frame[HEADER_SIZE + NONCE_NUM_BYTES:]
+    if nonce[:1] != GROUP_NONCE_MARKER: raise RuntimeError("Not a group frame")
+    key_id = int.from_bytes(nonce[1:1 + GROUP_KEY_ID_NUM_BYTES], "big")
+    return AESGCM(keys[key_id]).decrypt(nonce, ciphertext, None).decode()
+
+def check_room():
+    room = create_bench_room(4)
+    players = [Player(RecordingClient(account_id, True), RoomClientRole.PLAYER) for account_id in range(3)]
+    plain = Player(RecordingClient(3, False), RoomClientRole.PLAYER)
+    for player in players + [plain]:
+        room.on_player_connect(player)
+
+    room.send_broadcast(POSITIONS_MESSAGE)
+    frames = [p.client_info.sent[-1] for p in players]
+    check(all(frame is frames[0] for frame in frames), "every member gets the same frame")
+    check(all(open_frame(p.client_info, frame) == POSITIONS_MESSAGE for p, frame in zip(players, frames)), "members open it with the room key")
+    check(plain.client_info.sent[-1] == POSITIONS_MESSAGE, "players without the feature get the message")
+
+    old_key = room.group_key
+    room.on_client_disconnect(players[0])
+    room.send_broadcast(POSITIONS_MESSAGE)
+    check(room.group_key.key_id != old_key.key_id, "the key is replaced when a member leaves")
+    check(all(open_frame(p.client_info, p.client_info.sent[-1]) == POSITIONS_MESSAGE for p in players[1:]), "the others open broadcasts under the new key")
+    try:
+        open_frame(players[0].client_info, players[1].client_info.sent[-1])
+        left_reads = True
+    except KeyError: left_reads = False
+    check(not left_reads, "the member who left doesn't have the new key")
+
+def measure(func) -> float:
+    best_elapsed = float("inf")
+    for _ in range(NUM_ROUNDS):
+        start = time.perf_counter()
+        for _ in range(NUM_BROADCASTS):
+            func()
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+    return best_elapsed / NUM_BROADCASTS * 1e6
+
+def bench(room_size: int, message: str):
+    engines = []
+    for _ in range(room_size):
+        engine = GameCryptoEngine()
+        engine.set_session_key(AESGCM.generate_key(bit_length=256))
+        engines.append(engine)
+    group_key = RoomGroupKey()
+    queue = []
+
+    def per_member(): # EncryptedSocket.send_str of every member's writer
+        plain_bytes = message.encode()
+        for engine in engines:
+            queue.append(PacketFramer.frame_payload(engine.encrypt_message_bytes(plain_bytes)))
+        queue.clear()
+    def sealed_once():
+        frame = group_key.seal(message)
+        for _ in engines:
+            queue.append(frame)
+        queue.clear()
+
+    per_member_us, sealed_us = measure(per_member), measure(sealed_once)
+    print(f"{room_size:5} members, {len(message):5} B broadcast   per member {per_member_us:8.1f} us   "
+          f"sealed once {sealed_us:6.1f} us   ({per_member_us / sealed_us:5.1f}x less)")
+
+def main():
+    check_room()
+    for room_size in ROOM_SIZES:
+        bench(room_size, POSITIONS_MESSAGE)
+
+if __name__ == "__main__":
+    main()
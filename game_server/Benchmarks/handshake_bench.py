@@ -0,0 +1,125 @@
+# Connection setup latency of the encrypted handshake
+# Measures the time from accepting a connection until the AES session is established, per key mode:
+# - fresh:    RSA keygen on every connection (the original behavior)
+# - pool:     RSA keys taken from the background key pool
+# - x25519:   persistent RSA identity key with the negotiated ephemeral X25519 exchange
+# (under the identity key, a client answering RSA-OAEP with a key of its own is refused - checked before the x25519 run)
+# run from the game_server folder: python -m Benchmarks.handshake_bench
+import os
+import socket
+import stat
+import statistics
+import struct
+import tempfile
+import threading
+import time
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, x25519
+from ProtocolHelpers.EncryptedSocket import EncryptedSocket
+from ProtocolHelpers.GameCryptoEngine import X25519_HELLO_MAGIC, X25519_KEY_NUM_BYTES, derive_x25519_session_key, x25519_signature_padding
+from ProtocolHelpers.HandshakeKeyPool import FreshKeyProvider, HandshakeKeyPool, IdentityKeyProvider
+
+NUM_CONNECTIONS = 200
+NUM_FRESH_CONNECTIONS = 30 # fresh keygen is slow - keep the run short
+CONNECTION_INTERVAL_SEC = 0.05 # arrival rate of the simulated clients
+
+def recv_frame(sock: socket.socket) -> bytes:
+    def recv_exact(num_bytes: int) -> bytes:
+        data = b""
+        while len(data) < num_bytes:
+            chunk = sock.recv(num_bytes - len(data))
+            if not chunk: raise ConnectionError("Server closed the connection")
+            data += chunk
+        return data
+    msg_len = struct.unpack("!I", recv_exact(4))[0]
+    return recv_exact(msg_len)
+
+def send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(struct.pack("!I", len(payload)) + payload)
+
+# client side of the RSA handshake (what the Electron proxy does)
+def rsa_client_handshake(sock: socket.socket) -> bytes:
+    server_key = serialization.load_pem_public_key(recv_frame(sock))
+    aes_key = os.urandom(32)
+    send_frame(sock, server_key.encrypt(aes_key, padding.OAEP(
+        mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)))
+    return aes_key
+
+# client side of the negotiated X25519 handshake
+def x25519_client_handshake(sock: socket.socket) -> bytes:
+    server_key = serialization.load_pem_public_key(recv_frame(sock))
+    eph_key = x25519.X25519PrivateKey.generate()
+    client_pub = eph_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    send_frame(sock, X25519_HELLO_MAGIC + client_pub)
+
+    reply = recv_frame(sock)
+    server_pub, signature = reply[:X25519_KEY_NUM_BYTES], reply[X25519_KEY_NUM_BYTES:]
+    server_key.verify(signature, client_pub + server_pub, x25519_signature_padding(), hashes.SHA256())
+    shared_secret = eph_key.exchange(x25519.X25519PublicKey.from_public_bytes(server_pub))
+    return derive_x25519_session_key(shared_secret, client_pub, server_pub)
+
+def measure_connection(key_provider, client_handshake) -> float:
+    server_sock, client_sock = socket.socketpair()
+    client_result = {}
+    client_thread = threading.Thread(target=lambda: client_result.setdefault("key", client_handshake(client_sock)))
+
+    start = time.perf_counter()
+    client_thread.start()
+    secure_sock = EncryptedSocket(server_sock, key_provider)
+    if not secure_sock.execute_server_handshake():
+        raise RuntimeError("Handshake failed")
+    client_thread.join()
+    elapsed = time.perf_counter() - start
+
+    if client_result["key"] != secure_sock.crypto_engine.aes_key:
+        raise RuntimeError("Client and server derived different session keys")
+    server_sock.close()
+    client_sock.close()
+    return elapsed
+
+# a client picking the session key can't complete a handshake under the identity key, and the key file is private
+def check_identity(identity: IdentityKeyProvider):
+    server_sock, client_sock = socket.socketpair()
+    client_thread = threading.Thread(target=rsa_client_handshake, args=[client_sock])
+    client_thread.start()
+    refused = not EncryptedSocket(server_sock, identity).execute_server_handshake()
+    client_thread.join()
+    server_sock.close()
+    client_sock.close()
+    private = stat.S_IMODE(os.stat(identity.key_file).st_mode) == 0o600
+    print(f"identity   client-chosen RSA session key refused: {refused}   key file readable by the owner only: {private}")
+    if not (refused and private): raise RuntimeError("Identity key check failed")
+
+def bench_mode(name: str, key_provider, client_handshake, num_connections: int):
+    key_provider.start()
+    latencies_ms = []
+    for _ in range(num_connections):
+        latencies_ms.append(measure_connection(key_provider, client_handshake) * 1000)
+        time.sleep(CONNECTION_INTERVAL_SEC)
+
+    latencies_ms.sort()
+    p50 = statistics.median(latencies_ms)
+    p99 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.99))]
+    extra = ""
+    if isinstance(key_provider, HandshakeKeyPool):
+        stats = key_provider.get_stats()
+        extra = f"  (pool hits {stats['hits']}, misses {stats['misses']})"
+    print(f"{name:<10} {num_connections:>5} conns   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms{extra}")
+
+def main():
+    print(f"one connection every {CONNECTION_INTERVAL_SEC * 1000:.0f} ms")
+    bench_mode("fresh", FreshKeyProvider(), rsa_client_handshake, NUM_FRESH_CONNECTIONS)
+
+    pool = HandshakeKeyPool()
+    pool.start()
+    time.sleep(2) # let the pool fill up, as it would while the server is idle
+    bench_mode("pool", pool, rsa_client_handshake, NUM_CONNECTIONS)
+
+    with tempfile.TemporaryDirectory() as key_dir:
+        identity = IdentityKeyProvider(os.path.join(key_dir, "identity_key.pem"))
+        identity.start()
+        check_identity(identity)
+        bench_mode("x25519", identity, x25519_client_handshake, NUM_CONNECTIONS)
+
+if __name__ == "__main__":
+    main()
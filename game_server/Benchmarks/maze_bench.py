@@ -0,0 +1,65 @@
+# Maze generation benchmark of every maze algorithm for growing grid sizes
+# Reports cells/sec (best of NUM_ROUNDS) and the peak memory of a generation (tracemalloc, measured on a separate run),
+# checks that a seed always generates the same maze, and measures Eller's algorithm streaming the rows
+# of a very large maze without keeping the grid.
+# run from the game_server folder: python -m Benchmarks.maze_bench
+import time
+import tracemalloc
+import numpy as np
+from MazeGen.EllerGenerator import eller_rows
+from MazeGen.MazeAlgorithm import MazeAlgorithm
+from MazeGen.MazeGenerator import generate_maze
+
+SIZES = [28, 201, 1001, 2001]
+# largest size to run per algorithm - Wilson's random walks get slow on big mazes
+MAX_SIZES = {MazeAlgorithm.WILSON: 1001}
+NUM_ROUNDS = 3 # report the best round to filter out scheduler noise
+STREAM_SIZE = (10001, 2001) # (width, height) of the streamed Eller maze
+
+def measure_time(algorithm: MazeAlgorithm, size: int) -> float:
+    best_elapsed = float("inf")
+    for seed in range(NUM_ROUNDS):
+        start = time.perf_counter()
+        generate_maze(size, size, algorithm, seed)
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+    return best_elapsed
+
+def measure_peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_stream():
+    width, height = STREAM_SIZE
+    rooms_w, rooms_h = (width + 1) // 2, (height + 1) // 2
+    def stream():
+        num_passages = 0
+        for row in eller_rows(rooms_w, rooms_h, np.random.default_rng(0)):
+            num_passages += int(row.sum())
+        return num_passages
+
+    start = time.perf_counter()
+    stream()
+    elapsed = time.perf_counter() - start
+    peak = measure_peak_memory(stream)
+    num_cells = width * height
+    print(f"ELLER streamed {width}x{height}: {elapsed * 1000:,.0f} ms   {num_cells / elapsed:>12,.0f} cells/sec"
+          f"   peak {peak / 2**20:8.2f} MiB (the grid alone would take {num_cells / 2**20:,.0f} MiB)")
+
+def main():
+    for algorithm in MazeAlgorithm:
+        same = np.array_equal(generate_maze(301, 301, algorithm, 1234).grid, generate_maze(301, 301, algorithm, 1234).grid)
+        print(f"-- {algorithm.value} (same seed, same maze: {same})")
+        for size in SIZES:
+            if size > MAX_SIZES.get(algorithm, size): continue
+            elapsed = measure_time(algorithm, size)
+            peak = measure_peak_memory(lambda: generate_maze(size, size, algorithm, 0))
+            num_cells = (size | 1) ** 2
+            print(f"  {size:>5}x{size:<5} {elapsed * 1000:10.2f} ms   {num_cells / elapsed:>12,.0f} cells/sec   peak {peak / 2**20:8.2f} MiB")
+    bench_stream()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Cost of handling room requests on the tick, through the room's command queue
+# Checks that requests sent by members from several threads change the room only on its tick, in the order each member
+# sent them, that a joining player is seated by the tick, and that a member who leaves is back in the lobby right away.
+# Then measures a request posted to the queue and run by the tick, against handling it on the receive thread.
+# run from the game_server folder: python -m Benchmarks.room_queue_bench
+import threading
+import time
+from Benchmarks.bench_helpers import check, create_bench_room
+from Benchmarks.tick_bench import BenchClient
+from EventBus import EventBus
+from GameRoom import GameRoom
+from Player import Player
+from protocol import MsgType, build_network_msg, parse_request
+
+NUM_THREADS = 4
+REQUESTS_PER_THREAD = 2000
+NUM_REQUESTS = 100_000
+
+# a connection whose events are emitted by the bench
+class QueueClient(BenchClient):
+    def __init__(self, account_id: int):
+        super().__init__(account_id)
+        self.event_bus = EventBus()
+        self.curr_room = None
+        self.resumable = False
+        self.sent: list[str | bytes] = []
+
+    def send(self, message: str | bytes, droppable: bool = False):
+        self.sent.append(message)
+
+    def on_receive(self, cb_id, recv_cb): self.event_bus.subscribe("receive", cb_id, recv_cb)
+    def on_disconnect(self, cb_id, disconnect_cb): self.event_bus.subscribe("disconnect", cb_id, disconnect_cb)
+    def on_position(self, cb_id, position_cb): self.event_bus.subscribe("position", cb_id, position_cb)
+    def unsubscribe_receive(self, cb_id) -> bool: return self.event_bus.unsubscribe("receive", cb_id)
+    def unsubscribe_disconnect(self, cb_id) -> bool: return self.event_bus.unsubscribe("disconnect", cb_id)
+    def unsubscribe_position(self, cb_id) -> bool: return self.event_bus.unsubscribe("position", cb_id)
+    def set_room(self, room): self.curr_room = None if room == None else room.id
+    def to_string(self) -> str: return self.username
+
+    def receive(self, message: str):
+        self.event_bus.emit("receive", self, message)
+
+# records the requests it fulfills - (thread, sender, request data)
+class RecordingRoom(GameRoom):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.fulfilled: list[tuple[int, Player, object]] = []
+
+    def fulfill_request(self, sender, req_type, req_data):
+        self.fulfilled.append((threading.get_ident(), sender, req_data))
+        return super().fulfill_request(sender, req_type, req_data)
+
+def message_types(client: QueueClient) -> list[str]:
+    return [message.split('"msgType": "')[1].split('"')[0] for message in client.sent if isinstance(message, str)]
+
+def check_room():
+    room = create_bench_room(NUM_THREADS, RecordingRoom)
+    clients = [QueueClient(account_id) for account_id in range(NUM_THREADS)]
+    for client in clients:
+        room.add_client(client)
+    check(len(room.players) == 0 and all(c.curr_room == room.id for c in clients), "joining players are routed to the room before they're seated")
+    room.tick()
+    check(len(room.players) == NUM_THREADS and all(MsgType.JOIN_ROOM.value in message_types(c) for c in clients), "the tick seats them")
+
+    # every thread sends SET_READY True, False, True, ...
+    def send_requests(client: QueueClient):
+        for i in range(REQUESTS_PER_THREAD):
+            client.receive(build_network_msg(None, MsgType.SET_READY, i % 2 == 0))
+    threads = [threading.Thread(target=send_requests, args=[client]) for client in clients[1:]]
+    for thread in threads: thread.start()
+    send_requests(clients[0])
+    for thread in threads: thread.join()
+    check(len(room.fulfilled) == 0, "requests don't touch the room before the tick")
+    room.tick()
+    check(len(room.fulfilled) == NUM_THREADS * REQUESTS_PER_THREAD, "the tick handles all of them")
+    check(all(thread == threading.get_ident() for thread, _, _ in room.fulfilled), "on the thread of the tick")
+    check(all([data for _, sender, data in room.fulfilled if sender.client_info is client] == [i % 2 == 0 for i in range(REQUESTS_PER_THREAD)]
+              for client in clients), "in the order each player sent them")
+    check(all(p.isReady == (REQUESTS_PER_THREAD % 2 == 1) for p in room.players), "the last request of each player is the one that counts")
+
+    leaver = clients[0]
+    leaver.receive(build_network_msg(None, MsgType.LEAVE_ROOM))
+    check(leaver.curr_room == None and message_types(leaver)[-2:] == [MsgType.LEAVE_ROOM.value, "response"], "a player who leaves is in the lobby right away")
+    leaver.receive(build_network_msg(None, MsgType.SET_READY, True))
+    room.tick()
+    check(len(room.players) == NUM_THREADS - 1, "the tick gives up their seat")
+    check(room.fulfilled[-1][1].client_info is leaver and room.fulfilled[-1][2] == None, "what they send next doesn't reach the room")
+
+def bench():
+    room = create_bench_room(2, RecordingRoom)
+    client = QueueClient(0)
+    room.add_client(client)
+    room.tick()
+    message = build_network_msg(None, MsgType.SET_READY, True)
+
+    room.handle_request(room.players[0], MsgType.SET_READY, True) # warm up
+    start = time.perf_counter()
+    for _ in range(NUM_REQUESTS):
+        room.on_receive_message(room.players[0], message)
+        room.run_commands()
+    queued_us = (time.perf_counter() - start) / NUM_REQUESTS * 1e6
+    start = time.perf_counter()
+    for _ in range(NUM_REQUESTS):
+        room.handle_request(room.players[0], *parse_request(message))
+    direct_us = (time.perf_counter() - start) / NUM_REQUESTS * 1e6
+    print(f"request handled on the receive thread {direct_us:6.2f} us   posted and run by the tick {queued_us:6.2f} us")
+
+def main():
+    check_room()
+    bench()
+
+if __name__ == "__main__":
+    main()
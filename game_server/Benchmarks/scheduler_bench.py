@@ -0,0 +1,66 @@
+# Tick rate of rooms driven by the RoomScheduler while they are woken up often
+# Rooms whose players keep sending (positions, requests) wake the scheduler on every message, while every tick clears
+# what was waiting. Checks that such a room ticks at the full tick rate - not once per wake - that a room with nothing
+# to handle drops to the idle rate once IDLE_AFTER_SEC passed, and that waking an idle room brings the full rate back.
+# run from the game_server folder: python -m Benchmarks.scheduler_bench
+import threading
+import time
+import uuid
+from Benchmarks.bench_helpers import check
+from GameRoom import GAME_LOOP_RATE
+from RoomScheduler import RoomScheduler
+import server_config
+
+WAKE_RATE = 240 # 4 players sending positions at 60 Hz
+RUN_SEC = 2.
+
+# a room whose tick handles everything that was waiting - it's idle right after every tick
+class WokenRoom:
+    def __init__(self):
+        self.id = uuid.uuid4()
+        self.name = "bench"
+        self.is_idle = True
+        self.ticks: list[float] = []
+
+    def tick(self):
+        self.ticks.append(time.perf_counter())
+
+def ticks_between(room: WokenRoom, start: float, end: float) -> int:
+    return sum(start <= t < end for t in room.ticks)
+
+def main():
+    scheduler = RoomScheduler()
+    scheduler.start()
+    room = WokenRoom()
+    scheduler.add(room)
+
+    start = time.perf_counter()
+    def wake_loop():
+        while time.perf_counter() - start < RUN_SEC:
+            scheduler.wake(room)
+            time.sleep(1 / WAKE_RATE)
+    waker = threading.Thread(target=wake_loop)
+    waker.start()
+    waker.join()
+    woken_rate = ticks_between(room, start, start + RUN_SEC) / RUN_SEC
+    print(f"woken {WAKE_RATE} times a second: {woken_rate:.1f} ticks per second (tick rate {GAME_LOOP_RATE})")
+    check(woken_rate <= GAME_LOOP_RATE * 1.1, "wakes don't add ticks")
+    check(woken_rate >= GAME_LOOP_RATE * 0.9, "a busy room ticks at the full rate")
+
+    time.sleep(server_config.IDLE_AFTER_SEC + 0.5)
+    quiet_start = time.perf_counter()
+    time.sleep(RUN_SEC)
+    idle_rate = ticks_between(room, quiet_start, quiet_start + RUN_SEC) / RUN_SEC
+    print(f"nothing to handle: {idle_rate:.1f} ticks per second (idle tick rate {server_config.IDLE_TICK_RATE})")
+    check(idle_rate <= server_config.IDLE_TICK_RATE * 1.5, "a quiet room drops to the idle rate")
+
+    woken_at = time.perf_counter()
+    scheduler.wake(room)
+    time.sleep(0.2)
+    first_tick = next(t for t in room.ticks if t >= woken_at)
+    print(f"first tick after waking an idle room: {(first_tick - woken_at) * 1000:.1f} ms")
+    check(first_tick - woken_at <= 1 / GAME_LOOP_RATE + server_config.SCHEDULER_SLOT_SEC, "within a tick interval")
+    scheduler.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# Cost of handing a connection to another process, and what spreading rooms over processes buys
+# Checks that a session handed over a ShardChannel continues where it stopped - the bytes the client already sent come
+# along and the nonce counter carries on - and measures a handoff (detach, send over the channel, continue the session).
+# Then ticks a number of busy rooms in a single process and spread over worker processes (the game loops of a single
+# process share its GIL - more processes only help with more cores).
+# run from the game_server folder: python -m Benchmarks.shard_bench
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import struct
+import time
+import numpy as np
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from Benchmarks.bench_helpers import check
+from Benchmarks.tick_bench import create_room
+from ProtocolHelpers.EncryptedSocket import EncryptedSocket
+from ProtocolHelpers.GameCryptoEngine import NONCE_NUM_BYTES, SERVER_NONCE_PREFIX
+from ProtocolHelpers.PacketFramer import HEADER_SIZE
+from ProtocolHelpers.ShardChannel import ShardChannel
+from protocol import MsgType, build_network_msg
+
+NUM_HANDOFFS = 500
+NUM_ROOMS = 8
+PLAYERS_PER_ROOM = 100
+TICK_SECONDS = 3.
+PROCESS_COUNTS = [1, 2, 4]
+
+# the client end of a connection - frames under the session key
+class BenchPeer:
+    def __init__(self, sock: socket.socket, key: bytes):
+        self.sock = sock
+        self.aesgcm = AESGCM(key)
+
+    def send(self, *messages: str):
+        data = b""
+        for message in messages:
+            nonce = os.urandom(NONCE_NUM_BYTES)
+            payload = nonce + self.aesgcm.encrypt(nonce, message.encode(), None)
+            data += struct.pack("!I", len(payload)) + payload
+        self.sock.sendall(data)
+
+    # returns (nonce, message)
+    def recv(self) -> tuple[bytes, str]:
+        def recv_exact(num_bytes: int) -> bytes:
+            data = b""
+            while len(data) < num_bytes:
+                data += self.sock.recv(num_bytes - len(data))
+            return data
+        payload = recv_exact(struct.unpack("!I", recv_exact(HEADER_SIZE))[0])
+        return payload[:NONCE_NUM_BYTES], self.aesgcm.decrypt(payload[:NONCE_NUM_BYTES], payload[NONCE_NUM_BYTES:], None).decode()
+
+# a connection with an established session - (the client end, the server end)
+def connect(listener: socket.socket, key: bytes) -> tuple[BenchPeer, EncryptedSocket]:
+    client_sock = socket.create_connection(listener.getsockname())
+    server_sock, _ = listener.accept()
+    secure_sock = EncryptedSocket(server_sock)
+    secure_sock.crypto_engine.set_session_key(key)
+    return BenchPeer(client_sock, key), secure_sock
+
+# hand a session to the other end of a channel - the "worker" continues it on its own descriptor
+def hand_off(secure_sock: EncryptedSocket, front_door: ShardChannel, worker: ShardChannel) -> EncryptedSocket:
+    fd, session = secure_sock.detach()
+    front_door.send({"op": "handoff", "client": {"socket": session}}, fd)
+    os.close(fd)
+    message, received_fd = worker.recv()
+    return EncryptedSocket.from_session(socket.socket(fileno=received_fd), message["client"]["socket"])
+
+def check_handoff(listener: socket.socket):
+    front_door, worker_sock = ShardChannel.pair()
+    worker = ShardChannel(worker_sock)
+    key = AESGCM.generate_key(bit_length=256)
+    client, secure_sock = connect(listener, key)
+
+    first, second = build_network_msg(None, MsgType.JOIN_ROOM, {"id": "room"}), build_network_msg(None, MsgType.SET_READY, True)
+    secure_sock.send_str(first)
+    client.send(first, second) # a request and the next one, in a single write
+    check(secure_sock.recv_str() == first, "the front door reads the request")
+    continued = hand_off(secure_sock, front_door, worker)
+    check(continued.recv_str() == second, "the worker reads the request sent after it")
+    continued.send_str(second)
+    (nonce1, msg1), (nonce2, msg2) = client.recv(), client.recv()
+    check(msg1 == first and msg2 == second, "the client opens the messages of both processes")
+    check(nonce1 == SERVER_NONCE_PREFIX + (0).to_bytes(8, "big") and nonce2 == SERVER_NONCE_PREFIX + (1).to_bytes(8, "big"),
+          "the worker continues the nonce counter")
+    continued.close()
+    client.sock.close()
+    front_door.close()
+    worker.close()
+
+def bench_handoff(listener: socket.socket):
+    front_door, worker_sock = ShardChannel.pair()
+    worker = ShardChannel(worker_sock)
+    key = AESGCM.generate_key(bit_length=256)
+    client, secure_sock = connect(listener, key)
+    start = time.perf_counter()
+    for _ in range(NUM_HANDOFFS):
+        secure_sock = hand_off(secure_sock, front_door, worker) # back and forth over the same channel
+    elapsed = time.perf_counter() - start
+    print(f"handoff of a session (detach, send over the channel, continue): {elapsed / NUM_HANDOFFS * 1e6:.1f} us")
+    secure_sock.close()
+    client.sock.close()
+
+# tick rooms of moving players for TICK_SECONDS - returns the number of ticks
+def tick_rooms(num_rooms: int) -> int:
+    with contextlib.redirect_stdout(io.StringIO()): # the players who start on the finish cell
+        rooms = [create_room(PLAYERS_PER_ROOM) for _ in range(num_rooms)]
+    rng = np.random.default_rng(0)
+    ticks = 0
+    end = time.perf_counter() + TICK_SECONDS
+    while time.perf_counter() < end:
+        for room in rooms:
+            positions = room.player_positions
+            positions.pending_xy[:] = positions.xy + rng.uniform(-0.1, 0.1, positions.xy.shape) * room.cell_scale
+            positions.pending_ms[:] = positions.accepted_ms + 1000 // 30
+            positions.has_pending[:] = True
+            room.tick()
+            ticks += 1
+    return ticks
+
+def bench_processes(num_processes: int):
+    rooms_per_process = [NUM_ROOMS // num_processes + (i < NUM_ROOMS % num_processes) for i in range(num_processes)]
+    with multiprocessing.get_context("spawn").Pool(num_processes) as pool:
+        ticks = sum(pool.map(tick_rooms, rooms_per_process))
+    print(f"{NUM_ROOMS} rooms of {PLAYERS_PER_ROOM} players on {num_processes} process(es): {ticks / TICK_SECONDS:8.0f} room ticks per second")
+
+def main():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        check_handoff(listener)
+        bench_handoff(listener)
+    print(f"cores: {os.cpu_count()}")
+    for num_processes in PROCESS_COUNTS:
+        bench_processes(num_processes)
+
+if __name__ == "__main__":
+    main()
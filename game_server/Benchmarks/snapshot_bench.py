@@ -0,0 +1,70 @@
+# Bandwidth and encode cost of a tick of position updates of a full room
+# Compares the UPDATE_POS json (username -> position of every player who moved) with binary POS_SNAPSHOT messages,
+# as a full snapshot and as a delta from the snapshot before, when every player moves and when a few do.
+# The encode cost of snapshots includes taking the snapshot of the room (the quantized rows are kept by PlayerPositions).
+# run from the game_server folder: python -m Benchmarks.snapshot_bench
+import base64
+import time
+import numpy as np
+from PositionSnapshots import SNAPSHOT_ENTRY, SNAPSHOT_HEADER, PositionSnapshots, dequantize_positions, quantize_positions
+from protocol import MsgType, build_network_msg
+from Structures.Vector2 import Vector2
+
+ROOM_SIZES = [10, 100]
+NUM_ROUNDS = 2000
+
+def time_per_call_us(func, rounds: int = NUM_ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+# decode a POS_SNAPSHOT payload - (seq, base, indices, normalized positions)
+def decode_snapshot(payload: str) -> tuple[int, int, np.ndarray, np.ndarray]:
+    raw = base64.b64decode(payload)
+    seq, base = SNAPSHOT_HEADER.unpack_from(raw)
+    entries = np.frombuffer(raw, dtype=SNAPSHOT_ENTRY, offset=SNAPSHOT_HEADER.size)
+    return seq, base, entries["index"], dequantize_positions(np.stack((entries["x"], entries["y"]), axis=1))
+
+def bench(num_players: int, num_moving: int):
+    rng = np.random.default_rng(0)
+    usernames = [f"player_{i:03}" for i in range(num_players)]
+    indices = np.arange(num_players)
+    before = rng.uniform(0.1, 0.9, (num_players, 2))
+    xy = before.copy()
+    xy[:num_moving] += rng.uniform(-0.01, 0.01, (num_moving, 2))
+    snapshots = PositionSnapshots()
+
+    dirty = {usernames[i]: Vector2(x, y) for i, (x, y) in enumerate(xy[:num_moving].tolist())}
+    json_msg = build_network_msg(None, MsgType.UPDATE_POS, dirty)
+    json_us = time_per_call_us(lambda: build_network_msg(None, MsgType.UPDATE_POS, dirty))
+
+    # the moving players go back and forth, every client acked the snapshot before
+    ticks = [np.column_stack((indices, quantize_positions(tick))).astype(np.uint16) for tick in (before, xy)]
+    def encode_tick():
+        base = snapshots.seq
+        snapshots.take(ticks[(snapshots.seq + 1) % 2])
+        return snapshots.get_msg(base)
+    snapshots.take(ticks[0])
+    delta_msg = encode_tick()
+    binary_us = time_per_call_us(encode_tick)
+    if snapshots.seq % 2 == 0: encode_tick() # end on xy
+    base = snapshots.seq - 1
+    full_msg = snapshots.get_msg(None)
+
+    # the delta carries exactly the players who moved, within the quantization step
+    _, decoded_base, decoded_indices, decoded_xy = decode_snapshot(snapshots.encode(base))
+    if decoded_base != base or decoded_indices.tolist() != list(range(num_moving)) or np.abs(decoded_xy - xy[:num_moving]).max() > 1 / 65535:
+        raise RuntimeError("Decoded snapshot doesn't match the positions")
+
+    print(f"{num_players:>4} players, {num_moving:>3} moving   json {len(json_msg):6} B {json_us:7.1f} us   "
+          f"snapshot delta {len(delta_msg):5} B {binary_us:6.1f} us   full {len(full_msg):5} B   "
+          f"({len(json_msg) / len(delta_msg):4.1f}x smaller)")
+
+def main():
+    for num_players in ROOM_SIZES:
+        for num_moving in (num_players, max(1, num_players // 4)):
+            bench(num_players, num_moving)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Cost of spectators to the game loop of a room, and of their fan-out
+# A room of players who all move every tick is watched by a growing number of spectators (half of them on UPDATE_POS
+# json, half on binary POS_SNAPSHOT deltas, acking every snapshot). Measures the whole tick of the room (sends go nowhere),
+# a fan-out to every spectator, and how many distinct position payloads a fan-out builds - then the position bytes a
+# spectator gets per second through each spectator view (AOI_SPECTATOR_VIEW).
+# run from the game_server folder: python -m Benchmarks.spectator_bench
+import time
+import numpy as np
+from Benchmarks.bench_helpers import create_bench_room
+from Benchmarks.tick_bench import BenchClient
+from AreaOfInterest import SPECTATOR_VIEWS
+from GameRoom import GameRoom
+from Player import Player, RoomClientRole
+
+NUM_PLAYERS = 100
+SPECTATOR_COUNTS = [0, 100, 1000, 5000]
+NUM_TICKS = 200
+TICKS_PER_FANOUT = 3 # a fan-out at 10 Hz for every 3 ticks of the game loop at 30 Hz
+TICK_RATE = 30
+
+class PayloadClient(BenchClient):
+    def __init__(self, account_id: int, binary_positions: bool, payloads: set[int]):
+        super().__init__(account_id)
+        self.binary_positions = binary_positions
+        self.payloads = payloads
+        self.num_bytes = 0
+
+    def send_position(self, message: str, frame: bytes | None = None):
+        self.payloads.add(id(message))
+        self.num_bytes += len(message)
+
+def create_room(num_spectators: int, payloads: set[int]) -> GameRoom:
+    room = create_bench_room(NUM_PLAYERS)
+    for account_id in range(NUM_PLAYERS):
+        player = Player(BenchClient(account_id), RoomClientRole.PLAYER)
+        room.players.append(player)
+        room.player_positions.add(player.username)
+        player.index = room.player_positions.index_of(player.username)
+    for account_id in range(NUM_PLAYERS, NUM_PLAYERS + num_spectators):
+        room.spectator_fanout.add(Player(PayloadClient(account_id, account_id % 2 == 0, payloads), RoomClientRole.SPECTATOR))
+    room.start_game()
+    room.start_countdown()
+    return room
+
+# report: print the tick and fan-out times
+def bench(num_spectators: int, spectator_view: str = "full", report: bool = True) -> GameRoom:
+    payloads: set[int] = set()
+    room = create_room(num_spectators, payloads)
+    room.spectator_view = SPECTATOR_VIEWS[spectator_view]
+    rng = np.random.default_rng(0)
+    positions = room.player_positions
+    max_room = (room.stored_maze.width - 3) // 2
+    positions.xy[:] = (rng.integers(0, max_room, (NUM_PLAYERS, 2)) * 2 + 0.5) * room.cell_scale
+    fanout = room.spectator_fanout
+    tick_us, fanout_us, payload_counts = [], [], []
+    for tick in range(NUM_TICKS):
+        positions.pending_xy[:] = positions.xy + rng.uniform(-0.1, 0.1, positions.xy.shape) * room.cell_scale
+        positions.pending_ms[:] = positions.accepted_ms + 1000 // 30
+        positions.has_pending[:] = True
+        start = time.perf_counter()
+        room.tick()
+        tick_us.append((time.perf_counter() - start) * 1e6)
+        if tick % TICKS_PER_FANOUT == 0:
+            payloads.clear()
+            start = time.perf_counter()
+            fanout.tick()
+            fanout_us.append((time.perf_counter() - start) * 1e6)
+            payload_counts.append(len(payloads))
+            for spectator in fanout.spectators:
+                if spectator.binary_positions: spectator.acked_snapshot = fanout.snapshots.seq
+    if report:
+        print(f"{num_spectators:5} spectators   tick of the room median {np.median(tick_us):7.1f} us   "
+              f"fan-out median {np.median(fanout_us):8.1f} us   position payloads per fan-out {int(np.median(payload_counts))}")
+    return room
+
+def main():
+    print(f"{NUM_PLAYERS} players moving every tick")
+    for num_spectators in SPECTATOR_COUNTS:
+        bench(num_spectators)
+    for spectator_view in SPECTATOR_VIEWS:
+        spectators = bench(2, spectator_view, False).spectator_fanout.spectators
+        rates = {("binary" if s.binary_positions else "json"): s.client_info.num_bytes * TICK_RATE / NUM_TICKS for s in spectators}
+        print(f"spectator view {spectator_view:9}   position bytes per second to a spectator: "
+              f"json {rates['json'] / 1024:6.1f} KiB   binary {rates['binary'] / 1024:6.1f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Game loop cost of a room for growing player counts
+# Shows the finish scan the game loop used to run every tick (a pos_is_on_cell per player, then a scan of the game results
+# per finisher) next to the batched validation of the moves of every player (speed, walls and finish check),
+# and measures a whole tick with every player moving (validation, position broadcast and ranking - sends go nowhere).
+# run from the game_server folder: python -m Benchmarks.tick_bench
+import time
+from types import SimpleNamespace
+import numpy as np
+from Benchmarks.bench_helpers import create_bench_room
+from GameRoom import GameRoom
+from MazeGen.MazeFormat import MazeFormat
+from Player import Player, RoomClientRole
+from Structures.Vector2 import Vector2
+from helpers import get_time_ms
+
+PLAYER_COUNTS = [10, 100, 1000]
+FINISHED_FRACTION = 0.1 # players who already finished - the old check scanned their results for every finisher
+NUM_TICKS = 200
+
+class BenchClient:
+    def __init__(self, account_id: int):
+        self.username = f"player{account_id}"
+        self.account_data = SimpleNamespace(account_id=account_id, register_finish_game=lambda game_id: None)
+        self.maze_format = MazeFormat.Grid
+        self.binary_positions = False
+        self.room_group_key = False
+        self.last_recv_time_ms = get_time_ms()
+
+    def send(self, message: str | bytes, droppable: bool = False):
+        pass
+
+    def send_position(self, message: str, frame: bytes | None = None):
+        pass
+
+    def take_pending_position(self):
+        return None # positions are queued straight into the room
+
+def create_room(num_players: int) -> GameRoom:
+    room = create_bench_room(num_players)
+    for account_id in range(num_players):
+        player = Player(BenchClient(account_id), RoomClientRole.PLAYER)
+        room.players.append(player)
+        room.player_positions.add(player.username)
+    room.start_game()
+
+    room.start_countdown()
+
+    # a part of the players stand on the finish cell and already finished
+    left, top = room.finish_rect[:2]
+    for row, player in enumerate(room.players[:int(num_players * FINISHED_FRACTION)]):
+        room.player_positions.xy[row] = (left + room.cell_scale, top + room.cell_scale)
+        player.position = Vector2(left + room.cell_scale, top + room.cell_scale)
+        room.player_finished(player, get_time_ms())
+    return room
+
+# the finish detection of the game loop before the structure of arrays
+def legacy_new_finishers(room: GameRoom) -> list[Player]:
+    finishers = [p for p in room.players if room.pos_is_on_cell(p.position, room.finish_cell)]
+    return [x for x in finishers if all(x.account_id != y["account_id"] for y in room.game_results)]
+
+def time_per_call_us(func, rounds: int = NUM_TICKS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def bench(num_players: int):
+    room = create_room(num_players)
+    rng = np.random.default_rng(0)
+    positions = room.player_positions
+    # everyone else in a random room, away from the finish cell
+    first_racing = int(num_players * FINISHED_FRACTION)
+    max_room = (room.stored_maze.width - 3) // 2
+    rooms = rng.integers(0, max_room, (num_players - first_racing, 2))
+    positions.xy[first_racing:] = (rooms * 2 + 0.5) * room.cell_scale
+    for player, (x, y) in zip(room.players[first_racing:], positions.xy[first_racing:].tolist()):
+        player.position = Vector2(x, y)
+    if legacy_new_finishers(room):
+        raise RuntimeError("Only the players on the finish cell should have finished")
+    legacy_us = time_per_call_us(lambda: legacy_new_finishers(room))
+
+    # every racing player sends a position a tick away, a third of a cell in a random direction
+    def queue_moves():
+        angles = rng.uniform(0, 2 * np.pi, num_players - first_racing)
+        steps = np.stack((np.cos(angles), np.sin(angles)), axis=1) * room.cell_scale / 3
+        positions.pending_xy[first_racing:] = positions.xy[first_racing:] + steps
+        positions.pending_ms[first_racing:] = positions.accepted_ms[first_racing:] + 1000 // 30
+        positions.has_pending[first_racing:] = True
+    def apply_moves():
+        queue_moves()
+        room.apply_moves()
+        room.dirty_pos_dict.clear()
+    moves_us = time_per_call_us(apply_moves)
+    def tick():
+        queue_moves()
+        room.ranking_usernames = () # rank everyone, as if every player changed place
+        room.tick()
+    tick_us = time_per_call_us(tick)
+    clamps = sum(stats["wallClamps"] for stats in positions.get_stats().values())
+    print(f"{num_players:>5} players   old finish scan per tick {legacy_us:10.1f} us   "
+          f"move validation per tick {moves_us:8.1f} us   whole tick {tick_us:10.1f} us   ({clamps} moves hit a wall)")
+
+def main():
+    for num_players in PLAYER_COUNTS:
+        bench(num_players)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Localhost check of the UDP position channel
+# Opens a channel on 127.0.0.1 and plays the client over a real UDP socket: the channel must go active on a ping,
+# deliver positions, drop stale, forged and unknown datagrams, and send positions over TCP while it isn't active.
+# Then measures the round trip of a ping and the cost of sealing and opening a position datagram.
+# run from the game_server folder: python -m Benchmarks.udp_bench
+import json
+import os
+import socket
+import statistics
+import time
+from types import SimpleNamespace
+from Benchmarks.bench_helpers import check
+from ProtocolHelpers.GameCryptoEngine import SERVER_NONCE_PREFIX
+from ProtocolHelpers.UdpChannel import CLIENT_NONCE_PREFIX, UdpPositionChannel, UdpSession
+from protocol import MsgType, build_network_msg
+
+import server_config
+
+NUM_PINGS = 500
+NUM_ROUNDS = 20000
+RECV_TIMEOUT_SEC = 1.
+
+def update_pos_msg(x: float, y: float) -> bytes:
+    return json.dumps({"msgType": MsgType.UPDATE_POS.value, "data": {"x": x, "y": y}}).encode()
+
+def main():
+    channel = UdpPositionChannel("127.0.0.1", 0)
+    channel.start()
+    received: list[str] = []
+    tcp_sent: list[str] = []
+    client = SimpleNamespace(emit_udp_position=received.append)
+    session_key = os.urandom(32) # the AES key of the client's TCP session
+    server_session = channel.register(client, session_key)
+
+    # the client end - same key, directions swapped
+    client_session = UdpSession(session_key, server_session.channel_id, CLIENT_NONCE_PREFIX, SERVER_NONCE_PREFIX)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(RECV_TIMEOUT_SEC)
+    server_addr = ("127.0.0.1", channel.port)
+    def send_position(message: str): # ClientInfo.send_position
+        if not server_session.send(message): tcp_sent.append(message)
+    def wait_for(condition) -> bool:
+        deadline = time.monotonic() + RECV_TIMEOUT_SEC
+        while not condition() and time.monotonic() < deadline: time.sleep(0.001)
+        return condition()
+
+    print(f"UDP channel on 127.0.0.1:{channel.port}")
+    send_position(build_network_msg(None, MsgType.UPDATE_POS, {}))
+    check(len(tcp_sent) == 1 and not server_session.is_active, "positions go over TCP before the client is heard from")
+
+    sock.sendto(client_session.seal(build_network_msg(None, MsgType.UDP_PING).encode()), server_addr)
+    pong = client_session.open(sock.recv(2048))
+    check(pong != None and json.loads(pong)["msgType"] == MsgType.UDP_PING.value, "a ping is answered over UDP")
+    check(server_session.is_active, "the channel is active after the ping")
+
+    positions = [update_pos_msg(0.1 * i, 0.2) for i in range(5)]
+    datagrams = [client_session.seal(p) for p in positions]
+    for datagram in datagrams:
+        sock.sendto(datagram, server_addr)
+    check(wait_for(lambda: len(received) == len(positions)) and [m.encode() for m in received] == positions,
+          "positions are delivered")
+
+    sock.sendto(datagrams[2], server_addr) # replayed
+    forged = bytearray(client_session.seal(update_pos_msg(0.9, 0.9)))
+    forged[-1] ^= 1
+    sock.sendto(bytes(forged), server_addr)
+    sock.sendto(os.urandom(8) + forged[8:], server_addr) # a channel that doesn't exist
+    check(wait_for(lambda: server_session.stale_count == 1 and server_session.rejected_count == 1 and channel.unknown_count == 1),
+          "stale, forged and unknown datagrams are dropped")
+    check(len(received) == len(positions), "none of them reached the client")
+
+    send_position(build_network_msg(None, MsgType.UPDATE_POS, {"player": {"x": 0.5, "y": 0.5}}))
+    update = json.loads(client_session.open(sock.recv(2048)))
+    check(update["msgType"] == MsgType.UPDATE_POS.value and len(tcp_sent) == 1, "positions go over UDP while it's active")
+    send_position("x" * server_config.UDP_MAX_DATAGRAM_SIZE)
+    check(len(tcp_sent) == 2, "messages too big for a datagram go over TCP")
+    server_session.last_recv_time -= server_config.UDP_CHANNEL_TIMEOUT_SEC
+    send_position(build_network_msg(None, MsgType.UPDATE_POS, {}))
+    check(len(tcp_sent) == 3, "positions go back to TCP when the client goes quiet")
+
+    # ping round trips on localhost
+    ping = build_network_msg(None, MsgType.UDP_PING).encode()
+    round_trips = []
+    for _ in range(NUM_PINGS):
+        start = time.perf_counter()
+        sock.sendto(client_session.seal(ping), server_addr)
+        client_session.open(sock.recv(2048))
+        round_trips.append((time.perf_counter() - start) * 1e6)
+    round_trips.sort()
+    print(f"ping round trip   median {statistics.median(round_trips):6.1f} us   p99 {round_trips[int(len(round_trips) * 0.99)]:6.1f} us")
+
+    # seal on one end, open on the other (stale check and decryption)
+    position = update_pos_msg(0.123456, 0.654321)
+    start = time.perf_counter()
+    for _ in range(NUM_ROUNDS):
+        server_session.open(client_session.seal(position), server_addr)
+    print(f"seal + open of a position datagram ({len(client_session.seal(position))} B)   "
+          f"{(time.perf_counter() - start) / NUM_ROUNDS * 1e6:5.1f} us")
+
+    channel.unregister(server_session)
+    channel.close()
+    sock.close()
+
+if __name__ == "__main__":
+    main()
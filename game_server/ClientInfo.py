@@ -1,36 +1,174 @@
 from __future__ import annotations
+import asyncio
 import socket
 import threading
 from typing import TYPE_CHECKING, Callable
 from uuid import UUID
 from Database.AccountData import AccountData
 from EventBus import EventBus
+from helpers import get_time_ms
+from MazeGen.MazeFormat import MazeFormat
+from ProtocolHelpers.AsyncEncryptedSocket import AsyncEncryptedSocket
 from ProtocolHelpers.EncryptedSocket import EncryptedSocket
+from ProtocolHelpers.InboundLimiter import InboundLimiter, sniff_msg_type
+from ProtocolHelpers.SendQueue import SendQueue
+from ProtocolHelpers.UdpChannel import UdpSession
 import protocol
+import server_config
 
 if TYPE_CHECKING:
     from GameRoom import GameRoom
 
 RECV_EVENT_NAME = "data_received"
 DISCONNECT_EVENT_NAME = "disconnected"
+POSITION_EVENT_NAME = "position_received" # a position is waiting in pending_position
+# set an asyncio event from any thread - asyncio.Event isn't thread safe, so a thread other than the loop's (a room tick,
+# the key pool) has the loop set it
+def wake_loop(loop: asyncio.AbstractEventLoop, event: asyncio.Event):
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        event.set()
+        return
+    try:
+        loop.call_soon_threadsafe(event.set)
+    except RuntimeError: pass # the loop was closed
+
 class ClientInfo:
-    sock: EncryptedSocket
+    sock: EncryptedSocket | AsyncEncryptedSocket
 
-    def __init__(self, sock: EncryptedSocket, remote_addr: socket._RetAddress, account_data: AccountData):
+    def __init__(self, sock: EncryptedSocket | AsyncEncryptedSocket, remote_addr: socket._RetAddress, account_data: AccountData):
         self.sock = sock
         self.remote_addr = remote_addr
         self.account_data = account_data
         self.event_bus = EventBus()
         self.recv_thread = None
+        self.recv_task: asyncio.Task | None = None
+        self.send_queue = SendQueue()
+        self.send_thread = None
+        self.send_task: asyncio.Task | None = None
         self.curr_room = None # None -> lobby
+        self.resumable = False # whether the client holds a ticket to resume its session after disconnecting
+        self.features: list[str] = [] # optional protocol features the client asked for (protocol.SUPPORTED_FEATURES)
+        self.last_recv_time_ms = get_time_ms() # when the message being handled was received (ms since epoch)
+        self.inbound_limiter = InboundLimiter()
+        # the newest UPDATE_POS received in a room and not handled yet - (message, receive time in ms)
+        self.pending_position: tuple[str, int] | None = None
+        self._position_lock = threading.Lock()
+        self.udp_session: UdpSession | None = None # the UDP position channel of the client (udp_positions feature)
+        self.detached = False # the connection was handed to another process (see ShardedServer)
+        self.start_send()
+
+    # keep the features the client asked for that the server supports
+    def set_features(self, features: any):
+        if not isinstance(features, list): return
+        self.features = [f for f in protocol.SUPPORTED_FEATURES if f in features]
+
+    # the format mazes are sent to the client in
+    @property
+    def maze_format(self) -> MazeFormat:
+        if protocol.TILED_MAZE_FEATURE in self.features: return MazeFormat.Tiled
+        if protocol.PACKED_MAZE_FEATURE in self.features: return MazeFormat.Packed
+        return MazeFormat.Grid
+
+    # whether positions are sent to the client in binary snapshots
+    @property
+    def binary_positions(self) -> bool:
+        return protocol.BINARY_POSITIONS_FEATURE in self.features
+
+    # whether room broadcasts may be sent to the client sealed under the key of their room
+    @property
+    def room_group_key(self) -> bool:
+        return server_config.ROOM_GROUP_KEYS_ENABLED and protocol.ROOM_GROUP_KEY_FEATURE in self.features
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.sock, AsyncEncryptedSocket)
 
+    # start receiving messages - on a dedicated thread, or as a task on the running event loop in asyncio mode
     def start_recv(self):
-        if self.recv_thread != None: return
+        if self.recv_thread != None or self.recv_task != None: return
+        if self.is_async:
+            self.recv_task = asyncio.get_running_loop().create_task(self.async_receive_loop())
+            return
         self.recv_thread = threading.Thread(target=self.receive_loop)
         self.recv_thread.start()
 
-    def send(self, message: str):
-        return self.sock.send_str(message)
+    # start the writer that drains the outbound queue - a dedicated thread, or a task in asyncio mode
+    def start_send(self):
+        if self.send_thread != None or self.send_task != None: return
+        if self.is_async:
+            wakeup = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            self.send_queue.on_put = lambda: wake_loop(loop, wakeup)
+            self.send_task = loop.create_task(self.async_send_loop(wakeup))
+            return
+        self.send_thread = threading.Thread(target=self.send_loop)
+        self.send_thread.start()
+
+    # queue a message to the client - never blocks on the network
+    # message: a string, or a frame encrypted already (a room broadcast sealed under the room group key)
+    # droppable: the message may be dropped if the client falls behind (position updates)
+    def send(self, message: str | bytes, droppable: bool = False):
+        if not self.send_queue.put(message, droppable) and self.send_queue.stalled:
+            print(f"Client {self.to_string()} can't keep up with its outbound queue - disconnecting")
+            self.close()
+
+    # queue a position message (UPDATE_POS / POS_SNAPSHOT) - sent over the UDP channel while it's active
+    # frame: the message sealed under the room group key, sent instead of it over TCP
+    def send_position(self, message: str, frame: bytes | None = None):
+        if self.udp_session != None and self.udp_session.send(message): return
+        self.send(message if frame == None else frame, True)
+
+    # write a queued message to the socket
+    def write_message(self, message: str | bytes):
+        if isinstance(message, bytes): self.sock.send_frame(message)
+        else: self.sock.send_str(message)
+
+    def send_loop(self):
+        try:
+            while not self.send_queue.closed:
+                batch = self.send_queue.get_batch()
+                for message in batch:
+                    self.write_message(message)
+                self.send_queue.mark_sent(len(batch))
+        except Exception as e:
+            print(f"Exception occurred while sending to client {self.to_string()}:", e)
+            self.close()
+
+    async def async_send_loop(self, wakeup: asyncio.Event):
+        try:
+            while not self.send_queue.closed:
+                await wakeup.wait()
+                wakeup.clear()
+                batch = self.send_queue.get_batch_nowait()
+                for message in batch:
+                    self.write_message(message)
+                await self.sock.drain()
+                self.send_queue.mark_sent(len(batch))
+        except Exception as e:
+            print(f"Exception occurred while sending to client {self.to_string()}:", e)
+            self.close()
+
+    # stop serving the client, so its connection can be handed to another process - the receive loop stops without
+    # emitting the disconnect event, and everything queued to the client is written out first (threaded mode only)
+    # must be called on the receive thread of the client (while handling a message), or before receiving started
+    def detach(self):
+        self.detached = True
+        self.send_queue.close()
+        if self.send_thread != None and self.send_thread is not threading.current_thread():
+            self.send_thread.join()
+        batch = self.send_queue.get_batch_nowait()
+        for message in batch:
+            self.write_message(message)
+        self.send_queue.mark_sent(len(batch))
+
+    # close the connection - the receive loop then emits the disconnect event
+    def close(self):
+        self.send_queue.close()
+        self.sock.close()
 
     def on_receive(self, cb_id: UUID | None, recv_cb: Callable[[object, str], None]):
         return self.event_bus.subscribe(RECV_EVENT_NAME, cb_id, recv_cb)
@@ -38,6 +176,20 @@ class ClientInfo:
     def unsubscribe_receive(self, cb_id: UUID | None) -> bool:
         return self.event_bus.unsubscribe(RECV_EVENT_NAME, cb_id)
     
+    # callback(ClientInfo) - a position is waiting to be taken with take_pending_position
+    def on_position(self, cb_id: UUID | None, position_cb: Callable[[object], None]):
+        return self.event_bus.subscribe(POSITION_EVENT_NAME, cb_id, position_cb)
+
+    def unsubscribe_position(self, cb_id: UUID | None) -> bool:
+        return self.event_bus.unsubscribe(POSITION_EVENT_NAME, cb_id)
+
+    # the newest position received since the last call - (message, receive time in ms) | None
+    def take_pending_position(self) -> tuple[str, int] | None:
+        if self.pending_position == None: return None
+        with self._position_lock:
+            pending, self.pending_position = self.pending_position, None
+        return pending
+
     def on_disconnect(self, cb_id: UUID | None, disconnect_cb: Callable[[object], None]):
         return self.event_bus.subscribe(DISCONNECT_EVENT_NAME, cb_id, disconnect_cb)
     
@@ -46,9 +198,27 @@ class ClientInfo:
 
     def receive_loop(self):
         try:
-            while True:
+            while not self.detached:
                 recv_str = self.sock.recv_str()
                 if not recv_str or len(recv_str) == 0: break
+                self.last_recv_time_ms = get_time_ms()
+                self.emit_recv(recv_str)
+        except ConnectionError as ce:
+            print(f"ConnectionError occurred while receiving for client {self.to_string()}:", ce)
+        except Exception as e:
+            print(f"Exception occurred while receiving for client {self.to_string()}:", e)
+        finally:
+            if not self.detached: # a detached connection lives on in another process
+                print(f"Closing connection to {self.to_string()}...")
+                self.close()
+                self.emit_disconnect()
+
+    async def async_receive_loop(self):
+        try:
+            while True:
+                recv_str = await self.sock.recv_str()
+                if not recv_str or len(recv_str) == 0: break
+                self.last_recv_time_ms = get_time_ms()
                 self.emit_recv(recv_str)
         except ConnectionError as ce:
             print(f"ConnectionError occurred while receiving for client {self.to_string()}:", ce)
@@ -56,15 +226,43 @@ class ClientInfo:
             print(f"Exception occurred while receiving for client {self.to_string()}:", e)
         finally:
             print(f"Closing connection to {self.to_string()}...")
-            self.sock.close()
+            self.close()
             self.emit_disconnect()
 
+    # requests over the rate limit are dropped, and positions sent in a room wait for the room to take the newest one
     def emit_recv(self, msg):
+        msg_type = sniff_msg_type(msg)
+        if not self.inbound_limiter.allow(msg_type): return
+        if msg_type == protocol.MsgType.UPDATE_POS.value and not self.in_lobby:
+            self.set_pending_position(msg, self.last_recv_time_ms)
+            return
         self.event_bus.emit(RECV_EVENT_NAME, self, msg)
 
+    # an UPDATE_POS received over the UDP channel - positions sent in the lobby are dropped
+    def emit_udp_position(self, msg: str):
+        if not self.inbound_limiter.allow(protocol.MsgType.UPDATE_POS.value) or self.in_lobby: return
+        self.set_pending_position(msg, get_time_ms())
+
+    # keep the newest position for the room to take - the room is told when the slot fills
+    def set_pending_position(self, msg: str, recv_time_ms: int):
+        with self._position_lock:
+            replaced = self.pending_position != None
+            self.pending_position = (msg, recv_time_ms)
+        if replaced:
+            self.inbound_limiter.coalesced_count += 1
+            return
+        self.event_bus.emit(POSITION_EVENT_NAME, self)
+
     def emit_disconnect(self):
         self.event_bus.emit(DISCONNECT_EVENT_NAME, self)
 
+    def get_stats(self) -> dict:
+        return {
+            "sendQueue": self.send_queue.get_stats(),
+            "inbound": self.inbound_limiter.get_stats(),
+            "udp": None if self.udp_session == None else self.udp_session.get_stats(),
+        }
+
     def to_string(self) -> str:
         return f"[{self.account_data.username} ({self.remote_addr})]"
     
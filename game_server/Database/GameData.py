@@ -13,18 +13,28 @@ class GameResult(TypedDict):
 class MazeData(TypedDict):
     grid: list[list[CellType]]
     finish_cell: Vector2
+    seed: int | None # with the algorithm and the difficulty of the game options, regenerates the maze
+    algorithm: str | None
 
+# mazes with a seed are stored by their seed instead of their whole grid
 def dump_maze_data(md: MazeData) -> str:
+    if md.get("seed") != None:
+        return json.dumps({
+            "seed": md["seed"],
+            "algorithm": md["algorithm"],
+            "finish_cell": vector2_to_dict(md["finish_cell"])
+        })
     return json.dumps({
         "grid": md["grid"],
         "finish_cell": vector2_to_dict(md["finish_cell"])
     })
 
 # Throws if source is not valid
+# the grid of a maze stored by its seed is left empty - regenerate it from the seed
 def load_maze_data(source: str) -> MazeData:
     d = json.loads(source)
     finish_cell = load_vector2(d["finish_cell"])
-    return MazeData(grid=d["grid"], finish_cell=finish_cell)
+    return MazeData(grid=d.get("grid", []), finish_cell=finish_cell, seed=d.get("seed"), algorithm=d.get("algorithm"))
 
 class GameData:
     game_id_str: str
@@ -41,7 +51,7 @@ class GameData:
         self.create_time = create_time
         self.game_options = game_options if game_options != None else GameOptions()
         self.start_time = start_time
-        self.maze_data = maze_data if maze_data != None else MazeData(grid=[], finish_cell=Vector2(-1, -1))
+        self.maze_data = maze_data if maze_data != None else MazeData(grid=[], finish_cell=Vector2(-1, -1), seed=None, algorithm=None)
         self.game_results = game_results if game_results != None else []
 
     @property
@@ -1,26 +1,39 @@
 from __future__ import annotations
-import threading
+from collections import deque
 import time
-from typing import TYPE_CHECKING
+import traceback
+from typing import TYPE_CHECKING, Callable
 import uuid
+import numpy as np
+from AreaOfInterest import FAR_VIEW, FULL_VIEW, SPECTATOR_VIEWS, AreaOfInterest, View
 from ClientInfo import ClientInfo
-from Database.GameData import GameData, GameResult, MazeData
+from Database.GameData import GameData, GameResult
 from MazeGen.Maze import Maze
-from MazeGen.MazeGenerator import generateDFSRectMaze
+from MazeGen.MazeFormat import MazeFormat
+from MazeGen.MazeGenerator import get_maze_data
+from MazeGen.MazeTiles import MazeTileStream
+from MoveValidation import validate_moves
+from PositionSnapshots import PositionSnapshots
+from ProtocolHelpers.RoomGroupKey import RoomGroupKey
 from Player import Player, RoomClientRole
+from SpectatorFanout import SpectatorFanout, SpectatorFrame, spectator_maze_format
 from Structures import GameOptions
+from Structures.PlayerPositions import PlayerPositions
 from Structures.Vector2 import Vector2
 from helpers import contains_whitespace, get_time_ms
 from protocol import MsgType, ResponseCode, build_network_msg, build_response, is_valid_position, parse_request
-from math import floor
+from math import floor, isfinite
 from Database.DBManagers import games_manager
+import server_config
 
 if TYPE_CHECKING:
     from server import Server
 
-ROOM_MAX_PLAYERS = 10
+ROOM_MAX_PLAYERS = 256
 ROOM_MIN_PLAYERS = 2
 GAME_LOOP_RATE = 30
+# an UPDATE_POS message is the json of the positions between these (see send_positions)
+UPDATE_POS_MSG_PREFIX, UPDATE_POS_MSG_SUFFIX = build_network_msg(None, MsgType.UPDATE_POS, {}).split("{}")
 class GameRoom:
     def __init__(self, parent_server: Server, room_name: str, capacity: int, password: str | None):
         self.parent_server = parent_server
@@ -30,20 +43,39 @@ class GameRoom:
         self.id: uuid.UUID = uuid.uuid4()
         self.players: list[Player] = []
         self.dirty_pos_dict = {}
+        self.player_positions = PlayerPositions() # row i is the position of self.players[i]
+        self.position_snapshots = PositionSnapshots() # positions sent to players with the binary_positions feature
+        self.area_of_interest = AreaOfInterest() # the position broadcast of the room once it's large
+        self.spectator_fanout = SpectatorFanout(self) # clients watching the room - they don't take seats
+        self.spectator_view: View = SPECTATOR_VIEWS[server_config.AOI_SPECTATOR_VIEW] # what the fan-out sends of a large room
+        self.spectator_frame_dirty = False # positions or standings changed since the spectators were last given a frame
+        self.group_key: RoomGroupKey | None = None # shared by the players and spectators with the room_group_key feature
+        self.tick_count = 0
+        self.finish_rect = (0., 0., 0., 0.) # normalized (left, top, right, bottom) of the finish cell
         self.game_active = False
         self.total_results = [] # {username, timeMs} - stores results of all all players who played the game (importantly, those who finished and quit)
         self.current_results = [] # {username, timeMs} - stores results of players who are currently still in the game
         self.game_data = GameData(str(self.id), self.name, get_time_ms(), GameOptions.GameOptions())
+        self.start_game_msgs: dict[MazeFormat, str] = {}
+        self.tile_streams: dict[str, MazeTileStream] = {} # username -> stream of the stored maze, for players in MazeFormat.Tiled
+        self.awaiting_start_tiles_since: float | None = None # a game waits for the start area to be delivered
+        self.ranking_usernames: tuple[str, ...] = () # the players of the last RANKING broadcast
+        self.ranking: np.ndarray = np.empty((0, 2), dtype=np.int32) # [place, distance] of each of them
+        self.commands: deque[tuple[Callable, tuple]] = deque() # (command, args) posted by other threads, run by the tick (see post)
+        self.removed = False # the room was removed from the server - it doesn't tick anymore
 
         self.generate_new_maze()
         self.running = True
-        self.game_loop_thread = threading.Thread(target=self.game_loop)
-        self.game_loop_thread.start()
+        self.parent_server.scheduler.add(self)
 
     @property
     def is_full(self):
         return len(self.players) == self.capacity
     
+    @property
+    def spectators(self) -> list[Player]:
+        return self.spectator_fanout.spectators
+
     @property
     def start_time(self) -> int:
         return self.game_data.start_time
@@ -65,18 +97,121 @@ class GameRoom:
             "name": self.name,
             "playerCount": len(self.players),
             "capacity": self.capacity,
+            "spectatorCount": len(self.spectators),
             "gameActive": self.game_active,
             "hasPassword": self.password != None and len(self.password) > 0
         }
 
+    # { moves: { [username]: { speedClamps, wallClamps, rejected } }, spectators: { count, snapshotSeq } }
+    def get_stats(self) -> dict:
+        return {
+            "moves": self.player_positions.get_stats(),
+            "spectators": self.spectator_fanout.get_stats(),
+        }
+
+    # region Commands
+    # The state of the room is only changed by its tick. The receive threads of its members and the threads of the server
+    # post commands to the room instead, and the tick runs them in the order they were posted, before it handles positions.
+    # Only the routing of a member's connection - which room (if any) gets what the client sends - is changed right away
+    # by the thread that adds or removes the member, so that whatever the client sends next reaches the right place.
+
+    # run command(*args) on the tick of the room (right away once the room was removed - nothing ticks it anymore)
+    def post(self, command: Callable, *args):
+        self.commands.append((command, args))
+        if self.removed: self.run_commands()
+        else: self.parent_server.scheduler.wake(self)
+
+    # run the commands posted before the tick started - commands posted meanwhile wait for the next tick
+    # (a removed room runs every command left)
+    def run_commands(self):
+        count = len(self.commands)
+        while count > 0 or self.removed:
+            count -= 1
+            try:
+                command, args = self.commands.popleft()
+            except IndexError: return
+            try:
+                command(*args)
+            except Exception as e:
+                print(f"Command {command.__name__} of room {self.name} failed:", e)
+                traceback.print_exc()
+
+    # subscribe the room to the events of a player's connection and move the client into the room
+    # client: the connection of the player (of a resumed session - before it replaces their old one)
+    def route_player(self, player: Player, client: ClientInfo):
+        client.on_receive(player.cb_id, lambda _, msg: self.on_receive_message(player, msg))
+        client.on_disconnect(player.cb_id, lambda _: self.on_player_disconnect(player, client))
+        client.on_position(player.cb_id, lambda _: self.on_position_received(player))
+        player.routed = True
+        client.set_room(self)
+
+    def route_spectator(self, spectator: Player):
+        client = spectator.client_info
+        client.on_receive(spectator.cb_id, lambda _, msg: self.on_spectator_message(spectator, msg))
+        client.on_disconnect(spectator.cb_id, lambda _: self.on_spectator_disconnect(spectator, client))
+        spectator.routed = True
+        client.set_room(self)
+
+    # stop the events of a member's connection from reaching the room and move the client back to the lobby
+    # returns: whether the connection was still routed to the room (only one caller gets True)
+    def unroute_member(self, member: Player, client: ClientInfo) -> bool:
+        if not client.unsubscribe_receive(member.cb_id): return False
+        client.unsubscribe_disconnect(member.cb_id)
+        client.unsubscribe_position(member.cb_id)
+        member.routed = False
+        client.set_room(None)
+        return True
+    # endregion
+
+    # the player is seated by the tick - the server checked that the room has a free seat, the tick checks again
     def add_client(self, client: ClientInfo):
-        if self.is_full or self.game_active: return
         new_player = Player(client, RoomClientRole.PLAYER)
-        new_player.send(build_network_msg(None, MsgType.JOIN_ROOM, self.get_room_info()))
-        new_player.on_receive(self.id, self.on_receive_message)
-        new_player.on_disconnect(self.id, self.on_client_disconnect)
-        new_player.set_room(self)
-        self.on_player_connect(new_player)
+        self.route_player(new_player, client)
+        self.post(self.join_player, new_player)
+
+    def join_player(self, player: Player):
+        if not player.routed: return # left before they were seated
+        if self.removed or self.is_full or self.game_active:
+            if self.unroute_member(player, player.client_info):
+                player.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+            return
+        player.send(build_network_msg(None, MsgType.JOIN_ROOM, self.get_room_info()))
+        self.on_player_connect(player)
+
+    # add a client who watches the room - spectators don't count against the capacity and can join a running game
+    def add_spectator(self, client: ClientInfo):
+        spectator = Player(client, RoomClientRole.SPECTATOR)
+        self.route_spectator(spectator)
+        self.post(self.join_spectator, spectator)
+
+    def join_spectator(self, spectator: Player):
+        if not spectator.routed: return # left before they joined
+        if self.removed or len(self.spectators) >= server_config.ROOM_MAX_SPECTATORS:
+            if self.unroute_member(spectator, spectator.client_info):
+                spectator.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+            return
+        spectator.send(build_network_msg(None, MsgType.JOIN_ROOM, self.get_room_info()))
+        self.share_group_key(spectator)
+        self.send_game_to_spectator(spectator)
+        self.spectator_fanout.add(spectator)
+        self.publish_spectator_frame()
+        self.parent_server.spectator_scheduler.add(self.spectator_fanout)
+        print(f"{spectator.to_string()} is spectating room {self.name}")
+
+    # rotate_key: replace the room group key the spectator had (the room being removed doesn't need a new one)
+    def remove_spectator(self, spectator: Player, rotate_key: bool = True):
+        if not spectator in self.spectators: return
+        self.spectator_fanout.remove(spectator)
+        if rotate_key and spectator.room_group_key: self.rotate_group_key()
+        print(f"{spectator.to_string()} stopped spectating room {self.name}")
+        if self.unroute_member(spectator, spectator.client_info): # a spectator who left or dropped is already in the lobby
+            try:
+                spectator.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+            except: pass
+
+    def on_spectator_disconnect(self, spectator: Player, client: ClientInfo):
+        if self.unroute_member(spectator, client):
+            self.post(self.remove_spectator, spectator)
 
     def find_player_by_name(self, client_name: str) -> Player | None:
         for player in self.players:
@@ -84,44 +219,166 @@ class GameRoom:
                 return player
         return None
     
-    # Generate a new maze for the room with respect to the game options
+    def find_player_by_account_id(self, account_id: int) -> Player | None:
+        return next((p for p in self.players if p.account_id == account_id), None)
+
+    # Take a new maze for the room from the server's maze pool with respect to the game options
     # (Does not send the new maze to the players)
     def generate_new_maze(self):
         self.created_at = time.time()
-        dims = GameOptions.difficultyToDims(self.game_options.difficulty)
-        self.stored_maze: Maze = generateDFSRectMaze(dims["width"], dims["height"])
+        self.stored_maze: Maze = self.parent_server.maze_pool.take(self.game_options.difficulty, self.game_options.algorithm)
+        self.maze_msgs: dict[MazeFormat, str] = {}
+        self.reset_positions()
+
+    # put every player on the start of the stored maze - where the clients spawn
+    def reset_positions(self):
+        self.player_positions.reset(self.start_pos, get_time_ms())
+        self.spectator_frame_dirty = True
+        for player in self.players:
+            player.position = Vector2(self.start_pos, self.start_pos)
+
+    # the MAZE message of the stored maze in a maze format - built once per maze and format
+    def get_maze_msg(self, maze_format: MazeFormat) -> str:
+        if not maze_format in self.maze_msgs:
+            self.maze_msgs[maze_format] = build_network_msg(None, MsgType.MAZE, self.stored_maze.get_payload(maze_format))
+        return self.maze_msgs[maze_format]
+
+    # the START_GAME message of the current game in a maze format - built once per game and format
+    def get_start_game_msg(self, maze_format: MazeFormat) -> str:
+        if not maze_format in self.start_game_msgs:
+            self.start_game_msgs[maze_format] = build_network_msg(None, MsgType.START_GAME, {
+                "maze": self.stored_maze.get_payload(maze_format),
+                "finishCell": self.finish_cell,
+                "startTime": self.start_time,
+            })
+        return self.start_game_msgs[maze_format]
 
     def on_player_connect(self, player: Player):
-        player.send(build_network_msg(None, MsgType.MAZE, self.stored_maze.get_matrix()))
+        self.share_group_key(player)
+        self.player_positions.add(player.username, self.start_pos, get_time_ms())
+        player.index = self.player_positions.index_of(player.username)
+        player.position = Vector2(self.start_pos, self.start_pos)
+        self.send_maze_msg(player, self.get_maze_msg)
         player.send(build_network_msg(None, MsgType.GAME_OPTIONS, self.game_options.get_json()))
         self.send_broadcast(build_network_msg(player, MsgType.PLAYER_CONNECTED, player.get_player_info()), player)
         for c in self.players:
             player.send(build_network_msg(None, MsgType.PLAYER_CONNECTED, c.get_player_info()))
         self.players.append(player)
+        self.spectator_frame_dirty = True
         print(f"{player.to_string()} connected to room {self.name}")
         if len(self.players) == 1: self.set_admin(player)
 
     def on_client_disconnect(self, player: Player):
         if not player in self.players: return
         self.current_results = [x for x in self.current_results if x["username"] != player.username]
-        player.unsubscribe_receive(self.id)
-        player.unsubscribe_disconnect(self.id)
-        player.set_room(None)
+        routed = self.unroute_member(player, player.client_info) # a player who left or dropped is already in the lobby
         self.players.remove(player)
+        self.player_positions.remove(player.username)
+        player.client_info.take_pending_position() # a position sent in this room must not reach the next one
+        self.tile_streams.pop(player.username, None)
+        self.spectator_frame_dirty = True
         print(f"{player.to_string()} disconnected from room {self.name}")
         if len(self.players) == 0:
             self.remove_room()
             return
+        if player.room_group_key: self.rotate_group_key()
         self.send_broadcast(build_network_msg(player, MsgType.PLAYER_DISCONNECTED))
-        try:
-            player.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
-        except: pass
+        if routed:
+            try:
+                player.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+            except: pass
         if player.role == RoomClientRole.ADMIN:
             if len(self.players) > 0: self.set_admin(self.players[0])
 
+    def on_player_disconnect(self, player: Player, client: ClientInfo):
+        if self.unroute_member(player, client):
+            self.post(self.on_connection_lost, player, client)
+
+    # the connection of a player dropped - keep their seat for a while if they can resume their session
+    def on_connection_lost(self, player: Player, client: ClientInfo):
+        if not player in self.players or client is not player.client_info: return
+        if server_config.RESUME_GRACE_SEC <= 0 or not client.resumable:
+            self.on_client_disconnect(player)
+            return
+        player.disconnected_at = time.monotonic()
+        print(f"{player.to_string()} lost connection - keeping their seat in room {self.name} for {server_config.RESUME_GRACE_SEC} seconds")
+
+    # detach a player from their current connection, before it is replaced by a resumed session
+    def release_player_connection(self, account_id: int):
+        player = self.find_player_by_account_id(account_id)
+        if not player: return
+        self.unroute_member(player, player.client_info)
+        self.post(self.hold_seat, player)
+
+    def hold_seat(self, player: Player):
+        if player.connected:
+            player.disconnected_at = time.monotonic()
+
+    # give a player's seat back to them on their resumed connection (the seat is handed over by the tick)
+    def resume_player(self, client: ClientInfo):
+        player = self.find_player_by_account_id(client.account_data.account_id)
+        if not player: return
+        self.route_player(player, client)
+        self.post(self.return_seat, player, client)
+
+    def return_seat(self, player: Player, client: ClientInfo):
+        if not player.routed: return # the resumed connection dropped too - the seat is still kept
+        if not player in self.players: # the seat expired meanwhile
+            if self.unroute_member(player, client):
+                client.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+            return
+        player.client_info = client
+        player.disconnected_at = None
+        player.acked_snapshot, player.acked_view = None, FULL_VIEW # the new connection starts from a full snapshot
+        player.snapshot_views = {}
+        self.share_group_key(player)
+        self.tile_streams.pop(player.username, None) # tiles sent on the old connection may have been lost
+        print(f"{player.to_string()} resumed their seat in room {self.name}")
+        player.send(build_network_msg(None, MsgType.JOIN_ROOM, self.get_room_info()))
+        self.send_game_to_player(player)
+        if self.game_active:
+            self.send_maze_msg(player, self.get_start_game_msg)
+
+    # remove players whose connection dropped and didn't resume in time
+    def expire_reserved_seats(self):
+        now = time.monotonic()
+        for player in [p for p in self.players if not p.connected]:
+            if now - player.disconnected_at > server_config.RESUME_GRACE_SEC:
+                self.on_client_disconnect(player)
+
+    # the players and spectators of the room who get broadcasts sealed under the room group key
+    def group_key_members(self) -> list[Player]:
+        return [m for m in self.players + self.spectators if m.room_group_key]
+
+    # give a member who joined (or resumed their seat) the room group key - before anything sealed under it is queued to them
+    def share_group_key(self, member: Player):
+        if not member.room_group_key: return
+        if self.group_key == None: self.group_key = RoomGroupKey()
+        member.send(self.group_key.key_msg)
+
+    # replace the room group key - a member who had it left (or it is worn out) - and send the new one to the members
+    # (the key is queued to them before the spectator fan-out can seal anything under it)
+    def rotate_group_key(self):
+        members = self.group_key_members()
+        group_key = RoomGroupKey() if len(members) else None
+        for member in members:
+            member.send(group_key.key_msg)
+        self.group_key = group_key
+
+    # the frame of a message sealed under the room group key, for a member who has the key (None -> send them the message)
+    # frames: the frames of the broadcast being sent - every message of it is sealed once, for all the members
+    # (called by the spectator fan-out too - it seals under the current key, only the tick replaces it)
+    def group_frame(self, member: Player, message: str, frames: dict[str, bytes]) -> bytes | None:
+        group_key = self.group_key
+        if group_key == None or not member.room_group_key: return None
+        frame = frames.get(message)
+        if frame == None:
+            frame = frames[message] = group_key.seal(message)
+        return frame
+
     # Send all the game information to a player - for when the player connects to the room, requests the information etc.
     def send_game_to_player(self, player: Player):
-        player.send(build_network_msg(None, MsgType.MAZE, self.stored_maze.get_matrix()))
+        self.send_maze_msg(player, self.get_maze_msg)
         player.send(build_network_msg(None, MsgType.GAME_OPTIONS, self.game_options.get_json()))
         for c in self.players:
             if c.username == player.username: continue
@@ -130,6 +387,20 @@ class GameRoom:
         if curr_admin:
             player.send(build_network_msg(None, MsgType.ROOM_ADMIN, curr_admin.username))
 
+    # Send all the game information to a spectator - the game they joined, whether it's running or not
+    def send_game_to_spectator(self, spectator: Player):
+        maze_format = spectator_maze_format(spectator)
+        spectator.send(self.get_start_game_msg(maze_format) if self.game_active else self.get_maze_msg(maze_format))
+        spectator.send(build_network_msg(None, MsgType.GAME_OPTIONS, self.game_options.get_json()))
+        for c in self.players:
+            spectator.send(build_network_msg(None, MsgType.PLAYER_CONNECTED, c.get_player_info()))
+        curr_admin = self.get_admin()
+        if curr_admin:
+            spectator.send(build_network_msg(None, MsgType.ROOM_ADMIN, curr_admin.username))
+        if self.game_active:
+            for result in self.total_results:
+                spectator.send(build_network_msg(None, MsgType.PLAYER_FINISHED, result))
+
     # update the admin of the room
     def set_admin(self, player: Player):
         for p in self.players:
@@ -140,13 +411,60 @@ class GameRoom:
     def get_admin(self) -> Player:
         return next((p for p in self.players if p.role == RoomClientRole.ADMIN), None)
     
+    # messages are parsed by the receive thread of the sender and handled by the tick
     def on_receive_message(self, sender: Player, msg_str: str):
-        if not sender in self.players: return
         req_type, req_data = parse_request(msg_str)
-        if req_type:
-            res_code, res_data = self.fulfill_request(sender, req_type, req_data)
-            if res_code == None: return
-            sender.send(build_response(res_code, req_type, res_data))
+        if not req_type: return
+        if req_type == MsgType.LEAVE_ROOM:
+            self.leave_room(sender, self.handle_request)
+            return
+        self.post(self.handle_request, sender, req_type, req_data)
+
+    def on_spectator_message(self, sender: Player, msg_str: str):
+        req_type, req_data = parse_request(msg_str)
+        if not req_type: return
+        if req_type == MsgType.LEAVE_ROOM:
+            self.leave_room(sender, self.handle_spectator_request)
+            return
+        if req_type == MsgType.POS_SNAPSHOT_ACK: # only read by the spectator fan-out, which doesn't run on the tick
+            self.fulfill_spectator_request(sender, req_type, req_data)
+            return
+        self.post(self.handle_spectator_request, sender, req_type, req_data)
+
+    # a member asked to leave the room - they're back in the lobby right away, so what they send next is a lobby request,
+    # and their place in the room is given up on the tick
+    # handle: the request handler of the member's role
+    def leave_room(self, member: Player, handle: Callable[[Player, MsgType, dict | None], None]):
+        if not self.unroute_member(member, member.client_info): return
+        member.send(build_network_msg(None, MsgType.LEAVE_ROOM, None))
+        member.send(build_response(ResponseCode.SUCCESS, MsgType.LEAVE_ROOM, None))
+        self.post(handle, member, MsgType.LEAVE_ROOM, None)
+
+    def handle_request(self, sender: Player, req_type: MsgType, req_data: dict | None):
+        if not sender in self.players: return
+        res_code, res_data = self.fulfill_request(sender, req_type, req_data)
+        if res_code == None: return
+        sender.send(build_response(res_code, req_type, res_data))
+
+    def handle_spectator_request(self, sender: Player, req_type: MsgType, req_data: dict | None):
+        if not sender in self.spectators: return
+        res_code, res_data = self.fulfill_spectator_request(sender, req_type, req_data)
+        if res_code == None: return
+        sender.send(build_response(res_code, req_type, res_data))
+
+    def fulfill_spectator_request(self, sender: Player, req_type: MsgType, req_data: dict | None) -> tuple[ResponseCode | None, dict | None]:
+        match req_type:
+            case MsgType.PLAYER_CONNECTED:
+                self.send_game_to_spectator(sender)
+            case MsgType.LEAVE_ROOM: # answered when the spectator left (see leave_room)
+                self.remove_spectator(sender)
+            case MsgType.POS_SNAPSHOT_ACK:
+                seq = req_data.get("seq") if isinstance(req_data, dict) else None
+                if self.spectator_fanout.snapshots.is_valid_ack(seq) and (sender.acked_snapshot == None or seq > sender.acked_snapshot):
+                    sender.acked_snapshot = seq
+            case _:
+                return ResponseCode.ERROR, "Spectators can only watch the game"
+        return None, None
 
     def fulfill_request(self, sender: Player, req_type: MsgType, req_data: dict | None) -> tuple[ResponseCode | None, dict | None]:
         bc_msg = self.generate_broadcast(req_type, req_data)
@@ -154,19 +472,19 @@ class GameRoom:
             bc_type, bc_data, exclude_sender = bc_msg
             exclude = None
             if exclude_sender: exclude = sender
-            threading.Thread(target=self.send_broadcast, args=[build_network_msg(sender, bc_type, bc_data), exclude]).start()
+            self.send_broadcast(build_network_msg(sender, bc_type, bc_data), exclude)
 
         match req_type:
             case MsgType.PLAYER_CONNECTED:
                 self.send_game_to_player(sender)
             case MsgType.UPDATE_POS:
                 self.update_pos(sender, req_data)
+                self.parent_server.scheduler.wake(self)
             case MsgType.SET_READY:
                 self.set_ready(sender, req_data)
                 return ResponseCode.SUCCESS, None
-            case MsgType.LEAVE_ROOM:
+            case MsgType.LEAVE_ROOM: # answered when the player left (see leave_room)
                 self.on_client_disconnect(sender)
-                return ResponseCode.SUCCESS, None
             case MsgType.START_GAME:
                 if sender.role != RoomClientRole.ADMIN:
                     return ResponseCode.ERROR, "Only an admin can start the game"
@@ -178,13 +496,35 @@ class GameRoom:
             case MsgType.GAME_OPTIONS:
                 if sender.role != RoomClientRole.ADMIN:
                     return ResponseCode.ERROR, "Only an admin can set game options"
+                if self.awaiting_start_tiles_since != None:
+                    return ResponseCode.ERROR, "Can't set game options while the game is starting"
                 new_options = req_data
                 if not self.update_game_options(new_options):
                     return ResponseCode.ERROR, "Could not set game options - invalid game options"
                 return ResponseCode.SUCCESS, None
+            case MsgType.POS_SNAPSHOT_ACK:
+                seq = req_data.get("seq") if isinstance(req_data, dict) else None
+                if self.position_snapshots.is_valid_ack(seq) and seq in sender.snapshot_views \
+                        and (sender.acked_snapshot == None or seq > sender.acked_snapshot):
+                    sender.acked_snapshot, sender.acked_view = seq, sender.snapshot_views[seq]
+                    sender.snapshot_views = {s: view for s, view in sender.snapshot_views.items() if s > seq}
+            case MsgType.MAZE_TILE_ACK:
+                stream = self.tile_streams.get(sender.username)
+                if stream and stream.ack(req_data):
+                    self.parent_server.scheduler.wake(self)
+            case MsgType.MAZE_TILE_REQUEST:
+                stream = self.tile_streams.get(sender.username)
+                if not stream:
+                    return ResponseCode.ERROR, "No maze is being streamed"
+                if not stream.request(req_data):
+                    return ResponseCode.ERROR, "Invalid tile request"
+                self.parent_server.scheduler.wake(self)
+                return ResponseCode.SUCCESS, None
             case MsgType.RESTART_GAME:
                 if sender.role != RoomClientRole.ADMIN:
                     return ResponseCode.ERROR, "Only an admin can restart the game"
+                if self.awaiting_start_tiles_since != None:
+                    return ResponseCode.ERROR, "Can't restart the game while it's starting"
                 self.restart_game()
                 return ResponseCode.SUCCESS, None
         return None, None
@@ -192,28 +532,84 @@ class GameRoom:
     # can_start_game: Check if the requirements for starting a game are fulfilled
     def can_start_game(self):
         # Return whether all players are ready
-        return (not self.game_active) and len(self.players) > 1 and all(p.isReady for p in self.players)
+        return (not self.game_active) and self.awaiting_start_tiles_since == None and len(self.players) > 1 and all(p.isReady for p in self.players)
     
     # start_game: Start the game
     def start_game(self):
         # Generate maze & set finish cell
         self.generate_new_maze()
-        self.finish_cell = Vector2(self.stored_maze.width - 1, self.stored_maze.height - 1)
-        self.game_data.maze_data = MazeData(grid=self.stored_maze.get_matrix(), finish_cell=self.finish_cell)
+        self.finish_cell = self.stored_maze.finish_cell
+        self.finish_rect = self.get_cell_rect(self.finish_cell)
+        self.game_data.maze_data = get_maze_data(self.stored_maze)
+
+        # players who get the maze streamed in tiles get it first - the countdown starts once they have the start area
+        tiled_players = [p for p in self.players if p.maze_format == MazeFormat.Tiled]
+        if len(tiled_players):
+            for player in tiled_players:
+                self.send_maze_msg(player, self.get_maze_msg)
+            self.awaiting_start_tiles_since = time.monotonic()
+            return
+        self.start_countdown()
 
+    # start the countdown of a game whose maze is ready
+    def start_countdown(self):
+        self.awaiting_start_tiles_since = None
         # start_time = now + 3 seconds (in ms from epoch)
         self.game_data.start_time = get_time_ms() + (3 * 1_000)
         self.game_active = True
-        bc_msg = {
-            "maze": self.stored_maze.get_matrix(),
-            "finishCell": self.finish_cell,
-            "startTime": self.start_time,
-        }
-        self.send_broadcast(build_network_msg(None, MsgType.START_GAME, bc_msg))
-
-    def update_pos(self, sender: Player, pos: dict):
-        if is_valid_position(pos):
-            self.dirty_pos_dict[sender.username] = sender.position = Vector2(pos["x"], pos["y"])
+        self.parent_server.scheduler.wake(self)
+        self.start_game_msgs = {}
+        self.ranking_usernames = () # the first RANKING of the game has every player
+        self.reset_positions()
+        self.send_maze_broadcast(self.get_start_game_msg)
+
+    # a player sent a position - it waits in their client info until the next tick takes it
+    def on_position_received(self, player: Player):
+        self.parent_server.scheduler.wake(self)
+
+    # handle the newest position every player sent since the last tick - positions that were replaced by a newer one
+    # before the tick are never decoded
+    def take_positions(self):
+        for player in self.players:
+            pending = player.client_info.take_pending_position()
+            if pending == None: continue
+            msg_str, recv_ms = pending
+            req_type, req_data = parse_request(msg_str)
+            if req_type == MsgType.UPDATE_POS and isinstance(req_data, dict):
+                self.update_pos(player, req_data, recv_ms)
+
+    # positions are validated by the game loop, in a batch with the positions of the other players
+    # recv_ms: when the position was received (None -> the time of the message being handled)
+    def update_pos(self, sender: Player, pos: dict, recv_ms: int | None = None):
+        if not is_valid_position(pos): return
+        x, y = float(pos["x"]), float(pos["y"])
+        if not (isfinite(x) and isfinite(y)):
+            self.player_positions.reject(sender.username)
+            return
+        if recv_ms == None: recv_ms = sender.client_info.last_recv_time_ms
+        self.player_positions.set_pending(sender.username, x, y, recv_ms)
+
+    # validate the positions received since the last tick against the speed limit and the walls of the maze,
+    # and finish the players whose accepted positions reached the finish cell - timed by when they were received
+    def apply_moves(self):
+        positions = self.player_positions
+        rows, targets, recv_ms = positions.take_pending()
+        if rows.size == 0: return
+        dt_sec = (recv_ms - positions.accepted_ms[rows]) / 1000.
+        accepted, too_fast, hit_wall = validate_moves(self.stored_maze, self.cell_scale, positions.xy[rows], targets, dt_sec)
+        positions.accept(rows, accepted, recv_ms, too_fast, hit_wall)
+        for row, (x, y), corrected in zip(rows.tolist(), accepted.tolist(), (too_fast | hit_wall).tolist()):
+            player = self.players[row]
+            self.dirty_pos_dict[player.username] = player.position = Vector2(x, y)
+            # the sender's client doesn't apply its own positions from UPDATE_POS - tell it where it was stopped
+            if corrected: player.send(build_network_msg(None, MsgType.POS_CORRECTION, {"x": x, "y": y}))
+
+        if not self.game_active: return
+        left, top, right, bottom = self.finish_rect
+        on_finish = (left < accepted[:, 0]) & (accepted[:, 0] < right) & (top < accepted[:, 1]) & (accepted[:, 1] < bottom)
+        on_finish &= ~positions.finished[rows]
+        for i in np.flatnonzero(on_finish).tolist():
+            self.player_finished(self.players[rows[i]], int(recv_ms[i]))
 
     def set_ready(self, sender: ClientInfo, isReady: bool):
         if isinstance(isReady, bool):
@@ -239,15 +635,144 @@ class GameRoom:
             case _:
                 return None
 
-    def send_broadcast(self, message: str, exclude: ClientInfo | None = None):
+    # queue a message to every player in the room (sending happens on each client's writer)
+    # droppable: the message may be dropped for players who fall behind (position updates)
+    # spectators: whether the spectators get it too - with their next fan-out
+    def send_broadcast(self, message: str, exclude: ClientInfo | None = None, droppable: bool = False, spectators: bool = True):
+        if spectators: self.spectator_fanout.queue_broadcast(message)
         if len(self.players) == 0: return
-        # TODO: potentially to optimize broadcast, send it asynchronously
+        frames = {}
         for client in self.players:
             if (not exclude) or (client.username != exclude.username):
-                client.send(message)
+                frame = self.group_frame(client, message, frames)
+                client.send(message if frame == None else frame, droppable)
+
+    # whether the room sends positions by area of interest - players get the players around them at the full rate
+    # and the rest decimated (AreaOfInterest)
+    @property
+    def uses_area_of_interest(self) -> bool:
+        return len(self.players) > server_config.AOI_MIN_PLAYERS
+
+    # send the positions of the room - UPDATE_POS with the players who moved, or a POS_SNAPSHOT to players with binary_positions
+    # every view of the room (AreaOfInterest) gets a message of its own, shared by the players who see the room through it
+    def send_positions(self):
+        positions = self.player_positions
+        moved = positions.moved.copy()
+        positions.moved[:] = False
+        if not self.uses_area_of_interest:
+            far_sent = self.area_of_interest.skip_tick(positions)
+            views = [FULL_VIEW] * len(self.players)
+        else:
+            far_sent = self.area_of_interest.begin_tick(positions, moved)
+            views = self.area_of_interest.views_of()
+        sending = moved | far_sent
+        if not sending.any(): return
+        self.spectator_frame_dirty = True
+
+        frames = {} # every message is sealed once for the players with the room group key
+        # the json of every position that goes out is encoded once, the message of a view joins the ones it gets
+        # (usernames are alphanumeric - they need no escaping)
+        fragments = np.empty(len(positions), dtype=object)
+        sending_rows = np.flatnonzero(sending)
+        fragments[sending_rows] = [f'"{positions.usernames[row]}": {{"x": {x!r}, "y": {y!r}}}'
+                                   for row, (x, y) in zip(sending_rows.tolist(), positions.xy[sending_rows].tolist())]
+        json_views = {view for player, view in zip(self.players, views) if not player.binary_positions}
+        update_msgs = {view: UPDATE_POS_MSG_PREFIX + "{" + ", ".join(fragments[rows]) + "}" + UPDATE_POS_MSG_SUFFIX
+                       for view, rows in self.area_of_interest.rows_to_send(json_views, moved, far_sent).items() if rows.size}
+        for player, view in zip(self.players, views):
+            if not player.binary_positions and view in update_msgs:
+                player.send_position(update_msgs[view], self.group_frame(player, update_msgs[view], frames))
+        if not any(p.binary_positions for p in self.players): return
+
+        if self.uses_area_of_interest:
+            seq = self.position_snapshots.take(positions.snapshot_rows, positions.far_rows, self.area_of_interest.buckets)
+        else:
+            seq = self.position_snapshots.take(positions.snapshot_rows)
+        for player, view in zip(self.players, views):
+            if not player.binary_positions: continue
+            snapshot_msg = self.position_snapshots.get_msg(player.acked_snapshot, player.acked_view, view)
+            player.send_position(snapshot_msg, self.group_frame(player, snapshot_msg, frames))
+            player.snapshot_views[seq] = view
+            if len(player.snapshot_views) > self.position_snapshots.history:
+                del player.snapshot_views[next(iter(player.snapshot_views))]
+
+    # send a player a message carrying the stored maze (MAZE / START_GAME) in their maze format
+    # players in MazeFormat.Tiled get the tiles of the maze streamed after it
+    # frames: the frames of a broadcast of the maze (see group_frame)
+    def send_maze_msg(self, player: Player, get_msg: Callable[[MazeFormat], str], frames: dict[str, bytes] | None = None):
+        message = get_msg(player.maze_format)
+        frame = None if frames == None else self.group_frame(player, message, frames)
+        player.send(message if frame == None else frame)
+        if player.maze_format != MazeFormat.Tiled: return
+        stream = self.tile_streams.get(player.username)
+        if stream == None or stream.tiles is not self.stored_maze.tiles:
+            self.tile_streams[player.username] = MazeTileStream(self.stored_maze.tiles)
+            self.parent_server.scheduler.wake(self)
+
+    def send_maze_broadcast(self, get_msg: Callable[[MazeFormat], str]):
+        frames = {}
+        for player in self.players:
+            self.send_maze_msg(player, get_msg, frames)
+        if self.spectators:
+            self.spectator_fanout.queue_broadcast({maze_format: get_msg(maze_format) for maze_format in self.spectator_fanout.maze_formats})
 
-    def get_players_in_finish_cell(self) -> list[Player]:
-        return [p for p in self.players if self.pos_is_on_cell(p.position, self.finish_cell)]
+    # queue the next tiles of every tile stream, as far as the stream windows and the send queues allow
+    def pump_tile_streams(self):
+        for player in self.players:
+            stream = self.tile_streams.get(player.username)
+            if stream == None or not stream.has_unsent or not player.connected: continue
+            max_count = server_config.MAZE_TILE_MAX_QUEUE_DEPTH - player.client_info.send_queue.depth
+            for tile_msg in stream.next_tile_msgs(max_count):
+                player.send(tile_msg)
+
+    # whether every player streaming the maze has the tiles around the start
+    def start_area_delivered(self) -> bool:
+        return all(stream.start_area_delivered for stream in self.tile_streams.values())
+
+    # the standings of the game, from the cells of all players on the distance field of the maze
+    # finished players come first in finishing order, then the rest by their distance to the finish cell
+    # returns: usernames, [place, distance][] in the same order
+    def compute_ranking(self) -> tuple[tuple[str, ...], np.ndarray]:
+        positions = self.player_positions
+        usernames = tuple(positions.usernames)
+        finished = positions.finished
+        finish_keys = np.where(finished, positions.finish_index, len(usernames))
+
+        cells = self.get_cells_of_player_positions(positions.xy)
+        # the distance field counts steps of the grid - 2 per cell of the maze (the cell and the bridge to it), -1 stays -1
+        distances = self.stored_maze.distance_field[cells[:, 1] * 2, cells[:, 0] * 2] // 2
+        distances[finished] = 0
+        # players the maze can't take to the finish (inside a wall) rank last
+        distance_keys = np.where(distances < 0, np.iinfo(np.int32).max, distances)
+
+        places = np.empty(len(usernames), dtype=np.int32)
+        places[np.lexsort((distance_keys, finish_keys))] = np.arange(1, len(usernames) + 1, dtype=np.int32)
+        return usernames, np.stack((places, distances), axis=1)
+
+    # the RANKING data of the standings that changed from old_ranking of old_usernames to ranking of usernames
+    # (everyone, if the players aren't the same)
+    @staticmethod
+    def ranking_delta(old_usernames: tuple[str, ...], old_ranking: np.ndarray | None, usernames: tuple[str, ...], ranking: np.ndarray) -> dict:
+        if usernames == old_usernames:
+            changed = np.flatnonzero((ranking != old_ranking).any(axis=1))
+        else:
+            changed = np.arange(len(usernames))
+        return {usernames[i]: {"place": place, "distance": distance} for i, (place, distance) in zip(changed.tolist(), ranking[changed].tolist())}
+
+    # broadcast the standings of the players whose place or distance changed since the last RANKING
+    # (spectators get the standings with their positions - SpectatorFanout)
+    def broadcast_ranking_delta(self):
+        usernames, ranking = self.compute_ranking()
+        delta = self.ranking_delta(self.ranking_usernames, self.ranking, usernames, ranking)
+        self.ranking_usernames, self.ranking = usernames, ranking
+        if not delta: return
+        self.spectator_frame_dirty = True
+        self.send_broadcast(build_network_msg(None, MsgType.RANKING, delta), spectators=False)
+
+    # the normalized (left, top, right, bottom) of the area in which a position is on a cell (see pos_is_on_cell)
+    def get_cell_rect(self, cellPos: Vector2) -> tuple[float, float, float, float]:
+        left, top = cellPos.x * self.cell_scale, cellPos.y * self.cell_scale
+        return left, top, left + self.cell_scale * 2, top + self.cell_scale * 2
     
     # pos: normalized position
     # cellPos: grid position
@@ -262,9 +787,11 @@ class GameRoom:
         )
         return cell_top_left.x < pos.x < cell_bottom_right.x and cell_top_left.y < pos.y < cell_bottom_right.y
 
-    def player_finished(self, p: Player):
+    # recv_time_ms: when the position that reached the finish cell was received
+    def player_finished(self, p: Player, recv_time_ms: int):
         print(f"Player {p.username} finished!")
-        finish_time = get_time_ms() - self.start_time
+        self.player_positions.mark_finished(self.player_positions.row_of(p.username), len(self.game_results))
+        finish_time = recv_time_ms - self.start_time
         self.game_results.append(GameResult(account_id=p.account_id, time_ms=finish_time))
         new_result = {
             "username": p.username,
@@ -294,43 +821,73 @@ class GameRoom:
         # TODO: Disconnect all players and close room?
 
     def restart_game(self):
+        self.awaiting_start_tiles_since = None
         self.game_data = GameData(str(uuid.uuid4()), self.name, get_time_ms(), GameOptions.GameOptions())
         self.current_results = []
         self.total_results = []
         self.generate_new_maze()
         self.running = True
         self.send_broadcast(build_network_msg(None, MsgType.RESTART_GAME))
-        self.send_broadcast(build_network_msg(None, MsgType.MAZE, self.stored_maze.get_matrix()))
+        self.send_maze_broadcast(self.get_maze_msg)
         self.send_broadcast(build_network_msg(None, MsgType.GAME_OPTIONS, self.game_options.get_json()))
 
-    def game_loop(self):
-        while True:
-            start = time.perf_counter()
+    # a single iteration of the game loop
+    def tick(self):
+        self.run_commands()
+        self.expire_reserved_seats()
+        if self.group_key != None and self.group_key.worn_out:
+            self.rotate_group_key()
 
-            # send dirty positions
-            if len(self.dirty_pos_dict):
-                dirty_pos_msg = build_network_msg(None, MsgType.UPDATE_POS, self.dirty_pos_dict)
-                self.send_broadcast(dirty_pos_msg, None)
-                self.dirty_pos_dict.clear()
+        self.pump_tile_streams()
+        if self.awaiting_start_tiles_since != None:
+            timed_out = time.monotonic() - self.awaiting_start_tiles_since > server_config.MAZE_START_TILES_TIMEOUT_SEC
+            if timed_out or self.start_area_delivered():
+                self.start_countdown()
 
-            if self.game_active:
-                # TODO: Optimize?
-                finishers = self.get_players_in_finish_cell()
-                new_finishers = [x for x in finishers if all(x.account_id != y["account_id"] for y in self.game_results)]
-                if len(new_finishers):
-                    for f in new_finishers:
-                        self.player_finished(f)
+        self.take_positions()
+        self.apply_moves()
 
-                if self.should_stop_game():
-                    self.end_game()
+        # send dirty positions (and the far positions of a large room that weren't sent yet)
+        if len(self.dirty_pos_dict) or self.player_positions.far_dirty.any():
+            self.send_positions()
+            self.dirty_pos_dict.clear()
 
-            time.sleep(max(1. / GAME_LOOP_RATE - (time.perf_counter() - start), 0))
+        if self.game_active:
+            if self.should_stop_game():
+                self.end_game()
+            elif not self.uses_area_of_interest or self.tick_count % server_config.AOI_FAR_INTERVAL_TICKS == 0:
+                self.broadcast_ranking_delta()
+        self.tick_count += 1
+
+        if self.spectator_frame_dirty and self.spectators:
+            self.publish_spectator_frame()
+
+    # give the spectator fan-out a copy of the positions and standings of the room - the far positions of a large room
+    # with the decimated spectator view
+    def publish_spectator_frame(self):
+        self.spectator_frame_dirty = False
+        far = self.uses_area_of_interest and self.spectator_view == FAR_VIEW
+        usernames, xy, snapshot_rows = self.player_positions.copy_positions(far)
+        self.spectator_fanout.publish(SpectatorFrame(usernames, xy, snapshot_rows, self.ranking_usernames, self.ranking))
+
+    # whether the room can tick at a lower rate - no game is running or starting, no commands are waiting, nobody moved
+    # and no tiles are waiting to be sent
+    @property
+    def is_idle(self) -> bool:
+        return not self.game_active and len(self.commands) == 0 and len(self.dirty_pos_dict) == 0 and not self.player_positions.has_pending.any() \
+            and not self.player_positions.far_dirty.any() \
+            and self.awaiting_start_tiles_since == None \
+            and not any(stream.has_unsent for stream in self.tile_streams.values())
 
     def remove_room(self):
+        self.removed = True
         if self.game_active:
             try: self.end_game()
             except: pass
+        for spectator in list(self.spectators):
+            self.remove_spectator(spectator, rotate_key=False)
         self.parent_server.remove_room_by_id(self.id)
+        self.run_commands() # the commands posted since the tick started
 
     # disconnect all players from the room
     def disconnect_all(self):
@@ -338,6 +895,11 @@ class GameRoom:
             self.on_client_disconnect(player)
 
     # region "Canvas" Methods
+    # the normalized x and y of the position players start at - the center of the first room
+    @property
+    def start_pos(self) -> float:
+        return self.cell_scale / 2
+
     @property
     def cell_scale(self) -> float:
         RENDER_HEIGHT = float(1.) # normalized maze size
@@ -364,6 +926,13 @@ class GameRoom:
     def get_cell_of_player_pos(self, player_pos: Vector2) -> Vector2:
         return self.canvas_to_visual_grid(self.apply_canvas_circle_offset(player_pos))
 
+    # get_cell_of_player_pos of an (n, 2) array of positions at once - (n, 2) int array of [x, y] cells,
+    # clamped into the maze
+    def get_cells_of_player_positions(self, positions: np.ndarray) -> np.ndarray:
+        cells = (np.floor((positions + self.cell_scale / 2) / self.cell_scale) / 2.).astype(np.int64)
+        max_cell = ((self.stored_maze.width - 1) // 2, (self.stored_maze.height - 1) // 2)
+        return np.clip(cells, 0, max_cell)
+
     # endregion
 
 # TODO: maybe have a text error along with the validity check?
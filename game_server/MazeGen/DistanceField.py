@@ -0,0 +1,31 @@
+import numpy as np
+from MazeGen.CellType import CellType
+from Structures.Vector2 import Vector2
+
+UNREACHABLE = -1 # the distance of walls and of passages that can't reach the source
+
+# Breadth-first search from a cell over the passages of a (height, width) uint8 grid.
+# Returns the (height, width) int32 array of the number of steps from every cell to the source.
+# The search expands a whole BFS level per iteration on a padded, flattened copy of the grid,
+# so the python loop runs once per level instead of once per cell.
+def bfs_distances(grid: np.ndarray, source: Vector2) -> np.ndarray:
+    height, width = grid.shape
+    stride = width + 2
+    open_cells = np.zeros((height + 2, stride), dtype=bool)
+    open_cells[1:-1, 1:-1] = grid == CellType.Passage.value
+    open_cells = open_cells.ravel()
+    distances = np.full(open_cells.size, UNREACHABLE, dtype=np.int32)
+
+    offsets = np.array([-stride, 1, stride, -1], dtype=np.int64)
+    frontier = np.array([(int(source.y) + 1) * stride + int(source.x) + 1], dtype=np.int64)
+    frontier = frontier[open_cells[frontier]]
+    distance = 0
+    while frontier.size:
+        distances[frontier] = distance
+        open_cells[frontier] = False
+        distance += 1
+        neighbors = (frontier[:, None] + offsets).ravel()
+        # two cells of a level may share a neighbor (mazes with loops)
+        frontier = np.unique(neighbors[open_cells[neighbors]])
+
+    return distances.reshape(height + 2, stride)[1:-1, 1:-1].copy()
@@ -0,0 +1,63 @@
+from typing import Iterator
+import numpy as np
+from MazeGen.CellType import CellType
+
+# chance of joining two horizontally adjacent rooms of different sets, and of a room opening downwards
+JOIN_PROBABILITY = 0.5
+DOWN_PROBABILITY = 0.5
+
+# Eller's algorithm: generates the maze a row of rooms at a time, keeping only the set (connected component)
+# of every room of the current row, so any number of rows takes O(width) memory.
+# Yields the rows of the grid: a row of rooms and horizontal bridges, then (except after the last row of rooms)
+# a row of vertical bridges to the next row of rooms.
+def eller_rows(rooms_w: int, rooms_h: int, rng: np.random.Generator) -> Iterator[np.ndarray]:
+    width = 2 * rooms_w - 1
+    columns = np.arange(rooms_w)
+    sets = columns.copy() # set of every room of the row - always labeled 0..rooms_w-1
+    for y in range(rooms_h):
+        last_row = y == rooms_h - 1
+        joins = [True] * (rooms_w - 1) if last_row else (rng.random(rooms_w - 1) < JOIN_PROBABILITY).tolist()
+
+        # join adjacent rooms of different sets (all of them on the last row, so the maze is connected)
+        parent = list(range(rooms_w))
+        row_sets = sets.tolist()
+        room_row = np.zeros(width, dtype=np.uint8)
+        room_row[::2] = CellType.Passage.value
+        for x in range(rooms_w - 1):
+            if not joins[x]: continue
+            a, b = row_sets[x], row_sets[x + 1]
+            while parent[a] != a: a = parent[a]
+            while parent[b] != b: b = parent[b]
+            if a == b: continue
+            parent[a] = b
+            room_row[2 * x + 1] = CellType.Passage.value
+        yield room_row
+        if last_row: return
+
+        for x in range(rooms_w):
+            root = row_sets[x]
+            while parent[root] != root: root = parent[root]
+            row_sets[x] = root
+        sets = np.array(row_sets)
+
+        # open rooms downwards at random - at least one room of every set, or the set would be cut off
+        # (a set without a chosen room opens its room with the lowest draw)
+        draws = rng.random(rooms_w)
+        down = draws < DOWN_PROBABILITY
+        has_down = np.bincount(sets, weights=down, minlength=rooms_w) > 0
+        by_set = np.lexsort((draws, sets))
+        first_of_set = by_set[np.r_[True, sets[by_set][1:] != sets[by_set][:-1]]]
+        down[first_of_set[~has_down[sets[first_of_set]]]] = True
+
+        bridge_row = np.zeros(width, dtype=np.uint8)
+        bridge_row[::2][down] = CellType.Passage.value
+        yield bridge_row
+
+        # rooms below a bridge stay in the set, the rest get new sets - then relabel to 0..rooms_w-1
+        sets = np.where(down, sets, rooms_w + columns)
+        sets = np.unique(sets, return_inverse=True)[1]
+
+def eller(grid: np.ndarray, rng: np.random.Generator) -> None:
+    height, width = grid.shape
+    for y, row in enumerate(eller_rows((width + 1) // 2, (height + 1) // 2, rng)):
+        grid[y] = row
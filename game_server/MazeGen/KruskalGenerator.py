@@ -0,0 +1,39 @@
+import numpy as np
+from MazeGen.CellType import CellType
+
+
+# Randomized Kruskal: knock down the walls between adjacent rooms in a random order,
+# skipping walls between rooms that are already connected (tracked with a union-find over the rooms).
+def kruskal(grid: np.ndarray, rng: np.random.Generator) -> None:
+    height, width = grid.shape
+    rooms_w, rooms_h = (width + 1) // 2, (height + 1) // 2
+    num_rooms = rooms_w * rooms_h
+
+    # every wall between two rooms, as (room, room to its right / below it), in a random order
+    rooms = np.arange(num_rooms, dtype=np.int64).reshape(rooms_h, rooms_w)
+    first = np.concatenate([rooms[:, :-1].ravel(), rooms[:-1, :].ravel()])
+    second = np.concatenate([rooms[:, 1:].ravel(), rooms[1:, :].ravel()])
+    order = rng.permutation(len(first))
+    first, second = first[order], second[order]
+
+    parent = list(range(num_rooms))
+    opened = [] # indices of the walls that were knocked down
+    num_sets = num_rooms
+    for i, (a, b) in enumerate(zip(first.tolist(), second.tolist())):
+        # find both roots, halving the paths on the way
+        while parent[a] != a:
+            parent[a] = a = parent[parent[a]]
+        while parent[b] != b:
+            parent[b] = b = parent[parent[b]]
+        if a == b: continue
+        parent[a] = b
+        opened.append(i)
+        num_sets -= 1
+        if num_sets == 1: break
+
+    grid[::2, ::2] = CellType.Passage.value
+    opened = np.array(opened, dtype=np.int64)
+    first_y, first_x = np.divmod(first[opened], rooms_w)
+    second_y, second_x = np.divmod(second[opened], rooms_w)
+    # room (x, y) is at (2x, 2y) on the grid, the wall between two rooms is halfway
+    grid[first_y + second_y, first_x + second_x] = CellType.Passage.value
@@ -1,18 +1,30 @@
+import base64
 from MazeGen.CellType import CellType
+from MazeGen.DistanceField import bfs_distances
+from MazeGen.MazeAlgorithm import MazeAlgorithm
+from MazeGen.MazeFormat import MazeFormat
+from MazeGen.MazeTiles import MazeTiles
 import numpy as np
 from Structures.Vector2 import Vector2
 
 
-# matrix of cells
+# matrix of cells, stored as a uint8 array of CellType values
 class Maze:
-    def __init__(self, matrix: list[list[CellType]]):
-        height = len(matrix)
-        width = len(matrix[0]) if height > 0 else 0
-        if width <= 0 or height <= 0:
+    # seed, algorithm: how the maze was generated (seed None -> the maze can't be regenerated)
+    def __init__(self, matrix: np.ndarray | list[list[CellType | int]], seed: int | None = None, algorithm: MazeAlgorithm = MazeAlgorithm.DFS):
+        if not isinstance(matrix, np.ndarray):
+            matrix = [[cell.value if isinstance(cell, CellType) else cell for cell in row] for row in matrix]
+        grid = np.array(matrix, dtype=np.uint8)
+        if grid.ndim != 2 or grid.shape[0] <= 0 or grid.shape[1] <= 0:
             raise ValueError(f"Grid constructor - width and height must be positive")
-        self._width = width
-        self._height = height
-        self._matrix = [row[:] for row in matrix]
+        self._height, self._width = grid.shape
+        self._grid = grid
+        self.seed = seed
+        self.algorithm = algorithm
+        self._payloads: dict[MazeFormat, list | dict] = {} # encoded once per format, dropped when a cell changes
+        self._tiles: MazeTiles | None = None
+        self._distance_field: np.ndarray | None = None
+        self._wall_bitmap: np.ndarray | None = None
     
     @property
     def width(self) -> int:
@@ -22,6 +34,38 @@ class Maze:
     def height(self) -> int:
         return self._height
 
+    # the uint8 grid of this maze - grid[y, x]
+    @property
+    def grid(self) -> np.ndarray:
+        return self._grid
+
+    # the cell players race to - the bottom right corner
+    @property
+    def finish_cell(self) -> Vector2:
+        return Vector2(self.width - 1, self.height - 1)
+
+    # the number of steps from every cell to the finish cell (-1 for walls) - grid[y, x], computed once per maze
+    @property
+    def distance_field(self) -> np.ndarray:
+        if self._distance_field is None:
+            self._distance_field = bfs_distances(self._grid, self.finish_cell)
+        return self._distance_field
+
+    # a bit per cell, set on walls - rows of grid[y] packed into bytes, computed once per maze
+    @property
+    def wall_bitmap(self) -> np.ndarray:
+        if self._wall_bitmap is None:
+            self._wall_bitmap = np.packbits(self._grid == CellType.Wall.value, axis=1)
+        return self._wall_bitmap
+
+    # whether cells are passages, for arrays of grid coordinates (cells outside the grid are walls)
+    def is_passage(self, ys: np.ndarray, xs: np.ndarray) -> np.ndarray:
+        in_bounds = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        xs = np.clip(xs, 0, self.width - 1)
+        ys = np.clip(ys, 0, self.height - 1)
+        walls = (self.wall_bitmap[ys, xs >> 3] >> (7 - (xs & 7))) & 1
+        return in_bounds & (walls == 0)
+
     def in_bounds(self, pos: Vector2) -> bool:
         return 0 <= pos.x < self.width and 0 <= pos.y < self.height
 
@@ -31,14 +75,18 @@ class Maze:
         return self.get_cell(pos) if self.in_bounds(pos) else CellType.Wall
     
     def get_cell(self, pos: Vector2) -> CellType:
-        return self._matrix[int(pos.y)][int(pos.x)]
+        return CellType(int(self._grid[int(pos.y), int(pos.x)]))
 
     def set_cell(self, pos: Vector2, cellType: CellType):
         if self.in_bounds(pos):
-            self._matrix[int(pos.y)][int(pos.x)] = cellType
+            self._grid[int(pos.y), int(pos.x)] = cellType.value
+            self._payloads.clear()
+            self._tiles = None
+            self._distance_field = None
+            self._wall_bitmap = None
 
     def create_duplicate_mat(self) -> list[list[CellType]]:
-        return [row[:] for row in self._matrix]
+        return [[CellType(val) for val in row] for row in self._grid.tolist()]
 
     # get a position's neighbors on the grid (+-2, +-2)
     def get_neighbors(self, pos: Vector2) -> list[Vector2]:
@@ -58,6 +106,30 @@ class Maze:
 
     # get the matrix of cells of this maze
     def get_matrix(self) -> list[list[int]]:
-        return [[val.value for val in row] for row in self._matrix]
+        return self._grid.tolist()
 
+    # the maze split into tiles, for streaming it to clients in MazeFormat.Tiled
+    @property
+    def tiles(self) -> MazeTiles:
+        if self._tiles == None:
+            self._tiles = MazeTiles(self)
+        return self._tiles
 
+    # get the maze as the data of a message in the given format - encoded once and reused after
+    def get_payload(self, maze_format: MazeFormat) -> list[list[int]] | dict:
+        payload = self._payloads.get(maze_format)
+        if payload != None: return payload
+        match maze_format:
+            case MazeFormat.Grid:
+                payload = self.get_matrix()
+            case MazeFormat.Packed:
+                payload = {
+                    "format": MazeFormat.Packed.value,
+                    "width": self.width,
+                    "height": self.height,
+                    "cells": base64.b64encode(np.packbits(self._grid, axis=None)).decode(),
+                }
+            case MazeFormat.Tiled:
+                payload = {"format": MazeFormat.Tiled.value, **self.tiles.get_info()}
+        self._payloads[maze_format] = payload
+        return payload
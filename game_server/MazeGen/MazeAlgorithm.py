@@ -0,0 +1,9 @@
+from enum import Enum
+
+# the algorithm a maze is generated with - together with the difficulty and the seed it identifies a maze
+class MazeAlgorithm(Enum):
+    DFS = "DFS" # randomized depth-first search - long corridors, few dead ends
+    KRUSKAL = "KRUSKAL" # randomized Kruskal - many short dead ends
+    PRIM = "PRIM" # randomized Prim - many short dead ends, radiates from the start
+    WILSON = "WILSON" # Wilson's algorithm - uniform spanning tree, slow on big mazes
+    ELLER = "ELLER" # Eller's algorithm - row by row in O(width) memory, for very large mazes
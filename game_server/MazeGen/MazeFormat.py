@@ -0,0 +1,7 @@
+from enum import Enum
+
+# how a maze is encoded in messages
+class MazeFormat(Enum):
+    Grid = "grid" # CellType[][]
+    Packed = "packed" # { format: "packed", width, height, cells } - cells: base64 of 1 bit per cell, row by row, most significant bit first
+    Tiled = "tiled" # { format: "tiled", width, height, tileSize, tilesX, tilesY } - the cells follow in MAZE_TILE messages
@@ -1,44 +1,108 @@
+import itertools
+import secrets
+from typing import Callable
 import numpy as np
 from Database.GameData import MazeData
 from MazeGen.CellType import CellType
+from MazeGen.EllerGenerator import eller
+from MazeGen.KruskalGenerator import kruskal
 from MazeGen.Maze import Maze
+from MazeGen.MazeAlgorithm import MazeAlgorithm
+from MazeGen.MazeFormat import MazeFormat
+from MazeGen.PrimGenerator import prim
+from MazeGen.WilsonGenerator import wilson
 from Structures import GameOptions
 from Structures.GameOptions import MazeDifficulty, difficultyToDims
 from Structures.Vector2 import Vector2
-from helpers import get_random_int
 
 
-def recursive_DFS(maze: Maze, pos: Vector2) -> None:
-    maze.set_cell(pos, CellType.Passage) # assume pos is a valid position
+# seeds are sent to clients as json numbers, keep them well within the exact integer range of javascript
+MAZE_SEED_BITS = 32
 
-    neighbors = maze.get_neighbors(pos)
-    while len(neighbors) != 0:
-        index = get_random_int(0, len(neighbors))
-        neighborPos = neighbors[index]
-        neighbors.remove(neighborPos)
-        if maze.get_cell(neighborPos) != CellType.Wall: continue
+def new_maze_seed() -> int:
+    return secrets.randbits(MAZE_SEED_BITS)
 
-        bridgePos: Vector2 = Vector2(
-            (pos.x + neighborPos.x) / 2,
-            (pos.y + neighborPos.y) / 2
-        );
+def is_valid_maze_seed(seed: any) -> bool:
+    return isinstance(seed, int) and not isinstance(seed, bool) and 0 <= seed < (1 << MAZE_SEED_BITS)
 
-        maze.set_cell(bridgePos, CellType.Passage)
-        recursive_DFS(maze, neighborPos)
+# the 24 orders in which the 4 directions (up, right, down, left) of a room can be tried
+DIRECTION_ORDERS = list(itertools.permutations(range(4)))
 
+# Randomized depth-first search over the rooms (even cells) of a (height, width) uint8 grid.
+# Rooms are indexed on a padded (rooms_h + 2, rooms_w + 2) board whose border rooms start out visited,
+# so the search needs no bounds checks. The direction order of every room is drawn from rng up front
+# in a single call, and the search keeps an explicit stack instead of recursing.
+def iterative_DFS(grid: np.ndarray, rng: np.random.Generator) -> None:
+    height, width = grid.shape
+    rooms_w, rooms_h = (width + 1) // 2, (height + 1) // 2
+    stride = rooms_w + 2
+    num_rooms = stride * (rooms_h + 2)
 
-def generateDFSRectMaze(width: int, height: int) -> Maze:
+    direction_offsets = (-stride, 1, stride, -1)
+    order_offsets = [tuple(direction_offsets[d] for d in order) for order in DIRECTION_ORDERS]
+    room_orders = rng.integers(0, len(DIRECTION_ORDERS), num_rooms).tolist()
+
+    visited = np.zeros((rooms_h + 2, stride), dtype=np.uint8)
+    visited[[0, -1], :] = visited[:, [0, -1]] = 1
+    visited = visited.ravel().tolist() # a list is indexed faster than an array in the loop below
+
+    room = stride + 1 # room (0, 0)
+    visited[room] = 1
+    reached, parents = [], [] # every room reached and the room it was reached from
+    reach, add_parent = reached.append, parents.append
+    stack = []
+    push, pop = stack.append, stack.pop
+    offsets = iter(order_offsets[room_orders[room]])
+    while True:
+        for offset in offsets:
+            neighbor = room + offset
+            if not visited[neighbor]:
+                visited[neighbor] = 1
+                reach(neighbor)
+                add_parent(room)
+                push((room, offsets))
+                room = neighbor
+                offsets = iter(order_offsets[room_orders[room]])
+                break
+        else:
+            if not stack: break
+            room, offsets = pop()
+
+    # open all rooms and the bridge between every room and the room it was reached from
+    grid[::2, ::2] = CellType.Passage.value
+    room_y, room_x = np.divmod(np.array(reached, dtype=np.int64), stride)
+    parent_y, parent_x = np.divmod(np.array(parents, dtype=np.int64), stride)
+    # room (x, y) of the padded board is at (2x - 2, 2y - 2) on the grid, the bridge is halfway to its parent
+    grid[room_y + parent_y - 2, room_x + parent_x - 2] = CellType.Passage.value
+
+
+# the generator of every algorithm - carves a maze into a grid of walls with odd dimensions
+MAZE_GENERATORS: dict[MazeAlgorithm, Callable[[np.ndarray, np.random.Generator], None]] = {
+    MazeAlgorithm.DFS: iterative_DFS,
+    MazeAlgorithm.KRUSKAL: kruskal,
+    MazeAlgorithm.PRIM: prim,
+    MazeAlgorithm.WILSON: wilson,
+    MazeAlgorithm.ELLER: eller,
+}
+
+# generate a maze - the same algorithm and seed always generate the same maze (seed None -> a new random seed)
+def generate_maze(width: int, height: int, algorithm: MazeAlgorithm = MazeAlgorithm.DFS, seed: int | None = None) -> Maze:
+    if seed == None: seed = new_maze_seed()
     # force height and width to be odd in order for the maze to be possible
-    grid = np.full((height | 1, width | 1), CellType.Wall)
-    maze = Maze(grid)
-    recursive_DFS(maze, Vector2(0, 0))
-    return maze
+    grid = np.full((height | 1, width | 1), CellType.Wall.value, dtype=np.uint8)
+    MAZE_GENERATORS[algorithm](grid, np.random.default_rng(seed))
+    return Maze(grid, seed, algorithm)
 
-def generate_maze_by_difficulty(diff: MazeDifficulty) -> Maze:
+def generateDFSRectMaze(width: int, height: int, seed: int | None = None) -> Maze:
+    return generate_maze(width, height, MazeAlgorithm.DFS, seed)
+
+def generate_maze_by_difficulty(diff: MazeDifficulty, seed: int | None = None, algorithm: MazeAlgorithm = MazeAlgorithm.DFS) -> Maze:
     dims = difficultyToDims(diff)
-    return generateDFSRectMaze(dims["width"], dims["height"])
+    return generate_maze(dims["width"], dims["height"], algorithm, seed)
 
 def generate_maze_data_by_game_options(options: GameOptions.GameOptions) -> MazeData:
-    maze = generate_maze_by_difficulty(options.difficulty)
-    finish_cell = Vector2(maze.width - 1, maze.height - 1)
-    return MazeData(grid=maze.get_matrix(), finish_cell=finish_cell)
\ No newline at end of file
+    return get_maze_data(generate_maze_by_difficulty(options.difficulty, algorithm=options.algorithm))
+
+def get_maze_data(maze: Maze) -> MazeData:
+    return MazeData(grid=maze.get_payload(MazeFormat.Grid), finish_cell=maze.finish_cell,
+                    seed=maze.seed, algorithm=maze.algorithm.value)
@@ -0,0 +1,103 @@
+import gc
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from MazeGen.Maze import Maze
+from MazeGen.MazeAlgorithm import MazeAlgorithm
+from MazeGen.MazeGenerator import generate_maze, generate_maze_by_difficulty, new_maze_seed
+from MazeGen.MazeStore import RESPONSE_FORMATS
+from Structures.GameOptions import MazeDifficulty, difficultyToDims
+
+import server_config
+
+# runs in a worker process - only the uint8 grid crosses the process boundary
+# the generators allocate objects per room that can never form cycles - the worker does nothing else, so the
+# garbage collector is off while it generates, rather than rescanning them over and over
+def generate_maze_grid(width: int, height: int, algorithm: MazeAlgorithm, seed: int) -> np.ndarray:
+    gc.disable()
+    try:
+        return generate_maze(width, height, algorithm, seed).grid
+    finally:
+        gc.enable()
+
+class MazePool:
+    """
+    Keeps up to depth ready mazes of every MazeDifficulty and MazeAlgorithm, refilled by a background thread,
+    so taking a maze for a game never generates one on a receive thread (unless the pool runs dry).
+    The distance field of every maze is computed, and the maze is encoded in the formats of GENERATE_MAZE responses,
+    before it enters the pool.
+    Mazes of at least process_min_cells cells are generated in a worker process, to keep
+    the generation off the GIL of the server.
+    """
+    def __init__(self, depth: int = server_config.MAZE_POOL_DEPTH,
+                 process_min_cells: int = server_config.MAZE_POOL_PROCESS_MIN_CELLS):
+        self.depth = depth
+        self.process_min_cells = process_min_cells
+        self._mazes: dict[tuple[MazeDifficulty, MazeAlgorithm], deque[Maze]] = {
+            (diff, algorithm): deque() for diff in MazeDifficulty for algorithm in MazeAlgorithm
+        }
+        self._cond = threading.Condition()
+        self._refill_thread: threading.Thread | None = None
+        self._executor: ProcessPoolExecutor | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self._refill_thread != None or self.depth <= 0: return
+        self._refill_thread = threading.Thread(target=self.refill_loop, daemon=True)
+        self._refill_thread.start()
+
+    # the (difficulty, algorithm) whose pool is the emptiest, None if all pools are full
+    # must be called with the lock held
+    def _next_to_refill(self) -> tuple[MazeDifficulty, MazeAlgorithm] | None:
+        pool_key = min(self._mazes, key=lambda k: len(self._mazes[k]))
+        return pool_key if len(self._mazes[pool_key]) < self.depth else None
+
+    def refill_loop(self):
+        while True:
+            with self._cond:
+                while (pool_key := self._next_to_refill()) == None:
+                    self._cond.wait()
+            new_maze = self._generate(*pool_key)
+            new_maze.distance_field # compute the race progress distances here rather than when a game starts
+            for maze_format in RESPONSE_FORMATS: # and encode the maze here rather than on a GENERATE_MAZE request
+                new_maze.get_payload(maze_format)
+            with self._cond:
+                self._mazes[pool_key].append(new_maze)
+
+    def _generate(self, diff: MazeDifficulty, algorithm: MazeAlgorithm) -> Maze:
+        dims = difficultyToDims(diff)
+        width, height = dims["width"], dims["height"]
+        if (width | 1) * (height | 1) < self.process_min_cells:
+            return generate_maze(width, height, algorithm)
+        try:
+            if self._executor == None:
+                # don't fork the threads of the server
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+            seed = new_maze_seed()
+            return Maze(self._executor.submit(generate_maze_grid, width, height, algorithm, seed).result(), seed, algorithm)
+        except Exception as e:
+            print("Maze worker process failed, generating in the pool thread:", e)
+            self.process_min_cells = float("inf")
+            return generate_maze(width, height, algorithm)
+
+    # take a ready maze of a difficulty and algorithm, generating one on the spot if its pool is empty
+    def take(self, diff: MazeDifficulty, algorithm: MazeAlgorithm = MazeAlgorithm.DFS) -> Maze:
+        with self._cond:
+            mazes = self._mazes[(diff, algorithm)]
+            if len(mazes):
+                self.hits += 1
+                self._cond.notify()
+                return mazes.popleft()
+            self.misses += 1
+        return generate_maze_by_difficulty(diff, algorithm=algorithm)
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                "ready": {f"{diff.value}/{algorithm.value}": len(mazes) for (diff, algorithm), mazes in self._mazes.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+            }
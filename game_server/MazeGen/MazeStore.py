@@ -0,0 +1,95 @@
+import sys
+import threading
+from collections import OrderedDict
+from MazeGen.Maze import Maze
+from MazeGen.MazeAlgorithm import MazeAlgorithm
+from MazeGen.MazeFormat import MazeFormat
+from MazeGen.MazeGenerator import generate_maze_by_difficulty
+from Structures.GameOptions import MazeDifficulty
+from Structures.Vector2 import Vector2, vector2_to_dict
+
+import server_config
+
+# (algorithm, difficulty, seed) - identifies a maze
+MazeKey = tuple[MazeAlgorithm, MazeDifficulty, int]
+# the formats GENERATE_MAZE responses are sent in - mazes of the pool are encoded in them before they're taken
+RESPONSE_FORMATS = (MazeFormat.Grid, MazeFormat.Packed)
+
+# approximate memory held by an encoded maze
+def get_maze_payload_size(maze_payload: dict) -> int:
+    grid = maze_payload["grid"]
+    if isinstance(grid, dict):
+        return sys.getsizeof(grid["cells"]) + 256
+    # a list per row of references to the cached small ints 0 and 1
+    return sum(sys.getsizeof(row) for row in grid) + sys.getsizeof(grid) + 256
+
+class MazeStore:
+    """
+    LRU cache of encoded mazes (the data of a GENERATE_MAZE response), keyed by the maze key and the maze format.
+    Mazes are evicted once the cached payloads take more than max_bytes.
+    Requests without a seed get a new maze of the pool (see add_new_maze) - they can't hit the cache, but the maze
+    was generated and encoded before the request arrived, and a later request of its seed is a hit.
+    """
+    def __init__(self, max_bytes: int = server_config.MAZE_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._payloads: OrderedDict[tuple[MazeKey, MazeFormat], tuple[dict, int]] = OrderedDict() # -> (payload, size)
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.new_mazes = 0
+        self.evictions = 0
+
+    # get the encoded maze of a key - maze: the maze of the key if the caller already has it
+    # (otherwise it's generated from the seed)
+    def get_payload(self, key: MazeKey, maze_format: MazeFormat, maze: Maze | None = None) -> dict:
+        with self._lock:
+            cached = self._payloads.get((key, maze_format))
+            if cached != None:
+                self._payloads.move_to_end((key, maze_format))
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        if maze == None:
+            algorithm, difficulty, seed = key
+            maze = generate_maze_by_difficulty(difficulty, seed, algorithm)
+        return self._add(key, maze_format, maze)
+
+    # get the encoded payload of a maze nobody asked for yet (a maze of the pool), and cache it for requests of its seed
+    def add_new_maze(self, key: MazeKey, maze_format: MazeFormat, maze: Maze) -> dict:
+        with self._lock:
+            self.new_mazes += 1
+        return self._add(key, maze_format, maze)
+
+    def _add(self, key: MazeKey, maze_format: MazeFormat, maze: Maze) -> dict:
+        payload = {
+            "grid": maze.get_payload(maze_format),
+            "finishCell": vector2_to_dict(Vector2(maze.width - 1, maze.height - 1)),
+            "seed": maze.seed,
+        }
+        self._insert((key, maze_format), payload)
+        return payload
+
+    def _insert(self, cache_key: tuple[MazeKey, MazeFormat], payload: dict):
+        size = get_maze_payload_size(payload)
+        if size > self.max_bytes: return
+        with self._lock:
+            if cache_key in self._payloads: return
+            self._payloads[cache_key] = (payload, size)
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._payloads.popitem(last=False)
+                self.num_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._payloads),
+                "bytes": self.num_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "newMazes": self.new_mazes,
+                "evictions": self.evictions,
+            }
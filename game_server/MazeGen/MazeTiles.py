@@ -0,0 +1,148 @@
+from __future__ import annotations
+import base64
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+import numpy as np
+from protocol import MsgType, build_network_msg
+
+import server_config
+
+if TYPE_CHECKING:
+    from MazeGen.Maze import Maze
+
+Tile = tuple[int, int] # (x, y) of a tile
+
+# (x, y) pairs of a list of [x, y] - None if the list is invalid
+def parse_tile_list(tiles: any) -> list[Tile] | None:
+    if not isinstance(tiles, list): return None
+    try:
+        return [(int(x), int(y)) for x, y in tiles]
+    except: return None
+
+class MazeTiles:
+    """
+    Splits a maze into tiles of tile_size x tile_size cells (smaller at the right and bottom edges).
+    The MAZE_TILE message of every tile is encoded on first use and shared by every client streaming the maze.
+    """
+    def __init__(self, maze: Maze, tile_size: int = server_config.MAZE_TILE_SIZE):
+        self.maze = maze
+        self.tile_size = tile_size
+        self.tiles_x = -(-maze.width // tile_size)
+        self.tiles_y = -(-maze.height // tile_size)
+        self._tile_msgs: dict[Tile, str] = {}
+
+    @property
+    def num_tiles(self) -> int:
+        return self.tiles_x * self.tiles_y
+
+    def get_info(self) -> dict:
+        return {
+            "width": self.maze.width,
+            "height": self.maze.height,
+            "tileSize": self.tile_size,
+            "tilesX": self.tiles_x,
+            "tilesY": self.tiles_y,
+        }
+
+    def in_bounds(self, tile: Tile) -> bool:
+        return 0 <= tile[0] < self.tiles_x and 0 <= tile[1] < self.tiles_y
+
+    def tile_of_cell(self, x: int, y: int) -> Tile:
+        return x // self.tile_size, y // self.tile_size
+
+    # the tiles up to radius tiles away from a tile (in both axes), nearest first
+    def tiles_around(self, center: Tile, radius: int) -> list[Tile]:
+        cx, cy = center
+        tiles = [(x, y) for y in range(max(0, cy - radius), min(self.tiles_y, cy + radius + 1))
+                        for x in range(max(0, cx - radius), min(self.tiles_x, cx + radius + 1))]
+        tiles.sort(key=lambda t: max(abs(t[0] - cx), abs(t[1] - cy)))
+        return tiles
+
+    def get_tile_msg(self, tile: Tile) -> str:
+        tile_msg = self._tile_msgs.get(tile)
+        if tile_msg != None: return tile_msg
+        x, y = tile
+        size = self.tile_size
+        cells = self.maze.grid[y * size:(y + 1) * size, x * size:(x + 1) * size]
+        tile_msg = self._tile_msgs[tile] = build_network_msg(None, MsgType.MAZE_TILE, {
+            "x": x,
+            "y": y,
+            "width": cells.shape[1],
+            "height": cells.shape[0],
+            "cells": base64.b64encode(np.packbits(cells, axis=None)).decode(),
+        })
+        return tile_msg
+
+class MazeTileStream:
+    """
+    Streams the tiles of a maze to a single client: tiles the client asked for first,
+    then the rest nearest to the start first. At most window tiles are sent and not acked yet.
+    A request asks for at most window tiles, and a tile asked for again moves to the front instead of being queued
+    twice - the queue of requested tiles never holds more than the tiles of the maze.
+    """
+    def __init__(self, tiles: MazeTiles, window: int = server_config.MAZE_TILE_WINDOW,
+                 start_area_radius: int = server_config.MAZE_START_AREA_RADIUS):
+        self.tiles = tiles
+        self.window = window
+        self.start_area = set(tiles.tiles_around((0, 0), start_area_radius))
+        self._urgent: OrderedDict[Tile, None] = OrderedDict.fromkeys(tiles.tiles_around((0, 0), start_area_radius))
+        self._rest = iter(tiles.tiles_around((0, 0), max(tiles.tiles_x, tiles.tiles_y)))
+        self._sent: set[Tile] = set()
+        self._acked: set[Tile] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._sent) - len(self._acked)
+
+    @property
+    def has_unsent(self) -> bool:
+        return len(self._sent) < self.tiles.num_tiles
+
+    # whether the client has all the tiles around the start of the maze
+    @property
+    def start_area_delivered(self) -> bool:
+        return self.start_area <= self._acked
+
+    # send tiles next - data: { tiles: [x, y][] } or { x, y, radius? } (a cell and the radius in tiles around it)
+    # returns: whether the request was valid
+    def request(self, data: any) -> bool:
+        if not isinstance(data, dict): return False
+        if "tiles" in data:
+            tiles = data["tiles"]
+            tiles = parse_tile_list(tiles[:self.window] if isinstance(tiles, list) else tiles)
+        else:
+            try:
+                center = self.tiles.tile_of_cell(int(data["x"]), int(data["y"]))
+                tiles = self.tiles.tiles_around(center, max(0, int(data.get("radius", 1))))[:self.window]
+            except: return False
+        if tiles == None: return False
+        for tile in reversed(tiles):
+            if self.tiles.in_bounds(tile) and not tile in self._sent:
+                self._urgent[tile] = None
+                self._urgent.move_to_end(tile, last=False)
+        return True
+
+    # the client received tiles - data: { tiles: [x, y][] }
+    def ack(self, data: any) -> bool:
+        tiles = parse_tile_list(data.get("tiles")) if isinstance(data, dict) else None
+        if tiles == None: return False
+        self._acked.update(t for t in tiles if t in self._sent)
+        return True
+
+    # the messages of the next tiles to send - at most max_count, and only as far as the window allows
+    def next_tile_msgs(self, max_count: int) -> list[str]:
+        tile_msgs = []
+        while len(tile_msgs) < max_count and self.in_flight < self.window:
+            tile = self._next_unsent()
+            if tile == None: break
+            self._sent.add(tile)
+            tile_msgs.append(self.tiles.get_tile_msg(tile))
+        return tile_msgs
+
+    def _next_unsent(self) -> Tile | None:
+        while self._urgent:
+            tile, _ = self._urgent.popitem(last=False)
+            if not tile in self._sent: return tile
+        for tile in self._rest:
+            if not tile in self._sent: return tile
+        return None
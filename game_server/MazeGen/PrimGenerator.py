@@ -0,0 +1,59 @@
+import numpy as np
+from MazeGen.CellType import CellType
+
+# room states on the padded board
+UNVISITED = 0
+IN_MAZE = 1
+FRONTIER = 2
+BORDER = 3
+
+# Randomized Prim: grow the maze from one room by repeatedly taking a random frontier room
+# (an unvisited room next to the maze) and connecting it to a random neighbor already in the maze.
+# Uses the padded board of iterative_DFS, and exactly 2 random numbers per room.
+def prim(grid: np.ndarray, rng: np.random.Generator) -> None:
+    height, width = grid.shape
+    rooms_w, rooms_h = (width + 1) // 2, (height + 1) // 2
+    stride = rooms_w + 2
+    num_rooms = stride * (rooms_h + 2)
+    offsets = (-stride, 1, stride, -1)
+
+    state = np.full((rooms_h + 2, stride), UNVISITED, dtype=np.uint8)
+    state[[0, -1], :] = state[:, [0, -1]] = BORDER
+    state = state.ravel().tolist()
+    frontier_picks = rng.random(rooms_w * rooms_h).tolist()
+    neighbor_picks = rng.random(rooms_w * rooms_h).tolist()
+
+    reached, parents = [], []
+    start = stride + 1 # room (0, 0)
+    state[start] = IN_MAZE
+    frontier = []
+    for offset in offsets:
+        if state[start + offset] == UNVISITED:
+            state[start + offset] = FRONTIER
+            frontier.append(start + offset)
+
+    step = 0
+    while frontier:
+        # swap-remove a random frontier room
+        i = int(frontier_picks[step] * len(frontier))
+        room = frontier[i]
+        frontier[i] = frontier[-1]
+        frontier.pop()
+
+        in_maze = [room + offset for offset in offsets if state[room + offset] == IN_MAZE]
+        reached.append(room)
+        parents.append(in_maze[int(neighbor_picks[step] * len(in_maze))])
+        step += 1
+
+        state[room] = IN_MAZE
+        for offset in offsets:
+            neighbor = room + offset
+            if state[neighbor] == UNVISITED:
+                state[neighbor] = FRONTIER
+                frontier.append(neighbor)
+
+    grid[::2, ::2] = CellType.Passage.value
+    room_y, room_x = np.divmod(np.array(reached, dtype=np.int64), stride)
+    parent_y, parent_x = np.divmod(np.array(parents, dtype=np.int64), stride)
+    # room (x, y) of the padded board is at (2x - 2, 2y - 2) on the grid, the bridge is halfway to its parent
+    grid[room_y + parent_y - 2, room_x + parent_x - 2] = CellType.Passage.value
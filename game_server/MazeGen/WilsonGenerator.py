@@ -0,0 +1,54 @@
+import numpy as np
+from MazeGen.CellType import CellType
+
+# random walk directions are drawn from the generator in blocks of this size
+WALK_BLOCK_SIZE = 1 << 16
+
+# Wilson's algorithm: a uniform spanning tree of the rooms (every possible maze is equally likely).
+# From every room not in the maze yet, random walk until hitting the maze, remembering only
+# the last exit of every room (which erases the loops), then add the loop-erased path to the maze.
+# Uses the padded board of iterative_DFS - steps onto the border are redrawn.
+def wilson(grid: np.ndarray, rng: np.random.Generator) -> None:
+    height, width = grid.shape
+    rooms_w, rooms_h = (width + 1) // 2, (height + 1) // 2
+    stride = rooms_w + 2
+    num_rooms = stride * (rooms_h + 2)
+    offsets = (-stride, 1, stride, -1)
+
+    inside = np.zeros((rooms_h + 2, stride), dtype=np.uint8)
+    inside[1:-1, 1:-1] = 1
+    interior_rooms = np.flatnonzero(inside).tolist()
+    inside = inside.ravel().tolist()
+    in_maze = [0] * num_rooms
+    next_room = [0] * num_rooms # the last exit of every room on the current walk
+
+    directions: list[int] = []
+    num_drawn = 0
+    reached, parents = [], []
+    in_maze[interior_rooms[0]] = 1
+    for start in interior_rooms:
+        if in_maze[start]: continue
+        room = start
+        while not in_maze[room]:
+            if num_drawn == len(directions):
+                directions = rng.integers(0, 4, WALK_BLOCK_SIZE, dtype=np.uint8).tolist()
+                num_drawn = 0
+            neighbor = room + offsets[directions[num_drawn]]
+            num_drawn += 1
+            if not inside[neighbor]: continue
+            next_room[room] = neighbor
+            room = neighbor
+
+        room = start
+        while not in_maze[room]:
+            in_maze[room] = 1
+            reached.append(room)
+            room = next_room[room]
+            parents.append(room)
+
+    grid[::2, ::2] = CellType.Passage.value
+    if not reached: return
+    room_y, room_x = np.divmod(np.array(reached, dtype=np.int64), stride)
+    parent_y, parent_x = np.divmod(np.array(parents, dtype=np.int64), stride)
+    # room (x, y) of the padded board is at (2x - 2, 2y - 2) on the grid, the bridge is halfway to its parent
+    grid[room_y + parent_y - 2, room_x + parent_x - 2] = CellType.Passage.value
@@ -0,0 +1,48 @@
+import math
+import numpy as np
+from MazeGen.Maze import Maze
+
+import server_config
+
+# distance between the points sampled along a move, in cells - rooms are 2 cells wide, so no room is skipped
+MOVE_SAMPLE_SPACING = 0.5
+
+# the rooms of positions (like GameRoom.get_cell_of_player_pos, without clamping) - (..., 2) int array of [x, y]
+def rooms_of_positions(positions: np.ndarray, cell_scale: float) -> np.ndarray:
+    return np.floor((positions + cell_scale / 2) / (cell_scale * 2)).astype(np.int64)
+
+# whether a player can step between two rooms that are at most a room apart on each axis, for arrays of rooms
+# a diagonal step has to be possible through one of the two rooms next to both
+def can_step(maze: Maze, x1: np.ndarray, y1: np.ndarray, x2: np.ndarray, y2: np.ndarray) -> np.ndarray:
+    # the bridge between rooms (x1, y) and (x2, y) is at (x1 + x2, 2y) on the grid - the room itself when x1 == x2
+    horizontal_first = maze.is_passage(2 * y1, x1 + x2) & maze.is_passage(y1 + y2, 2 * x2)
+    vertical_first = maze.is_passage(y1 + y2, 2 * x1) & maze.is_passage(2 * y2, x1 + x2)
+    return horizontal_first | vertical_first
+
+# Validate a batch of moves of players from their last accepted positions.
+# starts, targets: (n, 2) normalized positions, dt_sec: (n,) seconds between each start and target
+# A move faster than the max speed is cut to the max distance, and a move through a wall stops
+# at the last point sampled before the wall.
+# returns: (the accepted positions, which moves were too fast, which moves hit a wall)
+def validate_moves(maze: Maze, cell_scale: float, starts: np.ndarray, targets: np.ndarray,
+                   dt_sec: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    deltas = targets - starts
+    distances = np.hypot(deltas[:, 0], deltas[:, 1])
+    dt_sec = np.clip(dt_sec, 0, server_config.MOVE_MAX_INTERVAL_SEC) + server_config.MOVE_SPEED_GRACE_SEC
+    max_distances = server_config.PLAYER_MAX_SPEED_CELLS_PER_SEC * cell_scale * dt_sec
+    too_fast = distances > max_distances
+    deltas[too_fast] *= (max_distances[too_fast] / distances[too_fast])[:, None]
+    distances = np.minimum(distances, max_distances)
+
+    # sample every move at the same number of points, enough for the longest one
+    num_steps = max(1, math.ceil(distances.max(initial=0) / (cell_scale * MOVE_SAMPLE_SPACING)))
+    t = np.linspace(0., 1., num_steps + 1)
+    samples = starts[:, None, :] + t[None, :, None] * deltas[:, None, :] # (n, num_steps + 1, 2)
+    rooms = rooms_of_positions(samples, cell_scale)
+    xs, ys = rooms[..., 0], rooms[..., 1]
+    blocked = ~can_step(maze, xs[:, :-1], ys[:, :-1], xs[:, 1:], ys[:, 1:])
+
+    hit_wall = blocked.any(axis=1)
+    last_sample = np.where(hit_wall, blocked.argmax(axis=1), num_steps)
+    accepted = samples[np.arange(len(samples)), last_sample]
+    return accepted, too_fast, hit_wall
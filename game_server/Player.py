@@ -1,7 +1,8 @@
 from __future__ import annotations
 from enum import Enum
 from typing import TYPE_CHECKING, Callable
-from uuid import UUID
+from uuid import UUID, uuid4
+from AreaOfInterest import FULL_VIEW, View
 from ClientInfo import ClientInfo
 from Structures.Vector2 import Vector2
 
@@ -19,9 +20,23 @@ class Player:
         self.role = role
         self.position = Vector2(0, 0)
         self.isReady = False
+        self.disconnected_at: float | None = None # time.monotonic() of a dropped connection whose seat is kept for resumption
+        self.index: int | None = None # small integer that stands for the player in POS_SNAPSHOT, unique in their room
+        self.acked_snapshot: int | None = None # the newest POS_SNAPSHOT the player applied
+        self.acked_view: View = FULL_VIEW # the area of interest view the acked snapshot was sent through
+        self.snapshot_views: dict[int, View] = {} # seq -> the view of each snapshot sent to the player and not acked yet
+        self.cb_id: UUID = uuid4() # the id of the room's subscriptions to the events of the player's connection
+        self.routed = False # the events of the player's connection reach their room (see GameRoom.route_player)
 
-    def send(self, message: str):
-        return self.client_info.send(message)
+    @property
+    def connected(self) -> bool:
+        return self.disconnected_at == None
+
+    def send(self, message: str | bytes, droppable: bool = False):
+        return self.client_info.send(message, droppable)
+
+    def send_position(self, message: str, frame: bytes | None = None):
+        return self.client_info.send_position(message, frame)
 
     # callback(Player, msg)
     def on_receive(self, cb_id: UUID | None, recv_cb: Callable[[object, str], None]):
@@ -30,6 +45,13 @@ class Player:
     def unsubscribe_receive(self, cb_id: UUID | None) -> bool:
         return self.client_info.unsubscribe_receive(cb_id)
     
+    # callback(Player) - the player's newest position is waiting in their client info
+    def on_position(self, cb_id: UUID | None, position_cb: Callable[[object], None]):
+        return self.client_info.on_position(cb_id, lambda _: position_cb(self))
+
+    def unsubscribe_position(self, cb_id: UUID | None) -> bool:
+        return self.client_info.unsubscribe_position(cb_id)
+
     # callback(Player)
     def on_disconnect(self, cb_id: UUID | None, disconnect_cb: Callable[[object], None]):
         return self.client_info.on_disconnect(cb_id, lambda _: disconnect_cb(self))
@@ -56,6 +78,18 @@ class Player:
     def username(self):
         return self.client_info.username
 
+    @property
+    def maze_format(self):
+        return self.client_info.maze_format
+
+    @property
+    def binary_positions(self) -> bool:
+        return self.client_info.binary_positions
+
+    @property
+    def room_group_key(self) -> bool:
+        return self.client_info.room_group_key
+
     def to_string(self) -> str:
         return self.client_info.to_string()
 
@@ -68,4 +102,5 @@ class Player:
             "role": self.role.value,
             "position": self.position.__dict__,
             "isReady": self.isReady,
+            "index": self.index,
         }
\ No newline at end of file
@@ -0,0 +1,79 @@
+import base64
+import struct
+from collections import OrderedDict
+import numpy as np
+from AreaOfInterest import FULL_VIEW, View, view_rows
+from protocol import MsgType, build_network_msg
+
+import server_config
+
+FULL_SNAPSHOT_BASE = 0xFFFFFFFF # the base of a snapshot that isn't a delta
+SNAPSHOT_HEADER = struct.Struct("<II") # seq, base seq
+SNAPSHOT_ENTRY = np.dtype([("index", "<u2"), ("x", "<u2"), ("y", "<u2")])
+QUANTIZE_SCALE = 0xFFFF # normalized coordinates are sent as uint16 fractions of the maze
+# a POS_SNAPSHOT message is the base64 payload between these - base64 needs no json escaping
+SNAPSHOT_MSG_PREFIX, SNAPSHOT_MSG_SUFFIX = build_network_msg(None, MsgType.POS_SNAPSHOT, "").split('""')
+
+# normalized positions -> uint16 of the same shape
+def quantize_positions(xy: np.ndarray) -> np.ndarray:
+    return np.rint(np.clip(xy, 0., 1.) * QUANTIZE_SCALE).astype(np.uint16)
+
+def dequantize_positions(q: np.ndarray) -> np.ndarray:
+    return q.astype(np.float64) / QUANTIZE_SCALE
+
+class PositionSnapshots:
+    """
+    The recent position snapshots of a room, for clients with the binary_positions feature.
+    A snapshot is a copy of the (n, 3) uint16 [index, x, y] rows of PlayerPositions. A client gets the rows that changed
+    since the last snapshot it acked (or a full snapshot), encoded once per base snapshot and shared by every client
+    that acked the same one.
+    In rooms with an area of interest, a snapshot keeps the far rows and the buckets of the players too, and a client
+    sees the snapshot through their view (AreaOfInterest) - deltas are between the views the client got.
+    """
+    def __init__(self, history: int = server_config.POSITION_SNAPSHOT_HISTORY):
+        self.history = history
+        self.seq = -1 # the newest snapshot
+        self._snapshots: OrderedDict[int, tuple[np.ndarray, np.ndarray, np.ndarray]] = OrderedDict() # seq -> (live rows, far rows, buckets)
+        self._msgs: dict[tuple[int | None, View, View], str] = {} # (base seq, base view, view) -> POS_SNAPSHOT message of the newest snapshot
+
+    # take a snapshot of [index, x, y] rows - returns its seq
+    # far_rows, buckets: the far rows and the interest buckets of the players, in rooms with an area of interest
+    def take(self, snapshot_rows: np.ndarray, far_rows: np.ndarray | None = None, buckets: np.ndarray | None = None) -> int:
+        self.seq += 1
+        live_rows = snapshot_rows.copy()
+        self._snapshots[self.seq] = (live_rows, live_rows if far_rows is None else far_rows.copy(), buckets)
+        if len(self._snapshots) > self.history:
+            self._snapshots.popitem(last=False)
+        self._msgs = {}
+        return self.seq
+
+    # whether a client can ack a snapshot
+    def is_valid_ack(self, seq: any) -> bool:
+        return isinstance(seq, int) and not isinstance(seq, bool) and seq in self._snapshots
+
+    # the [index, x, y] rows of a snapshot seen through a view
+    def get_rows(self, seq: int, view: View = FULL_VIEW) -> np.ndarray:
+        live_rows, far_rows, buckets = self._snapshots[seq]
+        return live_rows if buckets is None else view_rows(view, live_rows, far_rows, buckets)
+
+    # the POS_SNAPSHOT message of the newest snapshot seen through view, for a client that acked base seen through
+    # base_view (None -> a full snapshot)
+    def get_msg(self, base: int | None, base_view: View = FULL_VIEW, view: View = FULL_VIEW) -> str:
+        if base not in self._snapshots: base = None
+        key = (base, base_view, view)
+        msg = self._msgs.get(key)
+        if msg == None:
+            msg = self._msgs[key] = SNAPSHOT_MSG_PREFIX + '"' + self.encode(base, base_view, view) + '"' + SNAPSHOT_MSG_SUFFIX
+        return msg
+
+    # base64 of the newest snapshot seen through view as a delta from base seen through base_view (None -> a full snapshot)
+    def encode(self, base: int | None, base_view: View = FULL_VIEW, view: View = FULL_VIEW) -> str:
+        entries = self.get_rows(self.seq, view)
+        base_entries = None if base == None else self.get_rows(base, base_view)
+        if base_entries is not None and base_entries.shape == entries.shape:
+            # rows that are the same as in the base snapshot are the same player at the same position
+            entries = entries[(entries != base_entries).any(axis=1)]
+        else:
+            base = None # players joined or left - send everyone
+        header = SNAPSHOT_HEADER.pack(self.seq, FULL_SNAPSHOT_BASE if base == None else base)
+        return base64.b64encode(header + entries.astype("<u2", copy=False).tobytes()).decode()
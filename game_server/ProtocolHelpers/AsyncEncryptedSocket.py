@@ -0,0 +1,139 @@
+import asyncio
+from ProtocolHelpers.GameCryptoEngine import GameCryptoEngine
+from ProtocolHelpers.HandshakeKeyPool import HandshakeKeyPool
+from ProtocolHelpers.SessionTickets import RESUME_MAGIC, ResumableSession, SessionTicketManager
+from ProtocolHelpers.PacketFramer import PacketFramer
+import server_config
+
+RECV_BUFFER_SIZE = 1024
+
+class AsyncEncryptedSocket:
+    """
+    asyncio counterpart of EncryptedSocket - runs the same handshake, framing and
+    AES-GCM session on top of an asyncio stream pair instead of a blocking socket.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key_provider: HandshakeKeyPool | None = None, ticket_manager: SessionTicketManager | None = None):
+        self.key_provider = key_provider
+        self.ticket_manager = ticket_manager
+        self.resumed_session: ResumableSession | None = None
+        self.reader = reader
+        self.writer = writer
+        self.framer = PacketFramer()
+        self.crypto_engine = GameCryptoEngine()
+
+    async def execute_server_handshake(self) -> bool:
+        """
+        Executes the Server-side handshake sequence without blocking the event loop.
+        RSA key generation (when no ready key is available) is pushed to a worker thread.
+        """
+        try:
+            # 0. A client resuming its session may send the ticket right away - no RSA key is taken for it
+            if self.ticket_manager and await self.resume_early():
+                print("[Handshake] Resumed a session before sending a public key.")
+                return True
+
+            # 1. Get RSA keys - generating them off the event loop - and public PEM bytes
+            private_key = self.key_provider.take_nowait() if self.key_provider else None
+            if private_key != None:
+                pub_key_bytes = self.crypto_engine.load_handshake_keys(private_key)
+            elif self.key_provider:
+                pub_key_bytes = self.crypto_engine.load_handshake_keys(await asyncio.to_thread(self.key_provider.take))
+            else:
+                pub_key_bytes = await asyncio.to_thread(self.crypto_engine.generate_handshake_keys)
+
+            # 2. Frame and send to client
+            self.writer.write(PacketFramer.frame_payload(pub_key_bytes))
+            await self.writer.drain()
+            print("[Handshake] Sent public RSA identity key to client.")
+
+            # 3. Wait for the client's encrypted AES key frame
+            while not self.crypto_engine.is_handshake_complete():
+                payload_frame = await self.recv_frame()
+                if payload_frame is None:
+                    return False
+
+                payload = bytes(payload_frame)
+                if self.ticket_manager and payload.startswith(RESUME_MAGIC):
+                    # 4a. Resume a previous session - on failure the client falls back to a regular handshake
+                    self.resumed_session, reply = self.ticket_manager.resume(payload, self.crypto_engine)
+                else:
+                    # 4b. Decrypt the key (or finish the X25519 exchange) to unlock secure AES mode
+                    reply = self.crypto_engine.complete_handshake(payload, self.key_provider == None or self.key_provider.accepts_client_keys)
+                if reply is not None:
+                    self.writer.write(PacketFramer.frame_payload(reply))
+            print("[Handshake] Successfully unlocked AES session key. Connection secure.")
+            return True
+        except Exception as e:
+            print(f"[Handshake] Error during negotiation: {e}")
+            return False
+
+    async def resume_early(self) -> bool:
+        """
+        Resumes a session from a ticket the client sent before the server's first frame (waits RESUME_EARLY_WAIT_SEC).
+        On failure the RESUME_FAILED reply is sent, and the regular handshake follows. Returns whether the session was resumed.
+        """
+        try:
+            # nothing is taken from the stream if the wait times out
+            chunk = await asyncio.wait_for(self.reader.read(RECV_BUFFER_SIZE), server_config.RESUME_EARLY_WAIT_SEC)
+        except TimeoutError:
+            return False
+        if not chunk:
+            raise ConnectionError("Client disconnected")
+        self.framer.append(chunk)
+        payload_frame = await self.recv_frame()
+        if payload_frame is None:
+            raise ConnectionError("Client disconnected")
+        payload = bytes(payload_frame)
+        if not payload.startswith(RESUME_MAGIC):
+            raise ValueError("Client sent a frame before the public key without resuming")
+        self.resumed_session, reply = self.ticket_manager.resume(payload, self.crypto_engine)
+        self.writer.write(PacketFramer.frame_payload(reply))
+        await self.writer.drain()
+        return self.resumed_session is not None
+
+    def send_str(self, msg_str: str) -> None:
+        """
+        Encrypts a string, wraps it with a length prefix and hands it to the transport.
+        Never blocks - use drain() to wait for the transport buffer to flush.
+        """
+        if not self.crypto_engine.is_handshake_complete():
+            raise RuntimeError("Cannot send data: Crypto handshake is not completed yet.")
+
+        encrypted_bytes = self.crypto_engine.encrypt_message(msg_str)
+        self.writer.write(PacketFramer.frame_payload(encrypted_bytes))
+
+    def send_frame(self, frame: bytes) -> None:
+        """Hands a frame that was framed and encrypted already (i.e. sealed under a room group key) to the transport."""
+        self.writer.write(frame)
+
+    async def drain(self) -> None:
+        await self.writer.drain()
+
+    async def recv_frame(self) -> memoryview | None:
+        """
+        Returns the next complete raw frame, or None if the connection closed.
+        The frame is only valid until the next call to recv_frame().
+        """
+        payload_frame = self.framer.next_frame()
+        while payload_frame is None:
+            try:
+                chunk = await self.reader.read(RECV_BUFFER_SIZE)
+            except ConnectionResetError:
+                return None # Client disconnected abruptly
+            if not chunk:
+                return None # Connection closed cleanly by remote host
+
+            self.framer.append(chunk)
+            payload_frame = self.framer.next_frame()
+        return payload_frame
+
+    async def recv_str(self) -> str | None:
+        """Returns the next fully decrypted string, or None if the connection closed."""
+        payload_frame = await self.recv_frame()
+        if payload_frame is None:
+            return None
+        return self.crypto_engine.decrypt_message(payload_frame)
+
+    def close(self) -> None:
+        """Cleanly closes the underlying transport."""
+        self.writer.close()
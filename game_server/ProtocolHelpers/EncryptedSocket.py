@@ -1,23 +1,43 @@
+import base64
+import select
 import socket
 from ProtocolHelpers.GameCryptoEngine import GameCryptoEngine
-from ProtocolHelpers.PacketFramer import PacketFramer
+from ProtocolHelpers.HandshakeKeyPool import HandshakeKeyPool
+from ProtocolHelpers.SessionTickets import RESUME_MAGIC, ResumableSession, SessionTicketManager
+from ProtocolHelpers.PacketFramer import HEADER_SIZE, PacketFramer
+from protocol import NETWORK_ENCODING
+import server_config
 
-RECV_BUFFER_SIZE = 1024
+# Messages at least this big are encrypted straight into the framer's output buffer.
+# Below it, the extra buffer bookkeeping costs more than the copies it saves.
+ENCRYPT_INTO_MIN_SIZE = 16 * 1024
 
 class EncryptedSocket:
-    def __init__(self, sock: socket.socket):
+    def __init__(self, sock: socket.socket, key_provider: HandshakeKeyPool | None = None, ticket_manager: SessionTicketManager | None = None):
         self.sock = sock
+        self.key_provider = key_provider
+        self.ticket_manager = ticket_manager
+        self.resumed_session: ResumableSession | None = None
         self.framer = PacketFramer()
         self.crypto_engine = GameCryptoEngine()
 
     def execute_server_handshake(self) -> bool:
         """
         Executes the Server-side handshake sequence.
-        Generates RSA keys, sends public key, and waits for the encrypted AES key.
+        Takes (or generates) RSA keys, sends public key, and waits for the encrypted AES key,
+        an X25519 hello or a resumption ticket.
         """
         try:
-            # 1. Generate RSA keys and get public PEM bytes
-            pub_key_bytes = self.crypto_engine.generate_handshake_keys()
+            # 0. A client resuming its session may send the ticket right away - no RSA key is taken for it
+            if self.ticket_manager and self.resume_early():
+                print("[Handshake] Resumed a session before sending a public key.")
+                return True
+
+            # 1. Get RSA keys and public PEM bytes
+            if self.key_provider:
+                pub_key_bytes = self.crypto_engine.load_handshake_keys(self.key_provider.take())
+            else:
+                pub_key_bytes = self.crypto_engine.generate_handshake_keys()
             
             # 2. Frame and send to client
             handshake_packet = PacketFramer.frame_payload(pub_key_bytes)
@@ -26,36 +46,89 @@ class EncryptedSocket:
             
             # 3. Block until we receive the client's encrypted AES key frame
             while not self.crypto_engine.is_handshake_complete():
-                chunk = self.sock.recv(RECV_BUFFER_SIZE)
-                if not chunk:
-                    return False
-                
-                self.framer.append(chunk)
                 payload_frame = self.framer.next_frame()
-                
-                if payload_frame:
-                    # 4. Decrypt the key to unlock secure AES mode
-                    self.crypto_engine.decrypt_handshake_session_key(payload_frame)
-                    print("[Handshake] Successfully unlocked AES session key. Connection secure.")
-                    return True
-            return False
+                if payload_frame is None:
+                    if self.framer.recv_into(self.sock) == 0:
+                        return False
+                    continue
+
+                payload = bytes(payload_frame)
+                if self.ticket_manager and payload.startswith(RESUME_MAGIC):
+                    # 4a. Resume a previous session - on failure the client falls back to a regular handshake
+                    self.resumed_session, reply = self.ticket_manager.resume(payload, self.crypto_engine)
+                else:
+                    # 4b. Decrypt the key (or finish the X25519 exchange) to unlock secure AES mode
+                    reply = self.crypto_engine.complete_handshake(payload, self.key_provider == None or self.key_provider.accepts_client_keys)
+                if reply is not None:
+                    self.sock.sendall(PacketFramer.frame_payload(reply))
+            print("[Handshake] Successfully unlocked AES session key. Connection secure.")
+            return True
         except Exception as e:
             print(f"[Handshake] Error during negotiation: {e}")
             return False
 
+    def resume_early(self) -> bool:
+        """
+        Resumes a session from a ticket the client sent before the server's first frame (waits RESUME_EARLY_WAIT_SEC).
+        On failure the RESUME_FAILED reply is sent, and the regular handshake follows. Returns whether the session was resumed.
+        """
+        if self.framer.buffered_size == 0 and not select.select([self.sock], [], [], server_config.RESUME_EARLY_WAIT_SEC)[0]:
+            return False
+        payload_frame = self.framer.next_frame()
+        while payload_frame is None:
+            if self.framer.recv_into(self.sock) == 0:
+                raise ConnectionError("Client disconnected")
+            payload_frame = self.framer.next_frame()
+        payload = bytes(payload_frame)
+        if not payload.startswith(RESUME_MAGIC):
+            raise ValueError("Client sent a frame before the public key without resuming")
+        self.resumed_session, reply = self.ticket_manager.resume(payload, self.crypto_engine)
+        self.sock.sendall(PacketFramer.frame_payload(reply))
+        return self.resumed_session is not None
+
     def send_str(self, msg_str: str) -> None:
         """Encrypts a string, wraps it with a length prefix, and sends it over TCP."""
         if not self.crypto_engine.is_handshake_complete():
             raise RuntimeError("Cannot send data: Crypto handshake is not completed yet.")
             
-        # 1. Encrypt message payload via AES-GCM
-        encrypted_bytes = self.crypto_engine.encrypt_message(msg_str)
-        
-        # 2. Wrap with 4-byte length prefix
-        framed_packet = PacketFramer.frame_payload(encrypted_bytes)
+        plain_bytes = msg_str.encode(NETWORK_ENCODING)
+        if len(plain_bytes) < ENCRYPT_INTO_MIN_SIZE:
+            # 1. Encrypt message payload via AES-GCM and wrap it with a 4-byte length prefix
+            frame = PacketFramer.frame_payload(self.crypto_engine.encrypt_message_bytes(plain_bytes))
+        else:
+            # 1. Get a reusable frame buffer with the 4-byte length prefix already written
+            frame = self.framer.frame_buffer(GameCryptoEngine.encrypted_size(len(plain_bytes)))
+            # 2. Encrypt message payload via AES-GCM straight into the frame
+            self.crypto_engine.encrypt_into(plain_bytes, frame[HEADER_SIZE:])
         
         # 3. Fire down the wire
-        self.sock.sendall(framed_packet)
+        self.sock.sendall(frame)
+
+    def send_frame(self, frame: bytes) -> None:
+        """Sends a frame that was framed and encrypted already (i.e. sealed under a room group key)."""
+        self.sock.sendall(frame)
+
+    def detach(self) -> tuple[int, dict]:
+        """
+        Gives up the connection, so another process can continue the session on it (see ShardedServer).
+        Returns the file descriptor of the socket and the state of the session: { key, nonceCounter, buffered } -
+        the received bytes that weren't read yet go along. Nothing may be sent or received on this object afterwards.
+        """
+        aes_key, nonce_counter = self.crypto_engine.session_state()
+        session = {
+            "key": base64.b64encode(aes_key).decode(),
+            "nonceCounter": nonce_counter,
+            "buffered": base64.b64encode(self.framer.take_buffered()).decode(),
+        }
+        return self.sock.detach(), session
+
+    @staticmethod
+    def from_session(sock: socket.socket, session: dict) -> "EncryptedSocket":
+        """Continues a session given up by detach() (in another process) on the socket of its connection."""
+        secure_sock = EncryptedSocket(sock)
+        secure_sock.crypto_engine.set_session_key(base64.b64decode(session["key"]), session["nonceCounter"])
+        secure_sock.framer.append(base64.b64decode(session["buffered"]))
+        return secure_sock
 
     def recv_str(self) -> str | None:
         """
@@ -70,11 +143,8 @@ class EncryptedSocket:
         # Step 2: If not, pull new chunks from the raw network socket
         try:
             while True:
-                chunk = self.sock.recv(RECV_BUFFER_SIZE)
-                if not chunk:
+                if self.framer.recv_into(self.sock) == 0:
                     return None # Connection closed cleanly by remote host
-                    
-                self.framer.append(chunk)
                 
                 # Check again if a complete packet has formed
                 payload_frame = self.framer.next_frame()
@@ -87,5 +157,9 @@ class EncryptedSocket:
             return None # Client disconnected abruptly
 
     def close(self) -> None:
-        """Cleanly closes the underlying network socket."""
+        """Cleanly closes the underlying network socket, waking up any thread blocked on it."""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # Already disconnected
         self.sock.close()
\ No newline at end of file
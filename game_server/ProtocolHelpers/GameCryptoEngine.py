@@ -1,27 +1,64 @@
-import os
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+import itertools
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, x25519
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 from protocol import NETWORK_ENCODING
 
 NONCE_NUM_BYTES = 12
+TAG_NUM_BYTES = 16
+
+# Nonces of server->client messages: [4B direction prefix] + [8B big-endian message counter]
+# Clients pick random nonces, so a fixed prefix keeps the two directions apart.
+SERVER_NONCE_PREFIX = b"\x00\x00\x00\x01"
+# Stop encrypting under the session key well before the counter could repeat
+NONCE_COUNTER_LIMIT = 1 << 32
+
+# Negotiated X25519 handshake: instead of an RSA-encrypted AES key, the client may answer the
+# server's RSA public key with [X25519_HELLO_MAGIC] + [32B ephemeral X25519 public key].
+# The server replies with [32B ephemeral X25519 public key] + [RSA-PSS signature over both public keys]
+# and both sides derive the AES session key from the shared secret with HKDF-SHA256.
+X25519_HELLO_MAGIC = b"X25519"
+X25519_KEY_NUM_BYTES = 32
+X25519_HKDF_INFO = b"maze-game x25519 session"
+AES_KEY_NUM_BYTES = 32
+
+def x25519_signature_padding() -> padding.PSS:
+    return padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+
+def derive_x25519_session_key(shared_secret: bytes, client_pub: bytes, server_pub: bytes) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=AES_KEY_NUM_BYTES,
+        salt=None,
+        info=X25519_HKDF_INFO + client_pub + server_pub,
+    ).derive(shared_secret)
+
+class NonceExhaustedError(RuntimeError):
+    pass
 
 class GameCryptoEngine:
     """
-    Manages RSA handshake key generation and stateful AES-GCM encryption/decryption 
+    Manages RSA handshake key generation and stateful AES-GCM encryption/decryption
     per client connection.
     """
     def __init__(self):
         self.private_key: rsa.RSAPrivateKey | None = None
         self.public_key: rsa.RSAPublicKey | None = None
         self.aes_key: bytes | None = None
+        self.aesgcm: AESGCM | None = None
+        self.nonce_counter = itertools.count()
 
     def generate_handshake_keys(self) -> bytes:
         """Generates RSA keys and returns the serialized Public Key PEM bytes to send to client."""
-        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return self.load_handshake_keys(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+    def load_handshake_keys(self, private_key: rsa.RSAPrivateKey) -> bytes:
+        """Uses a ready RSA key (from a key pool / identity key) and returns the Public Key PEM bytes to send to client."""
+        self.private_key = private_key
         self.public_key = self.private_key.public_key()
-        
+
         return self.public_key.public_bytes(
             encoding=serialization.Encoding.PEM,
             format=serialization.PublicFormat.SubjectPublicKeyInfo
@@ -31,40 +68,123 @@ class GameCryptoEngine:
         """Decrypts the incoming AES key sent from the Electron proxy and assigns it."""
         if not self.private_key:
             raise RuntimeError("RSA Keys not initialized yet.")
-            
-        self.aes_key = self.private_key.decrypt(
+
+        self.set_session_key(self.private_key.decrypt(
             encrypted_aes_key_frame,
             padding.OAEP(
                 mgf=padding.MGF1(algorithm=hashes.SHA256()),
                 algorithm=hashes.SHA256(),
                 label=None
             )
-        )
+        ))
+
+    def complete_handshake(self, client_frame: bytes, allow_client_key: bool = True) -> bytes | None:
+        """
+        Completes the handshake from the client's reply to the RSA public key.
+        allow_client_key: whether the client may pick the session key and send it RSA-encrypted. Must be False when
+        the RSA key outlives the connection - a recorded handshake could be replayed to get the same session key.
+        Returns a payload that must be sent back to the client (X25519 mode), or None (RSA mode).
+        """
+        if client_frame.startswith(X25519_HELLO_MAGIC) and len(client_frame) == len(X25519_HELLO_MAGIC) + X25519_KEY_NUM_BYTES:
+            return self.complete_x25519_handshake(client_frame[len(X25519_HELLO_MAGIC):])
+        if not allow_client_key:
+            raise ValueError("Client-chosen session keys are not accepted under a persistent RSA key - the X25519 exchange is required.")
+        self.decrypt_handshake_session_key(client_frame)
+        return None
+
+    def complete_x25519_handshake(self, client_pub: bytes) -> bytes:
+        """Derives the session key from an ephemeral X25519 exchange and returns the signed server reply."""
+        if not self.private_key:
+            raise RuntimeError("RSA Keys not initialized yet.")
+
+        eph_key = x25519.X25519PrivateKey.generate()
+        server_pub = eph_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        shared_secret = eph_key.exchange(x25519.X25519PublicKey.from_public_bytes(client_pub))
+        signature = self.private_key.sign(client_pub + server_pub, x25519_signature_padding(), hashes.SHA256())
+
+        self.set_session_key(derive_x25519_session_key(shared_secret, client_pub, server_pub))
+        return server_pub + signature
+
+    def set_session_key(self, aes_key: bytes, first_counter: int = 0) -> None:
+        """
+        Sets the AES session key and builds the cipher context reused for the whole session.
+        first_counter: the nonce counter to continue from (a session continued from another process).
+        """
+        self.aes_key = aes_key
+        self.aesgcm = AESGCM(aes_key)
+        self.nonce_counter = itertools.count(first_counter)
+
+    def session_state(self) -> tuple[bytes, int]:
+        """
+        Returns the session key and the next nonce counter, for continuing the session in another process.
+        The counter is used up - nothing may be encrypted under this engine afterwards.
+        """
+        return self.aes_key, next(self.nonce_counter)
 
     def is_handshake_complete(self) -> bool:
         return self.aes_key is not None
 
+    def next_nonce(self) -> bytes:
+        """Returns the next server->client nonce. Raises NonceExhaustedError once the session must be closed."""
+        counter = next(self.nonce_counter)
+        if counter >= NONCE_COUNTER_LIMIT:
+            raise NonceExhaustedError("AES session nonce counter exhausted - the connection must be closed.")
+        return SERVER_NONCE_PREFIX + counter.to_bytes(8, "big")
+
+    @staticmethod
+    def encrypted_size(plain_size: int) -> int:
+        """Size of the AES-GCM payload structure for a plain text of plain_size bytes."""
+        return NONCE_NUM_BYTES + plain_size + TAG_NUM_BYTES
+
     def encrypt_message(self, plain_text_str: str) -> bytes:
         """Encrypts data into an AES-GCM payload structure: [12B Nonce] + [Ciphertext + 16B Tag]"""
-        if not self.aes_key:
+        return self.encrypt_message_bytes(plain_text_str.encode(NETWORK_ENCODING))
+
+    def encrypt_message_bytes(self, plain_bytes: bytes) -> bytes:
+        """Encrypts already encoded data into an AES-GCM payload structure."""
+        if not self.aesgcm:
+            raise RuntimeError("Attempted encryption before handshake complete.")
+
+        nonce = self.next_nonce()
+        return nonce + self.aesgcm.encrypt(nonce, plain_bytes, None)
+
+    def encrypt_into(self, plain_bytes: bytes, out: memoryview) -> int:
+        """
+        Encrypts data straight into out (i.e. a framer's output buffer) using the same
+        [12B Nonce] + [Ciphertext + 16B Tag] structure. out must be exactly encrypted_size() bytes long.
+        Returns the number of bytes written.
+        """
+        if not self.aesgcm:
             raise RuntimeError("Attempted encryption before handshake complete.")
-            
-        aesgcm = AESGCM(self.aes_key)
-        nonce = os.urandom(NONCE_NUM_BYTES)
-        ciphertext = aesgcm.encrypt(nonce, plain_text_str.encode(NETWORK_ENCODING), None)
-        return nonce + ciphertext
 
-    def decrypt_message(self, aes_payload_frame: bytes) -> str:
+        nonce = self.next_nonce()
+        out[:NONCE_NUM_BYTES] = nonce
+        self.aesgcm.encrypt_into(nonce, plain_bytes, None, out[NONCE_NUM_BYTES:])
+        return len(out)
+
+    def decrypt_into(self, aes_payload_frame: bytes | memoryview, out: memoryview) -> int:
+        """Decrypts a structured AES-GCM network frame payload into out. Returns the plain text size."""
+        if not self.aesgcm:
+            raise RuntimeError("Attempted decryption before handshake complete.")
+
+        if len(aes_payload_frame) < NONCE_NUM_BYTES + TAG_NUM_BYTES:
+            raise ValueError("Corrupt AES frame.")
+
+        plain_size = len(aes_payload_frame) - NONCE_NUM_BYTES - TAG_NUM_BYTES
+        nonce = aes_payload_frame[:NONCE_NUM_BYTES]
+        ciphertext = aes_payload_frame[NONCE_NUM_BYTES:]
+        self.aesgcm.decrypt_into(nonce, ciphertext, None, out[:plain_size])
+        return plain_size
+
+    def decrypt_message(self, aes_payload_frame: bytes | memoryview) -> str:
         """Decrypts a structured AES-GCM network frame payload."""
-        if not self.aes_key:
+        if not self.aesgcm:
             raise RuntimeError("Attempted decryption before handshake complete.")
-            
+
         if len(aes_payload_frame) < NONCE_NUM_BYTES:
             raise ValueError("Corrupt AES frame.")
-            
+
         nonce = aes_payload_frame[:NONCE_NUM_BYTES]
         ciphertext = aes_payload_frame[NONCE_NUM_BYTES:]
-        
-        aesgcm = AESGCM(self.aes_key)
-        decrypted_bytes = aesgcm.decrypt(nonce, ciphertext, None)
+        decrypted_bytes = self.aesgcm.decrypt(nonce, ciphertext, None)
         return decrypted_bytes.decode(NETWORK_ENCODING)
@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import deque
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import server_config
+
+# handshake key modes
+FRESH_KEY_MODE = "fresh" # generate a new RSA key on every connection
+POOL_KEY_MODE = "pool" # take pre-generated RSA keys from a pool refilled in the background
+IDENTITY_KEY_MODE = "identity" # one persistent RSA identity key for all connections
+HANDSHAKE_KEY_MODES = [FRESH_KEY_MODE, POOL_KEY_MODE, IDENTITY_KEY_MODE]
+
+def generate_rsa_key() -> rsa.RSAPrivateKey:
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+class HandshakeKeyPool:
+    """
+    Keeps a number of ready RSA handshake keys, refilled by a background thread
+    so key generation never runs on the accept/handshake path (unless the pool runs dry).
+    """
+    accepts_client_keys = True # every key is used for a single connection
+    def __init__(self, size: int = server_config.HANDSHAKE_KEY_POOL_SIZE):
+        self.size = size
+        self._keys: deque[rsa.RSAPrivateKey] = deque()
+        self._cond = threading.Condition()
+        self._refill_thread: threading.Thread | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self._refill_thread != None: return
+        self._refill_thread = threading.Thread(target=self.refill_loop, daemon=True)
+        self._refill_thread.start()
+
+    def refill_loop(self):
+        while True:
+            with self._cond:
+                while len(self._keys) >= self.size:
+                    self._cond.wait()
+            new_key = generate_rsa_key()
+            with self._cond:
+                self._keys.append(new_key)
+
+    # take a ready key - returns None if the pool is empty
+    def take_nowait(self) -> rsa.RSAPrivateKey | None:
+        with self._cond:
+            if not len(self._keys):
+                return None
+            self.hits += 1
+            self._cond.notify()
+            return self._keys.popleft()
+
+    # take a ready key, generating one on the spot if the pool is empty
+    def take(self) -> rsa.RSAPrivateKey:
+        key = self.take_nowait()
+        if key != None: return key
+        with self._cond:
+            self.misses += 1
+        return generate_rsa_key()
+
+    def get_stats(self) -> dict:
+        return {
+            "ready": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+class FreshKeyProvider:
+    """Generates a new RSA key for every handshake (the original behavior)."""
+    accepts_client_keys = True
+    def start(self):
+        pass
+
+    def take_nowait(self) -> rsa.RSAPrivateKey | None:
+        return None
+
+    def take(self) -> rsa.RSAPrivateKey:
+        return generate_rsa_key()
+
+class IdentityKeyProvider:
+    """
+    Uses a single persistent RSA identity key, loaded from key_file (generated on first run).
+    Clients must upgrade to an ephemeral X25519 exchange signed by this key. An RSA-encrypted session key picked by
+    the client is refused: under a key that never changes, a recorded handshake could be replayed to get the same
+    session key and nonces again.
+    """
+    accepts_client_keys = False
+    def __init__(self, key_file: str = server_config.IDENTITY_KEY_FILE):
+        self.key_file = key_file
+        self.private_key: rsa.RSAPrivateKey | None = None
+
+    def start(self):
+        if self.private_key != None: return
+        if os.path.exists(self.key_file):
+            with open(self.key_file, "rb") as f:
+                self.private_key = serialization.load_pem_private_key(f.read(), password=None)
+            return
+        self.private_key = generate_rsa_key()
+        with os.fdopen(os.open(self.key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f: # readable by the owner only
+            f.write(self.private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            ))
+
+    def take_nowait(self) -> rsa.RSAPrivateKey | None:
+        return self.private_key
+
+    def take(self) -> rsa.RSAPrivateKey:
+        return self.private_key
+
+def create_key_provider(mode: str = server_config.HANDSHAKE_KEY_MODE) -> HandshakeKeyPool | FreshKeyProvider | IdentityKeyProvider:
+    match mode:
+        case "fresh":
+            return FreshKeyProvider()
+        case "pool":
+            return HandshakeKeyPool()
+        case "identity":
+            return IdentityKeyProvider()
+    raise ValueError(f"Invalid handshake key mode '{mode}'")
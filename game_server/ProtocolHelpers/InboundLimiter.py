@@ -0,0 +1,77 @@
+import json
+import re
+import time
+from protocol import MsgType
+
+import server_config
+
+# finds the msgType of a request without decoding the rest of its json - when it's the first key (as clients send it)
+MSG_TYPE_PATTERN = re.compile(r'\s*\{\s*"msgType"\s*:\s*"([^"\\]*)"')
+MSG_TYPE_KEY = '"msgType"'
+
+MSG_TYPE_VALUES = frozenset(msg_type.value for msg_type in MsgType)
+
+# the msgType of a request string, None if it has none or it isn't a MsgType
+# a request whose msgType isn't its first key, or that has another "msgType" key after it (nested in its data, or a
+# duplicate key - json keeps the last one), is decoded, so it's always classified by the msgType it's handled as
+# so is a request with a backslash after its msgType - an escaped key ("msg\u0054ype") decodes to "msgType" too
+def sniff_msg_type(msg: str) -> str | None:
+    match = MSG_TYPE_PATTERN.match(msg)
+    if match and msg.find(MSG_TYPE_KEY, match.end()) < 0 and msg.find("\\", match.end()) < 0:
+        msg_type = match.group(1)
+    else:
+        try:
+            msg_type = json.loads(msg).get("msgType")
+        except: return None
+    return msg_type if isinstance(msg_type, str) and msg_type in MSG_TYPE_VALUES else None
+
+class TokenBucket:
+    # rate: tokens added per second, capacity: max tokens (the largest burst)
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens < 1: return False
+        self.tokens -= 1
+        return True
+
+class InboundLimiter:
+    """
+    Rate limits the requests of a single connection with a token bucket per message type (server_config.INBOUND_RATE_LIMITS,
+    INBOUND_DEFAULT_RATE_LIMIT for the other types). Requests are classified by sniffing their msgType,
+    so requests over the limit are dropped before their json is decoded.
+    """
+    def __init__(self, rate_limits: dict[str, tuple[float, float]] = server_config.INBOUND_RATE_LIMITS,
+                 default_rate_limit: tuple[float, float] = server_config.INBOUND_DEFAULT_RATE_LIMIT):
+        self.rate_limits = rate_limits
+        self.default_rate_limit = default_rate_limit
+        self._buckets: dict[str | None, TokenBucket] = {}
+
+        # counters
+        self.received_count = 0
+        self.dropped_counts: dict[str, int] = {} # msgType ("None" for unknown types) -> requests dropped by the rate limit
+        self.coalesced_count = 0 # positions replaced by a newer one before they were handled
+
+    # whether a request of a msgType (from sniff_msg_type) may be handled
+    def allow(self, msg_type: str | None) -> bool:
+        self.received_count += 1
+        bucket = self._buckets.get(msg_type)
+        if bucket == None:
+            bucket = self._buckets[msg_type] = TokenBucket(*self.rate_limits.get(msg_type, self.default_rate_limit))
+        if bucket.take(): return True
+        key = str(msg_type)
+        self.dropped_counts[key] = self.dropped_counts.get(key, 0) + 1
+        return False
+
+    def get_stats(self) -> dict:
+        return {
+            "received": self.received_count,
+            "dropped": dict(self.dropped_counts),
+            "coalesced": self.coalesced_count,
+        }
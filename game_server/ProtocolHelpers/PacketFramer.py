@@ -1,34 +1,106 @@
+import socket
 import struct
 
+HEADER_SIZE = 4
+INITIAL_BUFFER_SIZE = 4096
+MIN_RECV_SIZE = 1024 # always leave room for at least this many bytes before receiving
+MAX_FRAME_LENGTH = 1 << 20 # 1 MiB - longer length headers are treated as a protocol violation
+
+class FrameTooLargeError(ValueError):
+    pass
 
 class PacketFramer:
     """
-    Handles buffering chunks from a TCP socket stream and pulling out complete 
+    Handles buffering chunks from a TCP socket stream and pulling out complete
     frames framed by a 4-byte Big-Endian length header.
+
+    Data is received straight into a reusable bytearray; frames are returned as memoryviews
+    into it, so no bytes are copied until the consumer decides to. A returned frame is only
+    valid until the next call to recv_into()/append().
     """
-    def __init__(self):
-        self.buffer = b""
+    def __init__(self, max_frame_length: int = MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self._buffer = bytearray(INITIAL_BUFFER_SIZE)
+        self._start = 0 # read offset - start of the first unconsumed byte
+        self._end = 0 # write offset - end of the received data
+        self._out_buffer = bytearray(INITIAL_BUFFER_SIZE)
+        self._out_view = memoryview(self._out_buffer)
+
+    @property
+    def buffered_size(self) -> int:
+        return self._end - self._start
+
+    # make sure at least num_bytes can be written after the received data
+    def _reserve(self, num_bytes: int):
+        if self._end + num_bytes <= len(self._buffer):
+            return
+        pending = self._end - self._start
+        if pending + num_bytes <= len(self._buffer) // 2:
+            # plenty of space once the consumed prefix is dropped - compact in place
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        else:
+            # grow into a new buffer; frames handed out earlier keep referencing the old one
+            new_buffer = bytearray(max(len(self._buffer) * 2, pending + num_bytes))
+            new_buffer[:pending] = self._buffer[self._start:self._end]
+            self._buffer = new_buffer
+        self._start = 0
+        self._end = pending
+
+    def recv_into(self, sock: socket.socket) -> int:
+        """Receives straight into the buffer. Returns the number of bytes received (0 -> connection closed)."""
+        self._reserve(MIN_RECV_SIZE)
+        with memoryview(self._buffer) as view:
+            num_received = sock.recv_into(view[self._end:])
+        self._end += num_received
+        return num_received
 
     def append(self, chunk: bytes):
-        self.buffer += chunk
+        self._reserve(len(chunk))
+        self._buffer[self._end:self._end + len(chunk)] = chunk
+        self._end += len(chunk)
 
-    def next_frame(self) -> bytes | None:
-        if len(self.buffer) < 4:
+    def take_buffered(self) -> bytes:
+        """Takes the received bytes that weren't returned in a frame yet (i.e. to hand them over with the connection)."""
+        buffered = bytes(self._buffer[self._start:self._end])
+        self._start = self._end = 0
+        return buffered
+
+    def next_frame(self) -> memoryview | None:
+        if self._end - self._start < HEADER_SIZE:
             return None
-        
+
         # Read 4-byte big-endian length header (Equivalent to Node.js readUInt32BE)
-        msg_len = struct.unpack('!I', self.buffer[:4])[0]
-        
-        if len(self.buffer) < 4 + msg_len:
+        msg_len = struct.unpack_from('!I', self._buffer, self._start)[0]
+        if msg_len > self.max_frame_length:
+            raise FrameTooLargeError(f"Frame of {msg_len} bytes exceeds the maximum of {self.max_frame_length} bytes")
+
+        frame_end = self._start + HEADER_SIZE + msg_len
+        if self._end < frame_end:
             return None # The whole payload frame hasn't arrived yet
 
-        payload = self.buffer[4:4 + msg_len]
-        self.buffer = self.buffer[4 + msg_len:] # Advance stream buffer forward
+        payload = memoryview(self._buffer)[self._start + HEADER_SIZE:frame_end]
+        self._start = frame_end # Advance stream buffer forward
+        if self._start == self._end:
+            # everything was consumed - rewind for free instead of compacting later
+            self._start = self._end = 0
         return payload
 
+    def frame_buffer(self, payload_len: int) -> memoryview:
+        """
+        Returns a reusable output buffer for a single outgoing frame, with the length header
+        already written. The payload is written at [HEADER_SIZE:]; the buffer is only valid until
+        the next call to frame_buffer().
+        """
+        frame_len = HEADER_SIZE + payload_len
+        if len(self._out_buffer) < frame_len:
+            self._out_buffer = bytearray(max(frame_len, len(self._out_buffer) * 2))
+            self._out_view = memoryview(self._out_buffer)
+        struct.pack_into('!I', self._out_buffer, 0, payload_len)
+        return self._out_view[:frame_len]
+
     @staticmethod
     def frame_payload(payload: bytes) -> bytes:
         """Prepends a 4-byte Big-Endian network header to raw bytes."""
         header = struct.pack('!I', len(payload))
         return header + payload
-    
\ No newline at end of file
+
@@ -0,0 +1,58 @@
+import base64
+import itertools
+import threading
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from ProtocolHelpers.GameCryptoEngine import AES_KEY_NUM_BYTES, NONCE_COUNTER_LIMIT, NonceExhaustedError
+from ProtocolHelpers.PacketFramer import PacketFramer
+from protocol import NETWORK_ENCODING, MsgType, build_network_msg
+
+# Nonces of frames sealed under a room group key: [0xFF] + [3B big-endian key id] + [8B big-endian message counter]
+# Session nonces start with SERVER_NONCE_PREFIX, so clients tell the two apart by the first byte of the nonce.
+GROUP_NONCE_MARKER = b"\xff"
+GROUP_KEY_ID_NUM_BYTES = 3
+GROUP_KEY_ID_LIMIT = 1 << (GROUP_KEY_ID_NUM_BYTES * 8)
+# the room replaces its key on its tick once the key has fewer nonces left than this - the spectator fan-out seals
+# frames between ticks and never replaces the key itself, so it must not run out meanwhile
+GROUP_KEY_ROTATE_MARGIN = 1 << 20
+
+_key_ids = itertools.count(1) # ids of the group keys of the server - a client keys the frames it gets by them
+
+class RoomGroupKey:
+    """
+    AES-GCM key shared by the members of a room with the room_group_key feature. A room broadcast is sealed once under
+    it and the same frame is queued to every member, instead of being encrypted under each member's session key by
+    their writer. Members get the key over their own session (ROOM_KEY) before any frame sealed under it, and the room
+    replaces the key when a member leaves, so they can't read the broadcasts sent after.
+    Frames can be sealed from several threads (the game loop and the spectator fan-out of the room), but only the room
+    replaces the key, on its tick.
+    """
+    def __init__(self):
+        self.key_id = next(_key_ids) % GROUP_KEY_ID_LIMIT
+        self.key = AESGCM.generate_key(bit_length=AES_KEY_NUM_BYTES * 8)
+        self._aesgcm = AESGCM(self.key)
+        self._nonce_prefix = GROUP_NONCE_MARKER + self.key_id.to_bytes(GROUP_KEY_ID_NUM_BYTES, "big")
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.key_msg = build_network_msg(None, MsgType.ROOM_KEY, {
+            "keyId": self.key_id,
+            "key": base64.b64encode(self.key).decode(),
+        })
+
+    # whether the key sealed so many frames that the room must replace it (on its next tick)
+    @property
+    def worn_out(self) -> bool:
+        return self._counter >= NONCE_COUNTER_LIMIT - GROUP_KEY_ROTATE_MARGIN
+
+    def next_nonce(self) -> bytes:
+        with self._lock:
+            counter = self._counter
+            self._counter += 1
+        if counter >= NONCE_COUNTER_LIMIT:
+            raise NonceExhaustedError("Room group key nonce counter exhausted - the key must be replaced.")
+        return self._nonce_prefix + counter.to_bytes(8, "big")
+
+    # seal a message into a whole frame, ready to be written to the socket of every member:
+    # [4B length header] + [12B Nonce] + [Ciphertext + 16B Tag] - the layout of session frames
+    def seal(self, message: str) -> bytes:
+        nonce = self.next_nonce()
+        return PacketFramer.frame_payload(nonce + self._aesgcm.encrypt(nonce, message.encode(NETWORK_ENCODING), None))
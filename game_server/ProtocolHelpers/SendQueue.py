@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import server_config
+
+# overflow policies - what to do when a message is queued while the queue is full
+DROP_OLDEST_POLICY = "drop_oldest" # drop the oldest droppable message (position updates), disconnect if there's none
+DISCONNECT_POLICY = "disconnect" # disconnect the client as soon as the queue overflows
+OVERFLOW_POLICIES = [DROP_OLDEST_POLICY, DISCONNECT_POLICY]
+
+class SendQueue:
+    """
+    Bounded outbound message queue of a single client.
+    Producers (room ticks, request handlers) only enqueue; a writer thread/coroutine drains the queue
+    and does the actual encryption and socket writes, so a slow client never blocks its producers.
+    Messages are strings the writer encrypts under the client's session key, or frames that are encrypted already
+    (bytes - room broadcasts sealed once for all the members of the room, see RoomGroupKey).
+    """
+    def __init__(self, max_size: int = server_config.SEND_QUEUE_MAX_SIZE,
+                 max_backlog_sec: float = server_config.SEND_QUEUE_MAX_BACKLOG_SEC,
+                 overflow_policy: str = server_config.SEND_QUEUE_OVERFLOW_POLICY):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid send queue overflow policy '{overflow_policy}'")
+        self.max_size = max_size
+        self.max_backlog_sec = max_backlog_sec
+        self.overflow_policy = overflow_policy
+        self._items: deque[tuple[str | bytes, bool, float]] = deque() # (message, droppable, enqueue time)
+        self._cond = threading.Condition()
+        self.closed = False
+        self.stalled = False # set when the client should be disconnected for not keeping up
+        self.on_put: Callable[[], None] | None = None # wakes up an asyncio writer
+
+        # counters
+        self.enqueued_count = 0
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    # queue a message for sending
+    # droppable: whether the message may be dropped when the queue overflows (i.e. position updates)
+    # returns: False if the message was not queued - the queue is closed or the client stalled
+    def put(self, message: str | bytes, droppable: bool = False) -> bool:
+        with self._cond:
+            if self.closed or self.stalled: return False
+            now = time.monotonic()
+            if len(self._items) and now - self._items[0][2] > self.max_backlog_sec:
+                self.stalled = True
+                return False
+            if len(self._items) >= self.max_size and not self._make_room(droppable):
+                self.stalled = True
+                return False
+            self._items.append((message, droppable, now))
+            self.enqueued_count += 1
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify()
+        if self.on_put: self.on_put()
+        return True
+
+    # free a slot in a full queue according to the overflow policy
+    # returns whether there's room for the new message
+    def _make_room(self, droppable: bool) -> bool:
+        if self.overflow_policy == DISCONNECT_POLICY: return False
+        for i, item in enumerate(self._items):
+            if item[1]:
+                del self._items[i]
+                self.dropped_count += 1
+                return True
+        return False
+
+    # take all the queued messages
+    # blocks until there's at least one message, the queue is closed or the timeout passes
+    def get_batch(self, timeout: float | None = None) -> list[str | bytes]:
+        with self._cond:
+            if not len(self._items) and not self.closed:
+                self._cond.wait(timeout)
+            return self._pop_all()
+
+    # take all the queued messages without waiting
+    def get_batch_nowait(self) -> list[str | bytes]:
+        with self._cond:
+            return self._pop_all()
+
+    def _pop_all(self) -> list[str | bytes]:
+        batch = [item[0] for item in self._items]
+        self._items.clear()
+        return batch
+
+    def mark_sent(self, count: int):
+        self.sent_count += count
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self.on_put: self.on_put()
+
+    def get_stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "maxDepth": self.max_depth,
+            "enqueued": self.enqueued_count,
+            "sent": self.sent_count,
+            "dropped": self.dropped_count,
+            "stalled": self.stalled,
+        }
@@ -0,0 +1,109 @@
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from Database.AccountData import AccountData
+from ProtocolHelpers.GameCryptoEngine import AES_KEY_NUM_BYTES, NONCE_NUM_BYTES, GameCryptoEngine
+
+import server_config
+
+# Resumption: instead of answering the server's RSA public key, a reconnecting client sends
+# [RESUME_MAGIC] + [ticket]. On success the server replies [RESUME_OK_MAGIC] + [16B server random]
+# and both sides derive a fresh AES session key from the ticket's secret with HKDF-SHA256.
+# On failure it replies [RESUME_FAILED_MAGIC] and the client continues with a regular handshake.
+# A client may also send the ticket right after connecting, without waiting for the public key. If it arrives within
+# RESUME_EARLY_WAIT_SEC, no RSA key is taken for the connection - the public key is only sent after RESUME_FAILED.
+# (Otherwise the public key is sent first as usual, and the client skips it before reading the reply to its ticket.)
+RESUME_MAGIC = b"RESUME"
+RESUME_OK_MAGIC = b"RESUME_OK"
+RESUME_FAILED_MAGIC = b"RESUME_FAILED"
+RESUME_RANDOM_NUM_BYTES = 16
+RESUME_HKDF_INFO = b"maze-game session resumption"
+PURGE_INTERVAL_SEC = 60
+
+def derive_resumed_session_key(secret: bytes, server_random: bytes) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=AES_KEY_NUM_BYTES,
+        salt=None,
+        info=RESUME_HKDF_INFO + server_random,
+    ).derive(secret)
+
+class ResumableSession:
+    def __init__(self, account_data: AccountData, secret: bytes, features: list[str]):
+        self.account_data = account_data
+        self.secret = secret
+        self.features = features
+
+class SessionTicketManager:
+    """
+    Issues encrypted, expiring, single-use resumption tickets after login and redeems them on reconnect.
+    Tickets are sealed with a per-process key, so they stop working when the server restarts.
+    Accounts of issued tickets are cached in memory, so resuming needs no database lookups.
+    """
+    def __init__(self, lifetime_sec: float = server_config.SESSION_TICKET_LIFETIME_SEC):
+        self.lifetime_sec = lifetime_sec
+        self._ticket_cipher = AESGCM(AESGCM.generate_key(bit_length=256))
+        self._lock = threading.Lock()
+        self._accounts: dict[int, tuple[AccountData, float]] = {} # account_id -> (account, expiry)
+        self._redeemed: dict[str, float] = {} # ticket id -> expiry
+        self._last_purge = time.time()
+
+    # issue a ticket for a client's current session
+    # returns: the base64 ticket to send to the client
+    def issue(self, account_data: AccountData, session_key: bytes, features: list[str]) -> str:
+        expires_at = time.time() + self.lifetime_sec
+        ticket_body = json.dumps({
+            "tid": uuid.uuid4().hex,
+            "accountId": account_data.account_id,
+            "secret": base64.b64encode(session_key).decode(),
+            "expiresAt": expires_at,
+            "features": features,
+        }).encode()
+        nonce = os.urandom(NONCE_NUM_BYTES)
+        with self._lock:
+            self._purge_expired()
+            self._accounts[account_data.account_id] = (account_data, expires_at)
+        return base64.b64encode(nonce + self._ticket_cipher.encrypt(nonce, ticket_body, None)).decode()
+
+    # redeem a ticket - returns None if it's invalid, expired or was already used
+    def redeem(self, ticket: bytes) -> ResumableSession | None:
+        try:
+            sealed = base64.b64decode(ticket)
+            ticket_body = json.loads(self._ticket_cipher.decrypt(sealed[:NONCE_NUM_BYTES], sealed[NONCE_NUM_BYTES:], None))
+            ticket_id = ticket_body["tid"]
+            expires_at = float(ticket_body["expiresAt"])
+            account_id = int(ticket_body["accountId"])
+            secret = base64.b64decode(ticket_body["secret"])
+            features = list(ticket_body["features"])
+        except Exception:
+            return None
+
+        with self._lock:
+            self._purge_expired()
+            if expires_at < time.time() or ticket_id in self._redeemed: return None
+            if not account_id in self._accounts: return None
+            self._redeemed[ticket_id] = expires_at
+            return ResumableSession(self._accounts[account_id][0], secret, features)
+
+    # resume a session on a new connection from the client's [RESUME_MAGIC] + [ticket] frame
+    # returns: (the resumed session | None, the reply payload to send to the client)
+    def resume(self, resume_frame: bytes, crypto_engine: GameCryptoEngine) -> tuple[ResumableSession | None, bytes]:
+        session = self.redeem(resume_frame[len(RESUME_MAGIC):])
+        if session == None:
+            return None, RESUME_FAILED_MAGIC
+        server_random = os.urandom(RESUME_RANDOM_NUM_BYTES)
+        crypto_engine.set_session_key(derive_resumed_session_key(session.secret, server_random))
+        return session, RESUME_OK_MAGIC + server_random
+
+    def _purge_expired(self):
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL_SEC: return
+        self._last_purge = now
+        self._accounts = {k: v for k, v in self._accounts.items() if v[1] >= now}
+        self._redeemed = {k: v for k, v in self._redeemed.items() if v >= now}
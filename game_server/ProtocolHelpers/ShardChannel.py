@@ -0,0 +1,54 @@
+import json
+import socket
+import threading
+
+# max size of a message on the channel - messages are datagrams of a SOCK_SEQPACKET socket, so they can't be split
+MAX_MESSAGE_SIZE = 256 * 1024
+
+class ShardChannel:
+    """
+    Control channel between the front door process and a worker process (see ShardedServer).
+    Messages are json objects sent as single SOCK_SEQPACKET datagrams over a Unix socket pair, so there's no framing to
+    do, and a message can carry the file descriptor of a client connection along (SCM_RIGHTS) - the receiving process
+    gets its own descriptor of the same connection.
+    Messages can be sent from several threads, and are received by a single reader thread.
+    """
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self._send_lock = threading.Lock()
+
+    # a connected pair of channel ends - (the end of this process, the socket to pass to the other process)
+    @staticmethod
+    def pair() -> tuple["ShardChannel", socket.socket]:
+        local_sock, remote_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        return ShardChannel(local_sock), remote_sock
+
+    # the end of a channel inherited from the process that created the pair
+    @staticmethod
+    def from_fd(fd: int) -> "ShardChannel":
+        return ShardChannel(socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET, fileno=fd))
+
+    # fd: a file descriptor to send along - the caller still owns it, and can close it once this returns
+    def send(self, message: dict, fd: int | None = None):
+        data = json.dumps(message).encode()
+        if len(data) > MAX_MESSAGE_SIZE:
+            raise ValueError(f"Channel message of {len(data)} bytes exceeds the maximum of {MAX_MESSAGE_SIZE} bytes")
+        with self._send_lock:
+            if fd == None: self.sock.sendall(data)
+            else: socket.send_fds(self.sock, [data], [fd])
+
+    # blocks until the next message arrives
+    # returns: (message, the file descriptor sent along | None), or None once the other end closed
+    def recv(self) -> tuple[dict, int | None] | None:
+        data, fds, flags, _ = socket.recv_fds(self.sock, MAX_MESSAGE_SIZE, 1)
+        if not data: return None
+        if flags & socket.MSG_TRUNC:
+            raise ValueError("Channel message was truncated")
+        return json.loads(data), (fds[0] if fds else None)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass # Already disconnected
+        self.sock.close()
@@ -0,0 +1,200 @@
+from __future__ import annotations
+import asyncio
+import itertools
+import os
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from ProtocolHelpers.GameCryptoEngine import AES_KEY_NUM_BYTES, SERVER_NONCE_PREFIX, TAG_NUM_BYTES
+from ProtocolHelpers.InboundLimiter import sniff_msg_type
+from protocol import NETWORK_ENCODING, MsgType, build_network_msg
+
+import server_config
+
+if TYPE_CHECKING:
+    from ClientInfo import ClientInfo
+
+# UDP position channel (clients with the udp_positions feature)
+# Datagram: [8B channel id] + [8B big-endian sequence number] + [AES-GCM ciphertext + 16B tag] of a json message
+# The key is derived from the TCP session key and the channel id with HKDF-SHA256, the nonce is
+# [4B direction prefix] + [the sequence number] and the channel id is authenticated as associated data.
+# Every direction numbers its datagrams from 0 - a datagram that isn't newer than the newest one received is stale.
+CHANNEL_ID_NUM_BYTES = 8
+SEQ_NUM_BYTES = 8
+DATAGRAM_HEADER_SIZE = CHANNEL_ID_NUM_BYTES + SEQ_NUM_BYTES
+CLIENT_NONCE_PREFIX = b"\x00\x00\x00\x02"
+UDP_HKDF_INFO = b"maze-game udp positions"
+RECV_BUFFER_SIZE = 64 * 1024
+
+def derive_udp_key(session_key: bytes, channel_id: bytes) -> bytes:
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=AES_KEY_NUM_BYTES,
+        salt=None,
+        info=UDP_HKDF_INFO + channel_id,
+    ).derive(session_key)
+
+class UdpSession:
+    """
+    One end of the UDP channel of a client - seals outgoing datagrams and opens incoming ones.
+    The server end is created by UdpPositionChannel.register, clients build theirs with the prefixes swapped.
+    """
+    def __init__(self, session_key: bytes, channel_id: bytes,
+                 send_prefix: bytes = SERVER_NONCE_PREFIX, recv_prefix: bytes = CLIENT_NONCE_PREFIX):
+        self.channel_id = channel_id
+        self.send_prefix = send_prefix
+        self.recv_prefix = recv_prefix
+        self.aesgcm = AESGCM(derive_udp_key(session_key, channel_id))
+        self.send_seq = itertools.count()
+        self.recv_seq = -1 # the newest sequence number received
+        self.addr: tuple[str, int] | None = None # where the newest datagram came from - replies go there
+        self.last_recv_time = 0. # time.monotonic() of the newest datagram
+        self.sendto: Callable[[bytes, tuple[str, int]], None] | None = None
+
+        # counters
+        self.sent_count = 0
+        self.received_count = 0
+        self.stale_count = 0 # datagrams older than one received before them
+        self.rejected_count = 0 # datagrams that didn't decrypt
+
+    # whether datagrams from the peer arrived recently - positions go over TCP otherwise
+    @property
+    def is_active(self) -> bool:
+        return self.addr != None and time.monotonic() - self.last_recv_time < server_config.UDP_CHANNEL_TIMEOUT_SEC
+
+    def seal(self, plain_bytes: bytes) -> bytes:
+        seq_bytes = next(self.send_seq).to_bytes(SEQ_NUM_BYTES, "big")
+        return self.channel_id + seq_bytes + self.aesgcm.encrypt(self.send_prefix + seq_bytes, plain_bytes, self.channel_id)
+
+    # the plain bytes of a datagram of this channel, None if it's stale or doesn't decrypt
+    def open(self, datagram: bytes, addr: tuple[str, int] | None = None) -> bytes | None:
+        seq_bytes = datagram[CHANNEL_ID_NUM_BYTES:DATAGRAM_HEADER_SIZE]
+        seq = int.from_bytes(seq_bytes, "big")
+        if seq <= self.recv_seq:
+            self.stale_count += 1
+            return None
+        try:
+            plain_bytes = self.aesgcm.decrypt(self.recv_prefix + seq_bytes, datagram[DATAGRAM_HEADER_SIZE:], self.channel_id)
+        except Exception:
+            self.rejected_count += 1
+            return None
+        self.recv_seq = seq
+        self.addr = addr
+        self.last_recv_time = time.monotonic()
+        self.received_count += 1
+        return plain_bytes
+
+    # send a message to the peer - returns False if it has to go over TCP (the channel isn't active or it's too big)
+    def send(self, message: str) -> bool:
+        if self.sendto == None or not self.is_active: return False
+        plain_bytes = message.encode(NETWORK_ENCODING)
+        if DATAGRAM_HEADER_SIZE + len(plain_bytes) + TAG_NUM_BYTES > server_config.UDP_MAX_DATAGRAM_SIZE: return False
+        try:
+            self.sendto(self.seal(plain_bytes), self.addr)
+        except OSError:
+            return False
+        self.sent_count += 1
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "active": self.is_active,
+            "sent": self.sent_count,
+            "received": self.received_count,
+            "stale": self.stale_count,
+            "rejected": self.rejected_count,
+        }
+
+class UdpPositionChannel:
+    """
+    Server end of the UDP position channels: a single UDP socket shared by every client with the udp_positions feature.
+    Positions sent over it can't hold up (or be held up by) the TCP stream of the client, so a lost packet only loses
+    that position. Only UPDATE_POS and UDP_PING are accepted from clients - every other message stays on TCP.
+    Receives on a dedicated thread, or as a datagram endpoint on the event loop in asyncio mode.
+    """
+    def __init__(self, ip_addr: str = server_config.IP_ADDR, port: int = server_config.UDP_PORT):
+        self.ip_addr = ip_addr
+        self.port = port
+        self.sock: socket.socket | None = None
+        self.transport: asyncio.DatagramTransport | None = None
+        self.recv_thread: threading.Thread | None = None
+        self._sessions: dict[bytes, tuple[UdpSession, ClientInfo]] = {} # channel id -> (session, client)
+        self.unknown_count = 0 # datagrams of channels that don't exist
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.ip_addr, self.port))
+        self.port = self.sock.getsockname()[1]
+        self.recv_thread = threading.Thread(target=self.receive_loop, daemon=True)
+        self.recv_thread.start()
+        print(f"UDP position channel listening on {self.ip_addr}:{self.port}")
+
+    async def start_async(self):
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _DatagramProtocol(self), local_addr=(self.ip_addr, self.port))
+        self.port = self.transport.get_extra_info("sockname")[1]
+        print(f"UDP position channel listening on {self.ip_addr}:{self.port} (asyncio)")
+
+    def close(self):
+        if self.transport: self.transport.close()
+        if self.sock: self.sock.close()
+
+    def _sendto(self, datagram: bytes, addr: tuple[str, int]):
+        if self.transport: self.transport.sendto(datagram, addr)
+        else: self.sock.sendto(datagram, addr)
+
+    # open a channel for a client, keyed by its TCP session key
+    def register(self, client: ClientInfo, session_key: bytes) -> UdpSession:
+        channel_id = os.urandom(CHANNEL_ID_NUM_BYTES)
+        while channel_id in self._sessions:
+            channel_id = os.urandom(CHANNEL_ID_NUM_BYTES)
+        session = UdpSession(session_key, channel_id)
+        session.sendto = self._sendto
+        self._sessions[channel_id] = (session, client)
+        return session
+
+    def unregister(self, session: UdpSession):
+        self._sessions.pop(session.channel_id, None)
+
+    def receive_loop(self):
+        while True:
+            try:
+                datagram, addr = self.sock.recvfrom(RECV_BUFFER_SIZE)
+            except OSError:
+                return # the socket was closed
+            self.handle_datagram(datagram, addr)
+
+    def handle_datagram(self, datagram: bytes, addr: tuple[str, int]):
+        entry = self._sessions.get(datagram[:CHANNEL_ID_NUM_BYTES]) if len(datagram) > DATAGRAM_HEADER_SIZE else None
+        if entry == None:
+            self.unknown_count += 1
+            return
+        session, client = entry
+        plain_bytes = session.open(datagram, addr)
+        if plain_bytes == None: return
+        try:
+            msg = plain_bytes.decode(NETWORK_ENCODING)
+        except UnicodeDecodeError:
+            return
+        msg_type = sniff_msg_type(msg)
+        if msg_type == MsgType.UDP_PING.value:
+            session.send(build_network_msg(None, MsgType.UDP_PING))
+        elif msg_type == MsgType.UPDATE_POS.value:
+            client.emit_udp_position(msg)
+
+    def get_stats(self) -> dict:
+        return {
+            "channels": len(self._sessions),
+            "unknown": self.unknown_count,
+        }
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, channel: UdpPositionChannel):
+        self.channel = channel
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]):
+        self.channel.handle_datagram(data, addr)
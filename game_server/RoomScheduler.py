@@ -0,0 +1,224 @@
+from __future__ import annotations
+import asyncio
+import math
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING
+from uuid import UUID
+from GameRoom import GAME_LOOP_RATE
+import server_config
+
+if TYPE_CHECKING:
+    from GameRoom import GameRoom
+
+# per-room scheduling state and tick statistics
+class ScheduledRoom:
+    def __init__(self, room: GameRoom, deadline: float):
+        self.room = room
+        self.deadline = deadline
+        self.last_deadline = deadline # the deadline of the last tick - the tick rate is aligned to it
+        self.last_active = deadline # when the room last had something to handle (see RoomScheduler.wake)
+        self.idle = False
+        self.version = 0 # bumped whenever the room is rescheduled - older wheel entries are stale
+        self.retired = False
+
+        self.tick_count = 0
+        self.last_tick_ms = 0.
+        self.avg_tick_ms = 0.
+        self.max_tick_ms = 0.
+        self.overrun_count = 0
+
+    def record_tick(self, duration_ms: float):
+        self.tick_count += 1
+        self.last_tick_ms = duration_ms
+        self.avg_tick_ms = duration_ms if self.tick_count == 1 else self.avg_tick_ms * 0.95 + duration_ms * 0.05
+        self.max_tick_ms = max(self.max_tick_ms, duration_ms)
+
+    def get_stats(self) -> dict:
+        return {
+            "idle": self.idle,
+            "ticks": self.tick_count,
+            "lastTickMs": round(self.last_tick_ms, 3),
+            "avgTickMs": round(self.avg_tick_ms, 3),
+            "maxTickMs": round(self.max_tick_ms, 3),
+            "overruns": self.overrun_count,
+        }
+
+class RoomScheduler:
+    """
+    Drives the ticks of all the rooms of the server from a single thread (or a single task in asyncio mode).
+    (The spectator fan-outs of the rooms - SpectatorFanout - are driven by a scheduler of their own, at their own rate.)
+    Rooms are kept on a hashed timing wheel of slot_sec wide slots, so finding the rooms that are due
+    only touches the current slot. Deadlines advance by whole tick intervals (no drift), ticks that
+    couldn't be made in time are counted as overruns and skipped, and rooms that had nothing to handle for
+    idle_after_sec tick at a lower rate.
+    """
+    def __init__(self, tick_rate: float = GAME_LOOP_RATE, idle_tick_rate: float = server_config.IDLE_TICK_RATE,
+                 idle_after_sec: float = server_config.IDLE_AFTER_SEC,
+                 slot_sec: float = server_config.SCHEDULER_SLOT_SEC, num_slots: int = server_config.SCHEDULER_NUM_SLOTS):
+        self.tick_interval = 1. / tick_rate
+        self.idle_tick_interval = 1. / idle_tick_rate
+        self.idle_after_sec = idle_after_sec
+        self.slot_sec = slot_sec
+        self.num_slots = num_slots
+        self._slots: list[list[tuple[int, ScheduledRoom]]] = [[] for _ in range(num_slots)]
+        self._entries: dict[UUID, ScheduledRoom] = {}
+        self._cursor = self._slot_of(time.perf_counter()) # absolute number of the next slot to process
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_wakeup: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self.running = False
+
+    def _slot_of(self, t: float) -> int:
+        return int(t / self.slot_sec)
+
+    # must be called with the lock held
+    def _insert(self, entry: ScheduledRoom):
+        entry.version += 1
+        self._slots[self._slot_of(entry.deadline) % self.num_slots].append((entry.version, entry))
+
+    def _notify(self):
+        self._cond.notify()
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._async_wakeup.set)
+
+    # start driving a room - its first tick runs as soon as possible
+    def add(self, room: GameRoom):
+        with self._lock:
+            if room.id in self._entries: return
+            entry = ScheduledRoom(room, time.perf_counter())
+            self._entries[room.id] = entry
+            self._insert(entry)
+            self._notify()
+
+    # stop driving a room - it will never tick again
+    def remove(self, room: GameRoom):
+        with self._lock:
+            entry = self._entries.pop(room.id, None)
+            if entry: entry.retired = True
+
+    # the room has something to handle (i.e. a game started, players moved, a request was posted) - an idle room is
+    # brought back to the full tick rate, on the next deadline of that rate (never sooner - waking often doesn't add ticks)
+    def wake(self, room: GameRoom):
+        entry = self._entries.get(room.id)
+        if not entry: return
+        now = time.perf_counter()
+        entry.last_active = now
+        if not entry.idle: return
+        with self._lock:
+            if entry.retired or not entry.idle: return
+            entry.idle = False
+            deadline = entry.last_deadline + self.tick_interval
+            if deadline < now:
+                deadline += math.ceil((now - deadline) / self.tick_interval) * self.tick_interval
+            if deadline < entry.deadline:
+                entry.deadline = deadline
+                self._insert(entry)
+                self._notify()
+
+    # collect the rooms due by now from the wheel
+    def _take_due(self, now: float) -> list[ScheduledRoom]:
+        due = []
+        with self._lock:
+            last_slot = self._slot_of(now)
+            first_slot = max(self._cursor, last_slot - self.num_slots + 1)
+            for abs_slot in range(first_slot, last_slot + 1):
+                index = abs_slot % self.num_slots
+                bucket = self._slots[index]
+                if not bucket: continue
+                self._slots[index] = []
+                for version, entry in bucket:
+                    if entry.retired or version != entry.version: continue
+                    if entry.deadline <= now: due.append(entry)
+                    else: self._slots[index].append((version, entry)) # due on a later turn of the wheel
+            # the current slot is scanned again next time - it may hold rooms due later in the slot
+            self._cursor = last_slot
+        return due
+
+    def _run_tick(self, entry: ScheduledRoom):
+        start = time.perf_counter()
+        try:
+            entry.room.tick()
+        except Exception as e:
+            print(f"Tick of room {entry.room.name} failed:", e)
+            traceback.print_exc()
+        end = time.perf_counter()
+        entry.record_tick((end - start) * 1000)
+
+        with self._lock:
+            if entry.retired: return
+            entry.last_deadline = entry.deadline
+            entry.idle = entry.room.is_idle and end - entry.last_active >= self.idle_after_sec
+            interval = self.idle_tick_interval if entry.idle else self.tick_interval
+            # advance by whole intervals from the previous deadline, so the tick rate doesn't drift
+            entry.deadline += interval
+            if entry.deadline <= end:
+                missed = int((end - entry.deadline) / interval) + 1
+                entry.overrun_count += missed
+                entry.deadline += missed * interval
+            self._insert(entry)
+
+    def run_due(self) -> None:
+        now = time.perf_counter()
+        for entry in self._take_due(now):
+            self._run_tick(entry)
+
+    # seconds until the next room on the wheel may be due (None - nothing is scheduled)
+    # must be called with the lock held
+    def _time_to_next_deadline(self) -> float | None:
+        if not self._entries: return None
+        now = time.perf_counter()
+        current = [entry.deadline for version, entry in self._slots[self._cursor % self.num_slots]
+                   if version == entry.version and self._slot_of(entry.deadline) == self._cursor]
+        if current:
+            return max(0., min(current) - now)
+        for offset in range(1, self.num_slots):
+            if self._slots[(self._cursor + offset) % self.num_slots]:
+                return max(0., (self._cursor + offset) * self.slot_sec - now)
+        return self.num_slots * self.slot_sec
+
+    def start(self):
+        if self._thread != None: return
+        self.running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    # scheduler loop of the threaded server
+    def run(self):
+        while self.running:
+            self.run_due()
+            with self._cond:
+                self._cond.wait(self._time_to_next_deadline())
+
+    # scheduler loop of the asyncio server
+    async def run_async(self):
+        self._loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+        self.running = True
+        while self.running:
+            self._async_wakeup.clear()
+            self.run_due()
+            with self._lock:
+                timeout = self._time_to_next_deadline()
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        self.running = False
+        with self._lock:
+            self._notify()
+
+    # the fraction of a core the ticks take - the average tick time of every room times the rate it ticks at
+    def get_load(self) -> float:
+        with self._lock:
+            return sum(entry.avg_tick_ms / 1000 / (self.idle_tick_interval if entry.idle else self.tick_interval)
+                       for entry in self._entries.values())
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {entry.room.name: entry.get_stats() for entry in self._entries.values()}
@@ -0,0 +1,424 @@
+# Multi-process variant of the game server (threaded mode)
+# the front door process accepts connections and runs handshakes, logins and the lobby (ROOMS_LIST, GENERATE_MAZE),
+# and rooms live on worker processes - so the game loops of the rooms aren't bound to the core of a single process.
+# A client who creates or joins a room has its connection handed to the worker of the room, along with the state of its
+# session and the request (fd passing over a Unix socket, see ShardChannel). A client back in the lobby of a worker
+# (it left its room, or couldn't join it) is handed back to the front door with its next request.
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from uuid import UUID
+from ClientInfo import ClientInfo
+from Database.AccountData import AccountData
+from ProtocolHelpers.EncryptedSocket import EncryptedSocket
+from ProtocolHelpers.ShardChannel import MAX_MESSAGE_SIZE, ShardChannel
+from server import Server
+import server_config
+from protocol import MsgType, ResponseCode, build_error_obj, build_response, parse_request
+from Database.DBManagers import accounts_manager
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+# channel messages - { op, ... }
+# front door -> worker:
+HANDOFF_OP = "handoff" # { handoff, client, msg: str | None } + fd - serve a client, and handle its request (None -> it resumed its session)
+# worker -> front door:
+HANDBACK_OP = "handback" # { handoff, client, msg } + fd - a client in the lobby of the worker, and its request
+DISCONNECTED_OP = "disconnected" # { handoff, username, seated } - a client disconnected, and whether its room may keep its seat
+STATUS_OP = "status" # { adopted, rooms, clients, load } - sent every SHARD_STATUS_INTERVAL_SEC, and after every handoff
+
+# the most bytes a client handed to another process may have received and not read yet, plus its request - they go along
+# base64 encoded in a single channel message
+MAX_EXPORT_BYTES = MAX_MESSAGE_SIZE // 2
+
+# whether a client (with the request that takes it to another process) fits in a channel message
+def can_export(client: ClientInfo, msg_str: str | None) -> bool:
+    return client.sock.framer.buffered_size + len(msg_str or "") <= MAX_EXPORT_BYTES
+
+# stop serving a client on this process, to hand it to another one
+# returns: (the file descriptor of its connection, the state of its session) - the caller closes the descriptor once it's sent
+def export_client(client: ClientInfo) -> tuple[int, dict]:
+    client.detach()
+    fd, session = client.sock.detach()
+    return fd, {
+        "accountId": client.account_data.account_id,
+        "username": client.username,
+        "remoteAddr": list(client.remote_addr),
+        "features": client.features,
+        "resumable": client.resumable,
+        "socket": session,
+    }
+
+# continue serving a client exported by another process - the account is loaded through the database handle of this process
+# returns None if the account doesn't exist (the connection is closed)
+def import_client(fd: int, state: dict) -> ClientInfo | None:
+    sock = socket.socket(fileno=fd)
+    account_data = accounts_manager.get_account_data_by_id(state["accountId"])
+    if account_data == None:
+        sock.close()
+        return None
+    client = ClientInfo(EncryptedSocket.from_session(sock, state["socket"]), tuple(state["remoteAddr"]), account_data)
+    client.set_features(state["features"])
+    client.resumable = state["resumable"]
+    return client
+
+class ShardWorker:
+    """
+    The front door's end of a worker process - its channel, and the rooms and load it reported last.
+    Clients and rooms handed to the worker since its last report count towards its load until it reports them.
+    """
+    def __init__(self, index: int, process: subprocess.Popen, channel: ShardChannel):
+        self.index = index
+        self.process = process
+        self.channel = channel
+        self.alive = True
+        self.rooms: list[dict] = [] # infos of the rooms of the worker
+        self.client_count = 0
+        self.load = 0. # the fraction of a core the ticks of its rooms take
+        self.handoff_count = 0 # number of clients handed to the worker
+        self.adopted_count = 0 # number of them the worker took over by its last report
+        self.reserved_names: list[tuple[int, str]] = [] # (handoff, room name) of the rooms being created on the worker
+
+    # count a client handed to the worker - room_name: the room the client creates there
+    # returns: the number of the handoff
+    def next_handoff(self, room_name: str | None = None) -> int:
+        self.handoff_count += 1
+        if room_name != None: self.reserved_names.append((self.handoff_count, room_name))
+        return self.handoff_count
+
+    # the load a new room is placed by
+    @property
+    def placement_load(self) -> float:
+        pending_clients = self.handoff_count - self.adopted_count
+        return self.load + (self.client_count + pending_clients) * server_config.SHARD_CLIENT_LOAD \
+            + len(self.reserved_names) * server_config.SHARD_NEW_ROOM_LOAD
+
+    def has_room_name(self, room_name: str) -> bool:
+        return any(info["name"] == room_name for info in self.rooms) or any(name == room_name for _, name in self.reserved_names)
+
+    def on_status(self, status: dict):
+        self.adopted_count = status["adopted"]
+        self.rooms = status["rooms"]
+        self.client_count = status["clients"]
+        self.load = status["load"]
+        self.reserved_names = [(handoff, name) for handoff, name in self.reserved_names if handoff > self.adopted_count]
+
+    # { index, pid, alive, rooms, clients, load }
+    def get_stats(self) -> dict:
+        return {
+            "index": self.index,
+            "pid": self.process.pid,
+            "alive": self.alive,
+            "rooms": len(self.rooms),
+            "clients": self.client_count,
+            "load": round(self.load, 4),
+        }
+
+class FrontDoorServer(Server):
+    def __init__(self, num_workers: int = server_config.SHARD_WORKERS):
+        super().__init__()
+        self.udp_channel = None # positions of clients on workers go over TCP - a worker has no UDP socket of its own
+        self.num_workers = num_workers
+        self.workers: list[ShardWorker] = []
+        self.shard_lock = threading.Lock()
+        self.status_received = threading.Condition(self.shard_lock) # notified whenever a worker reports
+        self.remote_clients: dict[str, tuple[ShardWorker, int]] = {} # username -> (worker, handoff) of clients connected to a worker
+        self.held_seats: dict[str, tuple[ShardWorker, float]] = {} # username -> (worker, expiry) of clients whose room may keep their seat
+
+    def start_server(self):
+        for index in range(self.num_workers):
+            self.workers.append(self.start_worker(index))
+        super().start_server()
+
+    def close(self):
+        super().close()
+        for worker in self.workers:
+            worker.channel.close()
+
+    def start_worker(self, index: int) -> ShardWorker:
+        channel, worker_sock = ShardChannel.pair()
+        process = subprocess.Popen([sys.executable, SERVER_SCRIPT, "--shard-worker-fd", str(worker_sock.fileno())],
+                                   pass_fds=[worker_sock.fileno()])
+        worker_sock.close()
+        worker = ShardWorker(index, process, channel)
+        threading.Thread(target=self.channel_loop, args=[worker], daemon=True).start()
+        print(f"Started worker {index} (pid {process.pid})")
+        return worker
+
+    def channel_loop(self, worker: ShardWorker):
+        try:
+            while True:
+                received = worker.channel.recv()
+                if received == None: break
+                message, fd = received
+                try:
+                    self.on_worker_message(worker, message, fd)
+                except Exception as e:
+                    print(f"Failed handling a message of worker {worker.index}:", e)
+                    traceback.print_exc()
+        except OSError as e:
+            print(f"Channel of worker {worker.index} failed:", e)
+        with self.shard_lock:
+            worker.alive = False
+            worker.rooms = []
+            self.remote_clients = {name: entry for name, entry in self.remote_clients.items() if entry[0] is not worker}
+        print(f"Worker {worker.index} stopped")
+
+    def on_worker_message(self, worker: ShardWorker, message: dict, fd: int | None):
+        op = message["op"]
+        if op == STATUS_OP:
+            with self.shard_lock:
+                worker.on_status(message)
+                self.status_received.notify_all()
+        elif op == HANDBACK_OP:
+            username = message["client"]["username"]
+            with self.shard_lock:
+                if self.remote_clients.get(username) == (worker, message["handoff"]):
+                    del self.remote_clients[username]
+            client = import_client(fd, message["client"])
+            if client: self.serve_client(client, message["msg"])
+        elif op == DISCONNECTED_OP:
+            self.on_remote_disconnect(worker, message)
+        elif fd != None:
+            os.close(fd)
+
+    # a client connected to a worker disconnected
+    def on_remote_disconnect(self, worker: ShardWorker, message: dict):
+        now = time.monotonic()
+        with self.shard_lock:
+            if self.remote_clients.get(message["username"]) == (worker, message["handoff"]):
+                del self.remote_clients[message["username"]]
+            self.held_seats = {name: seat for name, seat in self.held_seats.items() if seat[1] > now}
+            if message["seated"]:
+                self.held_seats[message["username"]] = (worker, now + server_config.RESUME_GRACE_SEC)
+
+    # serve a client handed back by a worker, starting with the request it sent there
+    def serve_client(self, client: ClientInfo, msg_str: str):
+        client.on_receive(None, self.on_receive_message)
+        client.on_disconnect(None, self.on_client_disconnect)
+        self.on_client_connect(client)
+        self.on_receive_message(client, msg_str)
+        if not client.detached: client.start_recv()
+
+    # hand a client to a worker, with the request that takes it there
+    # msg_str: None -> the client resumes its session on the worker
+    def hand_off(self, client: ClientInfo, worker: ShardWorker, handoff: int, msg_str: str | None):
+        if client in self.clients: self.clients.remove(client)
+        fd, state = export_client(client)
+        with self.shard_lock:
+            self.remote_clients[client.username] = (worker, handoff)
+        try:
+            worker.channel.send({"op": HANDOFF_OP, "handoff": handoff, "client": state, "msg": msg_str}, fd)
+            print(f"{client.to_string()} handed off to worker {worker.index}")
+        except Exception as e:
+            # the connection is closed below - the client is gone, and so is its account's entry
+            print(f"Failed handing {client.to_string()} off to worker {worker.index}:", e)
+            with self.shard_lock:
+                if self.remote_clients.get(client.username) == (worker, handoff):
+                    del self.remote_clients[client.username]
+        finally:
+            os.close(fd)
+
+    # rooms are created and joined on the workers, the rest of the lobby is served here
+    def on_receive_message(self, sender: ClientInfo, msg_str: str):
+        if not sender.in_lobby: return
+        req_type, req_data = parse_request(msg_str)
+        if req_type == MsgType.CREATE_ROOM or req_type == MsgType.JOIN_ROOM:
+            if not can_export(sender, msg_str):
+                sender.send(build_response(ResponseCode.ERROR, req_type, build_error_obj("Request too large")))
+                return
+            worker, handoff, error = self.place_request(req_type, req_data)
+            if worker == None:
+                sender.send(build_response(ResponseCode.ERROR, req_type, build_error_obj(error)))
+            else:
+                self.hand_off(sender, worker, handoff, msg_str)
+            return
+        super().on_receive_message(sender, msg_str)
+
+    # the worker a CREATE_ROOM or JOIN_ROOM request is served by - a new room goes to the worker with the least load
+    # returns: (the worker, the number of the handoff, None), or (None, None, the reason the request fails)
+    def place_request(self, req_type: MsgType, req_data: dict | None) -> tuple[ShardWorker | None, int | None, str | None]:
+        if not isinstance(req_data, dict):
+            return None, None, "Invalid arguments"
+        with self.shard_lock:
+            workers = [w for w in self.workers if w.alive]
+            if req_type == MsgType.CREATE_ROOM:
+                room_name = req_data.get("name")
+                if not isinstance(room_name, str):
+                    return None, None, "Invalid arguments (required name, capacity, password)"
+                if any(w.has_room_name(room_name) for w in workers):
+                    return None, None, "A room with this name already exists"
+                if not workers:
+                    return None, None, "No worker is available to host the room"
+                worker = min(workers, key=lambda w: w.placement_load)
+                return worker, worker.next_handoff(room_name), None
+            try:
+                room_id = str(UUID(req_data["id"]))
+            except:
+                return None, None, "Invalid arguments (required id, password)"
+            # the creator of a room hears of it before its worker reports it - a room that isn't known may still be created
+            deadline = time.monotonic() + server_config.SHARD_STATUS_INTERVAL_SEC
+            worker = self.find_room_worker(workers, room_id)
+            while worker == None and any(w.reserved_names for w in workers) and time.monotonic() < deadline:
+                self.status_received.wait(deadline - time.monotonic())
+                worker = self.find_room_worker(workers, room_id)
+            if worker == None:
+                return None, None, "Invalid room id"
+            return worker, worker.next_handoff(), None
+
+    # must be called with the shard lock held
+    @staticmethod
+    def find_room_worker(workers: list[ShardWorker], room_id: str) -> ShardWorker | None:
+        return next((w for w in workers if any(info["id"] == room_id for info in w.rooms)), None)
+
+    # a client resuming a session that continues on a worker (its previous connection, or its seat, is there) is handed to it
+    def finish_connection(self, new_client: ClientInfo, resumed: bool):
+        worker = self.resume_worker(new_client.username) if resumed else None
+        if worker == None:
+            super().finish_connection(new_client, resumed)
+            return
+        self.issue_session_ticket(new_client) # tickets are sealed with the key of this process
+        with self.shard_lock:
+            handoff = worker.next_handoff()
+        self.hand_off(new_client, worker, handoff, None)
+
+    def resume_worker(self, username: str) -> ShardWorker | None:
+        with self.shard_lock:
+            remote = self.remote_clients.get(username)
+            seat = self.held_seats.pop(username, None)
+        if remote != None and remote[0].alive: return remote[0]
+        if seat != None and seat[0].alive and seat[1] > time.monotonic(): return seat[0]
+        return None
+
+    def try_login(self, username: str, password: str) -> tuple[AccountData | None, str | None]:
+        acc_data, error_text = super().try_login(username, password)
+        if acc_data and username in self.remote_clients:
+            return None, "This account is currently in use by another client"
+        return acc_data, error_text
+
+    # the rooms of every worker, as they last reported them
+    def get_rooms_info(self) -> list[dict]:
+        return [info for worker in self.workers for info in worker.rooms]
+
+    def get_stats(self) -> dict:
+        return {
+            "clients": len(self.clients),
+            "remoteClients": len(self.remote_clients),
+            "workers": [worker.get_stats() for worker in self.workers],
+        }
+
+class ShardWorkerServer(Server):
+    def __init__(self, channel_fd: int):
+        super().__init__()
+        self.udp_channel = None
+        self.channel = ShardChannel.from_fd(channel_fd)
+        self.adopted_count = 0 # number of clients handed to the worker so far
+        self.status_wakeup = threading.Event() # report right away - i.e. a room was created, so it can be joined
+        self.handoff_ids: dict[ClientInfo, int] = {} # the handoff each client came in
+
+    def start_server(self):
+        self.maze_pool.start()
+        self.scheduler.start()
+        self.spectator_scheduler.start()
+        threading.Thread(target=self.status_loop, daemon=True).start()
+        print(f"Worker {os.getpid()} serving rooms")
+        self.channel_loop()
+
+    def close(self):
+        self.channel.close()
+
+    def channel_loop(self):
+        try:
+            while True:
+                received = self.channel.recv()
+                if received == None: break
+                message, fd = received
+                try:
+                    self.on_front_door_message(message, fd)
+                except Exception as e:
+                    print("Failed handling a message of the front door:", e)
+                    traceback.print_exc()
+        except OSError as e:
+            print("Channel to the front door failed:", e)
+        print("The front door closed - stopping the worker")
+        for client in list(self.clients):
+            client.close()
+        self.scheduler.stop()
+        self.spectator_scheduler.stop()
+
+    def on_front_door_message(self, message: dict, fd: int | None):
+        if message["op"] != HANDOFF_OP:
+            if fd != None: os.close(fd)
+            return
+        client = import_client(fd, message["client"])
+        if client:
+            self.handoff_ids[client] = message["handoff"]
+            if message["msg"] == None: self.finish_connection(client, True)
+            else: self.serve_client(client, message["msg"])
+        self.adopted_count += 1
+        self.status_wakeup.set()
+
+    # serve a client handed off by the front door, starting with the request that brought it here
+    def serve_client(self, client: ClientInfo, msg_str: str):
+        client.on_receive(None, self.on_receive_message)
+        client.on_disconnect(None, self.on_client_disconnect)
+        self.on_client_connect(client)
+        super().on_receive_message(client, msg_str)
+        if not client.detached: client.start_recv()
+
+    # tickets are issued by the front door - clients reconnect to it
+    def issue_session_ticket(self, client: ClientInfo):
+        pass
+
+    # the lobby is served by the front door - a client back in the lobby goes there with its request
+    def on_receive_message(self, sender: ClientInfo, msg_str: str):
+        if not sender.in_lobby: return
+        if not can_export(sender, msg_str):
+            # the receive loop ends, and the front door is told the client disconnected
+            print(f"{sender.to_string()} is too large to hand back to the front door - disconnecting")
+            sender.close()
+            return
+        self.clients.remove(sender)
+        handoff = self.handoff_ids.pop(sender, None)
+        fd, state = export_client(sender)
+        try:
+            self.channel.send({"op": HANDBACK_OP, "handoff": handoff, "client": state, "msg": msg_str}, fd)
+            print(f"{sender.to_string()} handed back to the front door")
+        except Exception as e:
+            # the connection is closed below - let the front door forget the client
+            print(f"Failed handing {sender.to_string()} back to the front door:", e)
+            try:
+                self.channel.send({"op": DISCONNECTED_OP, "handoff": handoff, "username": sender.username, "seated": False})
+            except OSError: pass # the front door is gone
+        finally:
+            os.close(fd)
+
+    def on_client_disconnect(self, client: ClientInfo):
+        seated = not client.in_lobby and client.resumable # the room may keep the seat for a resumed session
+        super().on_client_disconnect(client)
+        try:
+            self.channel.send({"op": DISCONNECTED_OP, "handoff": self.handoff_ids.pop(client, None), "username": client.username, "seated": seated})
+        except OSError: pass # the front door is gone
+
+    # reports are sent from a thread of their own - the channel loop never blocks on sending to the front door
+    def status_loop(self):
+        while True:
+            self.status_wakeup.wait(server_config.SHARD_STATUS_INTERVAL_SEC)
+            self.status_wakeup.clear()
+            adopted_count = self.adopted_count # read first - every client counted is in the rooms and clients below
+            try:
+                self.channel.send({
+                    "op": STATUS_OP,
+                    "adopted": adopted_count,
+                    "rooms": self.get_rooms_info(),
+                    "clients": len(self.clients),
+                    "load": round(self.scheduler.get_load() + self.spectator_scheduler.get_load(), 4),
+                })
+            except OSError:
+                return
+            except Exception as e: # i.e. too many rooms to fit in a channel message - report again next time
+                print("Failed reporting the status of the worker:", e)
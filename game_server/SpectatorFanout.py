@@ -0,0 +1,154 @@
+from __future__ import annotations
+import threading
+import uuid
+from typing import TYPE_CHECKING, NamedTuple
+import numpy as np
+from MazeGen.MazeFormat import MazeFormat
+from Player import Player
+from PositionSnapshots import PositionSnapshots
+from protocol import MsgType, build_network_msg
+
+if TYPE_CHECKING:
+    from GameRoom import GameRoom
+
+# the state of a room its spectators get - published by the game loop of the room, read by the fan-out
+class SpectatorFrame(NamedTuple):
+    usernames: tuple[str, ...]
+    xy: np.ndarray # (n, 2) normalized positions
+    snapshot_rows: np.ndarray # (n, 3) uint16 [index, x, y] (PositionSnapshots)
+    ranking_usernames: tuple[str, ...]
+    ranking: np.ndarray # [place, distance] of each of ranking_usernames
+
+# the format a spectator gets mazes in - spectators see the whole maze, tiles are streamed to players moving through it
+def spectator_maze_format(spectator: Player) -> MazeFormat:
+    return MazeFormat.Packed if spectator.maze_format == MazeFormat.Tiled else spectator.maze_format
+
+class SpectatorFanout:
+    """
+    Serves the spectators of a room apart from the room's game loop. The room publishes a SpectatorFrame when its
+    positions or standings change, and the fan-out ticks on a scheduler of its own at SPECTATOR_TICK_RATE: a fan-out
+    tick builds one UPDATE_POS (the players who moved since the last fan-out), one POS_SNAPSHOT per acked base snapshot
+    and one RANKING, and queues the same payloads to every spectator. Broadcasts of the room are queued to the
+    spectators here as well, so spectators cost the game loop a copy of the positions per tick however many there are.
+    """
+    def __init__(self, room: GameRoom):
+        self.room = room
+        self.id = uuid.uuid4()
+        self.name = f"{room.name} (spectators)"
+        self.spectators: list[Player] = [] # replaced (never modified) on every change - the fan-out iterates it on its own thread
+        self.snapshots = PositionSnapshots() # positions sent to spectators with the binary_positions feature
+        self.frame: SpectatorFrame | None = None # the newest frame published by the room
+        self.sent_frame: SpectatorFrame | None = None # the frame of the last fan-out
+        self.unsynced: list[Player] = [] # spectators who joined since the last fan-out - they get everything, not deltas
+        self._broadcasts: list[str | dict[MazeFormat, str]] = [] # messages of the room waiting for the next fan-out
+        self._lock = threading.Lock()
+
+    def add(self, spectator: Player):
+        with self._lock:
+            self.spectators = self.spectators + [spectator]
+            self.unsynced.append(spectator)
+        self.room.parent_server.spectator_scheduler.wake(self)
+
+    def remove(self, spectator: Player):
+        with self._lock:
+            self.spectators = [s for s in self.spectators if s is not spectator]
+            self.unsynced = [s for s in self.unsynced if s is not spectator]
+
+    # the maze formats the spectators get mazes in
+    @property
+    def maze_formats(self) -> set[MazeFormat]:
+        return {spectator_maze_format(s) for s in self.spectators}
+
+    # queue a message to every spectator - a dict of messages by maze format carries a maze (see spectator_maze_format)
+    def queue_broadcast(self, message: str | dict[MazeFormat, str]):
+        if not self.spectators: return
+        with self._lock:
+            self._broadcasts.append(message)
+
+    # a new state of the room for the next fan-out - it goes out on the fan-out's own schedule, whatever the rate of the room
+    def publish(self, frame: SpectatorFrame):
+        self.frame = frame
+
+    # a single fan-out - queue the broadcasts of the room, then what changed in the newest frame, to every spectator
+    def tick(self):
+        with self._lock:
+            spectators = self.spectators
+            broadcasts, self._broadcasts = self._broadcasts, []
+            unsynced, self.unsynced = self.unsynced, []
+        frames = {} # every message is sealed once for the spectators with the room group key
+        for message in broadcasts:
+            for spectator in spectators:
+                self.send_to(spectator, message if isinstance(message, str) else message[spectator_maze_format(spectator)], frames)
+
+        frame, sent = self.frame, self.sent_frame
+        if frame == None or (frame is sent and not unsynced): return
+        unsynced_ids = {id(s) for s in unsynced}
+        synced = [s for s in spectators if id(s) not in unsynced_ids] if frame is not sent else []
+        self.send_positions(frame, sent, synced, unsynced, frames)
+        self.send_ranking(frame, sent, synced, unsynced, frames)
+        self.sent_frame = frame
+
+    # queue a message to a spectator - sealed under the room group key if they have it (see GameRoom.group_frame)
+    def send_to(self, spectator: Player, message: str, frames: dict[str, bytes], position: bool = False):
+        frame = self.room.group_frame(spectator, message, frames)
+        if position: spectator.send_position(message, frame)
+        else: spectator.send(message if frame == None else frame)
+
+    # synced spectators get the positions that changed since the sent frame, unsynced ones get every position
+    def send_positions(self, frame: SpectatorFrame, sent: SpectatorFrame | None, synced: list[Player], unsynced: list[Player],
+                       frames: dict[str, bytes]):
+        if sent != None and sent.usernames == frame.usernames:
+            changed = np.flatnonzero((frame.xy != sent.xy).any(axis=1))
+        else:
+            changed = np.arange(len(frame.usernames))
+        update_msg = self.build_update_pos(frame, changed) if changed.size else None
+        full_msg = None
+        for spectator in synced:
+            if update_msg != None and not spectator.binary_positions:
+                self.send_to(spectator, update_msg, frames, True)
+        for spectator in unsynced:
+            if not spectator.binary_positions:
+                if full_msg == None: full_msg = self.build_update_pos(frame, np.arange(len(frame.usernames)))
+                self.send_to(spectator, full_msg, frames, True)
+
+        binary_synced = [s for s in synced if s.binary_positions]
+        binary_unsynced = [s for s in unsynced if s.binary_positions]
+        if not binary_synced and not binary_unsynced: return
+        if self.snapshots.seq == -1 or not np.array_equal(frame.snapshot_rows, self.snapshots.get_rows(self.snapshots.seq)):
+            self.snapshots.take(frame.snapshot_rows)
+        else:
+            binary_synced = [] # they have the newest snapshot already
+        # the message of a snapshot is encoded once per acked base, and most spectators acked the same one
+        for spectator in binary_synced + binary_unsynced:
+            self.send_to(spectator, self.snapshots.get_msg(spectator.acked_snapshot), frames, True)
+
+    # synced spectators get the standings that changed since the sent frame, unsynced ones get all of them
+    def send_ranking(self, frame: SpectatorFrame, sent: SpectatorFrame | None, synced: list[Player], unsynced: list[Player],
+                     frames: dict[str, bytes]):
+        if synced and sent != None:
+            delta = self.room.ranking_delta(sent.ranking_usernames, sent.ranking, frame.ranking_usernames, frame.ranking)
+            if delta:
+                ranking_msg = build_network_msg(None, MsgType.RANKING, delta)
+                for spectator in synced:
+                    self.send_to(spectator, ranking_msg, frames)
+        if unsynced and len(frame.ranking_usernames):
+            ranking_msg = build_network_msg(None, MsgType.RANKING, self.room.ranking_delta((), None, frame.ranking_usernames, frame.ranking))
+            for spectator in unsynced:
+                self.send_to(spectator, ranking_msg, frames)
+
+    def build_update_pos(self, frame: SpectatorFrame, rows: np.ndarray) -> str:
+        return build_network_msg(None, MsgType.UPDATE_POS, {
+            frame.usernames[row]: {"x": x, "y": y} for row, (x, y) in zip(rows.tolist(), frame.xy[rows].tolist())
+        })
+
+    # whether the fan-out can tick at a lower rate - the room has no spectators (a new one wakes it)
+    @property
+    def is_idle(self) -> bool:
+        return not self.spectators
+
+    # { count, snapshotSeq }
+    def get_stats(self) -> dict:
+        return {
+            "count": len(self.spectators),
+            "snapshotSeq": self.snapshots.seq,
+        }
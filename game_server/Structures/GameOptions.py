@@ -1,4 +1,5 @@
 from enum import Enum
+from MazeGen.MazeAlgorithm import MazeAlgorithm
 
 class MazeDifficulty(Enum):
     Easy = "EASY"
@@ -7,13 +8,15 @@ class MazeDifficulty(Enum):
 
 class GameOptions:
     difficulty: MazeDifficulty = MazeDifficulty.Medium
+    algorithm: MazeAlgorithm = MazeAlgorithm.DFS
 
     def __init__(self):
         pass
 
     def get_json(self) -> dict:
         return {
-            "difficulty": self.difficulty.value
+            "difficulty": self.difficulty.value,
+            "algorithm": self.algorithm.value,
         }
     
     def load_game_options(self, opts: any) -> bool:
@@ -23,9 +26,14 @@ class GameOptions:
         except: return False
         if not is_valid_maze_difficulty(maze_difficulty):
             return False
+        # the algorithm is optional - older clients only send the difficulty
+        maze_algorithm = opts.get("algorithm", MazeAlgorithm.DFS.value)
+        if not is_valid_maze_algorithm(maze_algorithm):
+            return False
         
-        # set difficulty
+        # set difficulty & algorithm
         self.difficulty = MazeDifficulty(maze_difficulty)
+        self.algorithm = MazeAlgorithm(maze_algorithm)
         return True
 
 
@@ -36,6 +44,13 @@ def is_valid_maze_difficulty(diff: any) -> bool:
     except: return False
 
 
+def is_valid_maze_algorithm(alg: any) -> bool:
+    try:
+        MazeAlgorithm(alg)
+        return True
+    except: return False
+
+
 def difficultyToDims(diff: MazeDifficulty) -> dict:
     width = -1
     height = -1
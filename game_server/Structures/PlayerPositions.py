@@ -0,0 +1,149 @@
+import threading
+import numpy as np
+from PositionSnapshots import dequantize_positions, quantize_positions
+
+NOT_FINISHED = -1
+
+class PlayerPositions:
+    """
+    The positions of the players of a room as a structure of arrays - row i belongs to usernames[i].
+    indices: the index of every player, the smallest free one when they were added (rows shift, indices don't)
+    xy: (n, 2) float array of the last accepted normalized positions, accepted_ms: when they were received
+    moved: rows with a position accepted since the positions were last sent to the room
+    pending_xy: the latest position received from each player that wasn't validated yet (has_pending)
+    finish_index: the order in which each player finished the current game (NOT_FINISHED if they didn't)
+    speed_clamps, wall_clamps, rejected: per player counters of moves cut short and positions thrown away
+    snapshot_rows: (n, 3) uint16 [index, x, y] of every player, x and y quantized for PositionSnapshots
+    far_rows: snapshot_rows as of the last far update of each player, far_dirty: moved since then (AreaOfInterest)
+    """
+    def __init__(self):
+        self.usernames: list[str] = []
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.xy = np.zeros((0, 2), dtype=np.float64)
+        self.accepted_ms = np.zeros(0, dtype=np.int64)
+        self.moved = np.zeros(0, dtype=bool)
+        self.pending_xy = np.zeros((0, 2), dtype=np.float64)
+        self.pending_ms = np.zeros(0, dtype=np.int64)
+        self.has_pending = np.zeros(0, dtype=bool)
+        self.finish_index = np.zeros(0, dtype=np.int64)
+        self.speed_clamps = np.zeros(0, dtype=np.int64)
+        self.wall_clamps = np.zeros(0, dtype=np.int64)
+        self.rejected = np.zeros(0, dtype=np.int64)
+        self.snapshot_rows = np.zeros((0, 3), dtype=np.uint16)
+        self.far_rows = np.zeros((0, 3), dtype=np.uint16)
+        self.far_dirty = np.zeros(0, dtype=bool)
+        self._rows: dict[str, int] = {}
+        self._lock = threading.Lock() # positions are received on other threads than the game loop
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def row_of(self, username: str) -> int | None:
+        return self._rows.get(username)
+
+    def index_of(self, username: str) -> int | None:
+        row = self._rows.get(username)
+        return None if row == None else int(self.indices[row])
+
+    # start: the normalized x and y of the start position
+    def add(self, username: str, start: float = 0., start_ms: int = 0):
+        with self._lock:
+            if username in self._rows: return
+            self._rows[username] = len(self.usernames)
+            self.usernames.append(username)
+            taken = np.zeros(len(self.indices) + 1, dtype=bool)
+            taken[self.indices] = True
+            self.indices = np.append(self.indices, int(np.argmin(taken)))
+            self.xy = np.vstack((self.xy, np.full((1, 2), start)))
+            self.accepted_ms = np.append(self.accepted_ms, start_ms)
+            self.moved = np.append(self.moved, False)
+            self.pending_xy = np.vstack((self.pending_xy, np.zeros((1, 2))))
+            self.pending_ms = np.append(self.pending_ms, 0)
+            self.has_pending = np.append(self.has_pending, False)
+            self.finish_index = np.append(self.finish_index, NOT_FINISHED)
+            self.speed_clamps = np.append(self.speed_clamps, 0)
+            self.wall_clamps = np.append(self.wall_clamps, 0)
+            self.rejected = np.append(self.rejected, 0)
+            start_q = quantize_positions(np.float64(start))
+            self.snapshot_rows = np.vstack((self.snapshot_rows, np.array([[self.indices[-1], start_q, start_q]], dtype=np.uint16)))
+            self.far_rows = np.vstack((self.far_rows, self.snapshot_rows[-1:]))
+            self.far_dirty = np.append(self.far_dirty, False)
+
+    def remove(self, username: str):
+        with self._lock:
+            row = self._rows.pop(username, None)
+            if row == None: return
+            del self.usernames[row]
+            for name in ("indices", "xy", "accepted_ms", "moved", "pending_xy", "pending_ms", "has_pending", "finish_index",
+                         "speed_clamps", "wall_clamps", "rejected", "snapshot_rows", "far_rows", "far_dirty"):
+                setattr(self, name, np.delete(getattr(self, name), row, axis=0))
+            self._rows = {name: i for i, name in enumerate(self.usernames)}
+
+    # a position received from a player, to be validated by the next take_pending
+    def set_pending(self, username: str, x: float, y: float, recv_ms: int):
+        with self._lock:
+            row = self._rows.get(username)
+            if row == None: return
+            self.pending_xy[row] = (x, y)
+            self.pending_ms[row] = recv_ms
+            self.has_pending[row] = True
+
+    def reject(self, username: str):
+        with self._lock:
+            row = self._rows.get(username)
+            if row != None:
+                self.rejected[row] += 1
+
+    # the rows with a pending position, their positions and receive times - no longer pending after this
+    def take_pending(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        with self._lock:
+            rows = np.flatnonzero(self.has_pending)
+            self.has_pending[rows] = False
+            return rows, self.pending_xy[rows], self.pending_ms[rows]
+
+    # the validated positions of rows, received at recv_ms
+    def accept(self, rows: np.ndarray, xy: np.ndarray, recv_ms: np.ndarray, too_fast: np.ndarray, hit_wall: np.ndarray):
+        with self._lock:
+            self.xy[rows] = xy
+            self.snapshot_rows[rows, 1:] = quantize_positions(xy)
+            self.accepted_ms[rows] = recv_ms
+            self.moved[rows] = True
+            self.speed_clamps[rows] += too_fast
+            self.wall_clamps[rows] += hit_wall
+
+    # a copy of the usernames, xy and snapshot_rows of every player, taken together (for readers on other threads)
+    # far: the far positions (far_rows) instead of the newest ones
+    def copy_positions(self, far: bool = False) -> tuple[tuple[str, ...], np.ndarray, np.ndarray]:
+        with self._lock:
+            if far: return tuple(self.usernames), dequantize_positions(self.far_rows[:, 1:]), self.far_rows.copy()
+            return tuple(self.usernames), self.xy.copy(), self.snapshot_rows.copy()
+
+    @property
+    def finished(self) -> np.ndarray:
+        return self.finish_index != NOT_FINISHED
+
+    def is_finished(self, row: int) -> bool:
+        return self.finish_index[row] != NOT_FINISHED
+
+    def mark_finished(self, row: int, index: int):
+        self.finish_index[row] = index
+
+    # everyone back to a start position, before a new game or on a new maze
+    def reset(self, start: float, start_ms: int):
+        with self._lock:
+            self.xy[:] = start
+            self.snapshot_rows[:, 1:] = quantize_positions(np.float64(start))
+            self.far_rows[:] = self.snapshot_rows
+            self.far_dirty[:] = False
+            self.accepted_ms[:] = start_ms
+            self.moved[:] = False
+            self.has_pending[:] = False
+            self.finish_index[:] = NOT_FINISHED
+
+    # { [username]: { speedClamps, wallClamps, rejected } }
+    def get_stats(self) -> dict:
+        return {
+            username: {"speedClamps": speed_clamps, "wallClamps": wall_clamps, "rejected": rejected}
+            for username, speed_clamps, wall_clamps, rejected
+            in zip(self.usernames, self.speed_clamps.tolist(), self.wall_clamps.tolist(), self.rejected.tolist())
+        }
@@ -0,0 +1,2 @@
+# pytest puts the folder of this file (the game_server folder) on sys.path, so tests import the server modules
+# like the server does - run from the game_server folder: python -m pytest -q
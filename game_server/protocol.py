@@ -43,12 +43,20 @@ MESSAGE_DELIMITER = '\n'
 
 SERVER_NAME = "SERVER"
 
+# optional protocol features a client can ask for with "features": string[] in its LOGIN / SIGN_UP request
+PACKED_MAZE_FEATURE = "packed_maze" # mazes are sent in MazeFormat.Packed instead of CellType[][]
+TILED_MAZE_FEATURE = "tiled_maze" # mazes are sent in MazeFormat.Tiled and streamed in tiles (takes precedence over packed_maze)
+BINARY_POSITIONS_FEATURE = "binary_positions" # positions are sent as POS_SNAPSHOT instead of UPDATE_POS
+UDP_POSITIONS_FEATURE = "udp_positions" # positions may go over a UDP channel (UDP_CHANNEL) instead of the TCP stream
+ROOM_GROUP_KEY_FEATURE = "room_group_key" # room broadcasts may be sealed under a key shared by the room (ROOM_KEY)
+SUPPORTED_FEATURES = [PACKED_MAZE_FEATURE, TILED_MAZE_FEATURE, BINARY_POSITIONS_FEATURE, UDP_POSITIONS_FEATURE, ROOM_GROUP_KEY_FEATURE]
+
 def get_addr_str(remote_addr: tuple[str, int]) -> str:
     return remote_addr[0] + ":" + str(remote_addr[1])
 
 class MsgType(Enum):
-    LOGIN = "login" # username: string, password: string
-    SIGN_UP = "sign_up" # username: string, password: string
+    LOGIN = "login" # username: string, password: string, features?: string[]
+    SIGN_UP = "sign_up" # username: string, password: string, features?: string[]
 
     SET_NAME = "set_name" # not used?
     ACCEPT_CONNECTION = "accept_connection" # Not used?
@@ -56,22 +64,35 @@ class MsgType(Enum):
     RESTART_GAME = "restart_game" # not used?
 
     UPDATE_POS = "update_pos"
-    MAZE = "maze" # server->client: params: CellType[][]
-    PLAYER_CONNECTED = "player_connected"
+    POS_CORRECTION = "pos_correction" # server->client - { x, y } - a position the client sent was cut short (too fast, or through a wall) - the client moves back to this normalized position
+    POS_SNAPSHOT = "pos_snapshot" # server->client (binary_positions) - base64 of little endian: uint32 seq, uint32 base seq (0xFFFFFFFF: full snapshot), then (uint16 index, uint16 x, uint16 y)[] - x, y: normalized position * 65535; players missing from a delta didn't move since the base snapshot
+    POS_SNAPSHOT_ACK = "pos_snapshot_ack" # client->server - { seq: number } - the newest snapshot the client applied
+    UDP_CHANNEL = "udp_channel" # server->client (udp_positions) - { port: number, channelId: string } - channelId: base64 of the 8 bytes that start every datagram of the client's channel (layout in ProtocolHelpers/UdpChannel.py)
+    ROOM_KEY = "room_key" # server->client (room_group_key) - { keyId: number, key: string } - key: base64 of the AES-256-GCM key of the room; frames whose nonce starts with 0xFF are sealed under the room key whose id is the next 3 bytes (big endian). A new key replaces the old one when a member leaves - frames sealed under the old one may still arrive after it
+    UDP_PING = "udp_ping" # over UDP only - no params - the server answers every ping with a ping; positions (UPDATE_POS, POS_SNAPSHOT) go over UDP while the server received a datagram in the last UDP_CHANNEL_TIMEOUT_SEC, over TCP otherwise
+    MAZE = "maze" # server->client: params: CellType[][] (or MazeFormat.Packed / MazeFormat.Tiled with the packed_maze / tiled_maze features)
+    MAZE_TILE = "maze_tile" # server->client - { x, y, width, height, cells } - a tile of a MazeFormat.Tiled maze, cells packed like MazeFormat.Packed
+    MAZE_TILE_REQUEST = "maze_tile_request" # client->server - { tiles: [x, y][] } or { x, y, radius? } (a cell, radius in tiles) - send these tiles next
+    MAZE_TILE_ACK = "maze_tile_ack" # client->server - { tiles: [x, y][] } - tiles the client received
+    PLAYER_CONNECTED = "player_connected" # server->client - { username, role, position, isReady, index } - index: the player's index in POS_SNAPSHOT
     PLAYER_DISCONNECTED = "player_disconnected"
     SET_READY = "set_ready" # arg = "true"/"false"
 
     ROOMS_LIST = "rooms_list" # params: count?: int -> list[room]
     CREATE_ROOM = "create_room" # params: { name: string, capacity: int, password: string }
-    JOIN_ROOM = "join_room" # params: { room_id: number, password: str| None }
+    JOIN_ROOM = "join_room" # params: { room_id: number, password: str| None, spectate?: bool } - spectators watch the room without a seat (positions and RANKING at SPECTATOR_TICK_RATE)
     LEAVE_ROOM = "leave_room" # ~~params: { room_id: number }~~
     ROOM_ADMIN = "room_admin" # server->client - params: string
     GAME_OPTIONS = "game_options" # params: GameOptions
-    GENERATE_MAZE = "generate_maze" # client->server: params: {difficulty}; response: { grid, finishCell }
+    GENERATE_MAZE = "generate_maze" # client->server: params: { difficulty, algorithm?, seed?: number }; response: { grid, finishCell, seed }
 
     START_GAME = "start_game" # client->server - no params; server->client - { maze, finishCell, startTime }
     PLAYER_FINISHED = "player_finished" # server->client(broadcast) - { name: string, timeMs: number, place: number }
     END_GAME = "end_game" # server->client - { name: string, timeMs: number }[]
+    RANKING = "ranking" # server->client(broadcast) - { [username]: { place: number, distance: number } } - standings that changed since the last RANKING (distance: cells of the maze to the finish cell, -1 from inside a wall)
+
+    SESSION_TICKET = "session_ticket" # server->client - { ticket: string, expiresInMs: number } - present the ticket on reconnect to resume the session
+    RESUME_SESSION = "resume_session" # server->client (response) - sent instead of the LOGIN response after resuming - { username: string, roomId: string | None }
 
     RESPONSE = "response" # data = { code: ResponseType, response_to: MsgType, data: dict | None }
 
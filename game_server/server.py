@@ -4,18 +4,25 @@
 # - "authentication" and handshakes with clients
 # - rooms/games on the network
 from uuid import UUID
+import base64
 import socket
 import threading
 from Database.AccountData import AccountData, get_credentials_error
 from ClientInfo import ClientInfo
 from GameRoom import GameRoom, valid_room_capacity, valid_room_name, valid_room_password
-from MazeGen.MazeGenerator import generate_maze_data_by_game_options
+from RoomScheduler import RoomScheduler
+from MazeGen.MazeFormat import MazeFormat
+from MazeGen.MazeGenerator import is_valid_maze_seed
+from MazeGen.MazePool import MazePool
+from MazeGen.MazeStore import MazeStore
 from ProtocolHelpers.EncryptedSocket import EncryptedSocket
+from ProtocolHelpers.HandshakeKeyPool import create_key_provider
+from ProtocolHelpers.SessionTickets import SessionTicketManager
+from ProtocolHelpers.UdpChannel import UdpPositionChannel
 from Structures.GameOptions import GameOptions
-from Structures.Vector2 import vector2_to_dict
 import server_config
 import protocol
-from protocol import SOCK_RECV_CHUNK_SIZE, MsgType, ResponseCode, build_error_obj, build_response, parse_request
+from protocol import SOCK_RECV_CHUNK_SIZE, MsgType, ResponseCode, build_error_obj, build_network_msg, build_response, parse_request
 from Database.DBManagers import accounts_manager
 
 # Default exception hook for threads
@@ -30,8 +37,20 @@ class Server:
     def __init__(self):
         self.clients: list[ClientInfo] = []
         self.rooms: list[GameRoom] = []
+        self.key_provider = create_key_provider()
+        self.ticket_manager = SessionTicketManager()
+        self.scheduler = RoomScheduler()
+        self.spectator_scheduler = RoomScheduler(tick_rate=server_config.SPECTATOR_TICK_RATE) # fan-outs of rooms to their spectators
+        self.maze_pool = MazePool()
+        self.maze_store = MazeStore()
+        self.udp_channel = UdpPositionChannel() if server_config.UDP_POSITIONS_ENABLED else None
     
     def start_server(self):
+        self.key_provider.start()
+        self.maze_pool.start()
+        self.scheduler.start()
+        self.spectator_scheduler.start()
+        if self.udp_channel: self.udp_channel.start()
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as self.server_sock:
             self.server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_sock.bind((server_config.IP_ADDR, server_config.PORT))
@@ -42,6 +61,7 @@ class Server:
 
     def close(self):
         self.server_sock.close()
+        if self.udp_channel: self.udp_channel.close()
 
     def accept_connections(self):
         while True:
@@ -55,7 +75,7 @@ class Server:
     # initialize the connection with a client - "handshake" before connection
     def init_connection(self, client_sock: socket.socket, remote_addr):
         # Step 1 - Handshake
-        secure_sock = EncryptedSocket(client_sock)
+        secure_sock = EncryptedSocket(client_sock, self.key_provider, self.ticket_manager)
 
         print(f"Starting handshake with {remote_addr}")
         if not secure_sock.execute_server_handshake():
@@ -65,6 +85,12 @@ class Server:
         print(f"Succesfully finished handshake with {remote_addr}!")
 
         new_client = None
+        if secure_sock.resumed_session:
+            new_client = ClientInfo(secure_sock, remote_addr, secure_sock.resumed_session.account_data)
+            new_client.set_features(secure_sock.resumed_session.features)
+            self.finish_connection(new_client, True)
+            return
+
         try:
             while new_client == None:
                 rec_text = secure_sock.recv_str()
@@ -82,6 +108,7 @@ class Server:
                     continue
 
                 new_client = ClientInfo(secure_sock, remote_addr, acc_data)
+                new_client.set_features(req_data.get("features"))
                 new_client.send(build_response(ResponseCode.SUCCESS, req_type, "Connected Successfully"))
         except Exception as e:
             import traceback
@@ -90,10 +117,55 @@ class Server:
             secure_sock.close()
             return
 
+        self.finish_connection(new_client, False)
+
+    # start serving an authenticated client
+    # resumed: whether the client resumed a previous session with a ticket instead of logging in
+    def finish_connection(self, new_client: ClientInfo, resumed: bool):
+        room = None
+        if resumed:
+            room = self.resume_client_session(new_client)
+            new_client.send(build_response(ResponseCode.SUCCESS, MsgType.RESUME_SESSION, {
+                "username": new_client.username,
+                "roomId": str(room.id) if room else None,
+            }))
+        self.issue_session_ticket(new_client)
+        self.open_udp_channel(new_client)
+
         new_client.on_receive(None, self.on_receive_message)
         new_client.on_disconnect(None, self.on_client_disconnect)
         new_client.start_recv()
         self.on_client_connect(new_client)
+        if room: room.resume_player(new_client)
+
+    # send the client a ticket it can use to resume its session after reconnecting
+    def issue_session_ticket(self, client: ClientInfo):
+        ticket = self.ticket_manager.issue(client.account_data, client.sock.crypto_engine.aes_key, client.features)
+        client.resumable = True
+        client.send(build_network_msg(None, MsgType.SESSION_TICKET, {
+            "ticket": ticket,
+            "expiresInMs": int(self.ticket_manager.lifetime_sec * 1000),
+        }))
+
+    # open a UDP position channel for a client that asked for one, keyed by its session key
+    def open_udp_channel(self, client: ClientInfo):
+        if not self.udp_channel or protocol.UDP_POSITIONS_FEATURE not in client.features: return
+        client.udp_session = self.udp_channel.register(client, client.sock.crypto_engine.aes_key)
+        client.send(build_network_msg(None, MsgType.UDP_CHANNEL, {
+            "port": self.udp_channel.port,
+            "channelId": base64.b64encode(client.udp_session.channel_id).decode(),
+        }))
+
+    # take over from a previous connection of a resuming client
+    # returns: the room in which the client still has a seat (if any)
+    def resume_client_session(self, new_client: ClientInfo) -> GameRoom | None:
+        old_client = self.find_client_by_name(new_client.username)
+        room = next((r for r in self.rooms if r.find_player_by_account_id(new_client.account_data.account_id)), None)
+        if room: room.release_player_connection(new_client.account_data.account_id)
+        if old_client:
+            print(f"{old_client.to_string()} is replaced by a resumed session")
+            old_client.close()
+        return room
 
     # Handle a request to authenticate the user - signup or login
     # req_type: The MsgType of the request
@@ -161,6 +233,7 @@ class Server:
 
     def on_client_disconnect(self, client: ClientInfo):
         self.clients.remove(client)
+        if client.udp_session: self.udp_channel.unregister(client.udp_session)
         print(f"{client.to_string()} disconnected")
     
     def on_receive_message(self, sender: ClientInfo, msg_str: str):
@@ -204,10 +277,12 @@ class Server:
                 try:
                     room_id = UUID(req_data["id"])
                     room_password = req_data["password"]
+                    spectate = req_data.get("spectate", False)
+                    if not isinstance(spectate, bool): raise Exception()
                 except:
                     return ResponseCode.ERROR, build_error_obj("Invalid arguemnts (required id, password)")
                 
-                successful, reason = self.join_room(sender, room_id, room_password)
+                successful, reason = self.join_room(sender, room_id, room_password, spectate)
                 if not successful:
                     return ResponseCode.ERROR, build_error_obj(reason)
                 return ResponseCode.SUCCESS, None
@@ -216,11 +291,19 @@ class Server:
                 if not game_options.load_game_options(req_data):
                     return ResponseCode.ERROR, "Received invalid game options"
                 
-                maze_data = generate_maze_data_by_game_options(game_options)
-                return ResponseCode.SUCCESS, {
-                    "grid": maze_data["grid"],
-                    "finishCell": vector2_to_dict(maze_data["finish_cell"])
-                }
+                # the response carries the whole maze - clients that stream mazes in tiles get it packed
+                maze_format = MazeFormat.Packed if sender.maze_format == MazeFormat.Tiled else sender.maze_format
+                # a seed requests a specific maze (i.e. a replay), otherwise a new maze (generated and encoded
+                # already) is taken from the pool of its difficulty
+                seed = req_data.get("seed")
+                if seed == None:
+                    maze = self.maze_pool.take(game_options.difficulty, game_options.algorithm)
+                    return ResponseCode.SUCCESS, self.maze_store.add_new_maze(
+                        (game_options.algorithm, game_options.difficulty, maze.seed), maze_format, maze)
+                if not is_valid_maze_seed(seed):
+                    return ResponseCode.ERROR, "Received invalid maze seed"
+                return ResponseCode.SUCCESS, self.maze_store.get_payload(
+                    (game_options.algorithm, game_options.difficulty, seed), maze_format)
         return ResponseCode.ERROR, None
     
     def get_rooms_info(self) -> list[dict]:
@@ -252,13 +335,19 @@ class Server:
         self.rooms.append(new_room)
         return True, None
 
+    # spectate: join as a spectator - spectators don't take a seat, and can join a game that is running
     # returns: (whether joining the room was successful, reason for failing)
-    def join_room(self, client: ClientInfo, room_id: UUID, password: str | None) -> tuple[bool, str | None]:
+    def join_room(self, client: ClientInfo, room_id: UUID, password: str | None, spectate: bool = False) -> tuple[bool, str | None]:
         room = self.get_room_by_id(room_id)
         if not room:
             return False, "Invalid room id"
         if not room.check_password(password):
             return False, "Invalid password"
+        if spectate:
+            if len(room.spectators) >= server_config.ROOM_MAX_SPECTATORS:
+                return False, "Room has too many spectators - can not join"
+            room.add_spectator(client)
+            return True, None
         if room.is_full:
             return False, "Room is full - can not join"
         if room.game_active:
@@ -272,11 +361,37 @@ class Server:
         room = self.get_room_by_id(room_id)
         if room == None: return False
         self.rooms.remove(room)
+        self.scheduler.remove(room)
+        self.spectator_scheduler.remove(room.spectator_fanout)
         print(f"Removed room {room.name}")
         return True
 
+def parse_args():
+    import argparse
+    parser = argparse.ArgumentParser(description="Maze game server")
+    parser.add_argument("--mode", choices=server_config.SERVER_MODES, default=server_config.SERVER_MODE,
+                        help="threaded: a thread per connection and per room, asyncio: a single event loop")
+    parser.add_argument("--workers", type=int, default=server_config.SHARD_WORKERS,
+                        help="number of worker processes rooms are placed on (threaded mode) - 0: a single process")
+    parser.add_argument("--shard-worker-fd", type=int, default=None, help=argparse.SUPPRESS) # run as a worker of a front door
+    args = parser.parse_args()
+    if args.workers > 0 and args.mode != "threaded":
+        parser.error("--workers requires --mode threaded")
+    return args
+
 if __name__ == "__main__":
-    server = Server()
+    args = parse_args()
+    if args.shard_worker_fd != None:
+        from ShardedServer import ShardWorkerServer
+        server = ShardWorkerServer(args.shard_worker_fd)
+    elif args.workers > 0:
+        from ShardedServer import FrontDoorServer
+        server = FrontDoorServer(args.workers)
+    elif args.mode == "asyncio":
+        from AsyncServer import AsyncServer
+        server = AsyncServer()
+    else:
+        server = Server()
 
     try:
         server.start_server()
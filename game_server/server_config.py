@@ -6,3 +6,135 @@ PORT = 3004
 
 # max number of clients to be connected at the same time
 BACKLOG = 15
+
+
+# how the server handles connections:
+# "threaded" - a thread per client connection and per room
+# "asyncio" - all connections and rooms run as coroutines on a single event loop
+SERVER_MODES = ["threaded", "asyncio"]
+SERVER_MODE = "threaded"
+
+# multi-process sharding (threaded mode) - a front door process accepts connections, runs handshakes, logins and the
+# lobby, and places rooms on worker processes; the connections of clients in rooms are handed to the worker of their room
+# number of worker processes (0 -> a single process that runs everything) - overridden by the --workers argument
+SHARD_WORKERS = 0
+# how often every worker reports its rooms and load to the front door
+SHARD_STATUS_INTERVAL_SEC = 0.5
+# placement of a new room - on the worker with the least load: the fraction of a core the ticks of its rooms take,
+# plus this much for every client connected to it
+SHARD_CLIENT_LOAD = 0.002
+# plus this much for every room placed on it that it didn't report yet
+SHARD_NEW_ROOM_LOAD = 0.05
+
+# outbound queue of every client
+# max number of messages waiting to be sent to a client
+SEND_QUEUE_MAX_SIZE = 256
+# disconnect a client whose oldest queued message has been waiting for longer than this
+SEND_QUEUE_MAX_BACKLOG_SEC = 5.
+# what to do when a message is queued to a full queue - "drop_oldest" or "disconnect"
+SEND_QUEUE_OVERFLOW_POLICY = "drop_oldest"
+
+# where the RSA key of each handshake comes from:
+# "fresh" - generated on every connection
+# "pool" - taken from a pool of keys pre-generated in the background
+# "identity" - a single persistent identity key (stored in IDENTITY_KEY_FILE, readable by the owner only); clients must use
+#   the signed ephemeral X25519 exchange - the RSA-encrypted key of the Electron client is refused in this mode
+HANDSHAKE_KEY_MODE = "pool"
+# number of ready keys kept by the handshake key pool
+HANDSHAKE_KEY_POOL_SIZE = 16
+IDENTITY_KEY_FILE = "server_identity_key.pem"
+
+# session resumption
+# how long a resumption ticket can be used after it was issued
+SESSION_TICKET_LIFETIME_SEC = 15 * 60
+# how long a room keeps the seat of a player whose connection dropped (0 -> kick immediately)
+RESUME_GRACE_SEC = 30
+# how long a new connection waits for a resumption ticket sent before the server's public key - resumed sessions don't
+# take an RSA key from the pool (or generate one), at the cost of this wait for clients that do a regular handshake
+RESUME_EARLY_WAIT_SEC = 0.005
+
+# room tick scheduler
+# tick rate of rooms with nothing going on (no active game, nobody moving)
+IDLE_TICK_RATE = 2
+# a room drops to the idle tick rate only after this long without activity (positions, requests) - not as soon as a
+# tick has handled what was waiting
+IDLE_AFTER_SEC = 1.
+# width of a slot of the scheduler's timing wheel, and the number of slots on the wheel
+SCHEDULER_SLOT_SEC = 0.008
+SCHEDULER_NUM_SLOTS = 64
+
+# maze pre-generation
+# number of ready mazes kept for every difficulty (0 -> generate every maze on demand)
+MAZE_POOL_DEPTH = 4
+# mazes with at least this many cells are generated in a worker process
+MAZE_POOL_PROCESS_MIN_CELLS = 1_000_000
+# memory bound of the cache of encoded mazes served to GENERATE_MAZE requests
+MAZE_STORE_MAX_BYTES = 32 * 1024 * 1024
+
+# chunked maze transfer (clients with the tiled_maze feature)
+# cells per side of a tile
+MAZE_TILE_SIZE = 64
+# max tiles sent to a client and not acked yet
+MAZE_TILE_WINDOW = 16
+# don't queue more tiles to a client with more messages than this waiting in its send queue
+MAZE_TILE_MAX_QUEUE_DEPTH = 32
+# tiles around the start tile a client must have before the game countdown starts
+MAZE_START_AREA_RADIUS = 1
+# start the countdown anyway if the start area wasn't delivered to everyone by then
+MAZE_START_TILES_TIMEOUT_SEC = 5.
+
+# movement validation (positions are in cells, the width of a wall cell - a room is 2 cells wide)
+# the top speed of a player - the client moves 2.6 * 4 cells per second
+PLAYER_MAX_SPEED_CELLS_PER_SEC = 10.4
+# slack added to the time between two positions of a player, for packets bunched up by the network
+MOVE_SPEED_GRACE_SEC = 0.15
+# positions further apart in time than this are held to the distance of this interval (a player who stood still)
+MOVE_MAX_INTERVAL_SEC = 0.5
+
+# binary position snapshots (clients with the binary_positions feature)
+# number of recent snapshots a client can ack and get deltas from - older acks get full snapshots
+POSITION_SNAPSHOT_HISTORY = 32
+
+# area of interest - the position broadcast of large rooms
+# rooms with more players than this send every player nearby positions at the full rate and the rest decimated,
+# smaller rooms send every position to everyone
+AOI_MIN_PLAYERS = 16
+# number of buckets of the interest grid along each side of the maze
+AOI_GRID_SIZE = 8
+# players at most this many buckets away from a player (on both axes) are nearby
+AOI_RADIUS_BUCKETS = 1
+# the positions of the players who aren't nearby (and the RANKING of the room) are sent every this many ticks
+AOI_FAR_INTERVAL_TICKS = 10
+
+# spectators (they don't take a seat in the room, and can join a game that is running)
+# max number of spectators of a room
+ROOM_MAX_SPECTATORS = 1000
+# rate at which spectators get the positions and standings of a room - one message per fan-out, shared by all of them
+SPECTATOR_TICK_RATE = 10
+# what the fan-outs of a large room (AOI_MIN_PLAYERS) send - "full": the newest position of every player,
+# "decimated": the far position of every player (updated every AOI_FAR_INTERVAL_TICKS ticks)
+AOI_SPECTATOR_VIEW = "full"
+
+# UDP position channel (clients with the udp_positions feature)
+UDP_POSITIONS_ENABLED = True
+# port of the UDP socket shared by every channel (0 -> any free port, sent to clients in UDP_CHANNEL)
+UDP_PORT = 3004
+# positions go back to TCP when no datagram arrived from the client for this long - clients ping while idle
+UDP_CHANNEL_TIMEOUT_SEC = 3.
+# messages that don't fit in a datagram of this size go over TCP (below common path MTUs, so datagrams aren't fragmented)
+UDP_MAX_DATAGRAM_SIZE = 1200
+
+# room group keys (clients with the room_group_key feature)
+# seal each room broadcast once under a key shared by the members of the room, instead of once per member
+ROOM_GROUP_KEYS_ENABLED = True
+
+# inbound rate limits of every connection - msgType -> (requests per second, largest burst)
+# positions arriving faster than the game loop handles them are coalesced (only the newest is handled), these limits
+# drop excess requests before their json is decoded
+INBOUND_RATE_LIMITS = {
+    "update_pos": (60., 30.),
+    "maze_tile_ack": (120., 60.),
+    "pos_snapshot_ack": (60., 30.),
+}
+# rate limit of each msgType that isn't in INBOUND_RATE_LIMITS
+INBOUND_DEFAULT_RATE_LIMIT = (20., 40.)
@@ -0,0 +1,67 @@
+# Room broadcasts sealed once under the room group key, and replacing the key - only the room does it, on its tick
+import threading
+import pytest
+from Benchmarks.bench_helpers import create_bench_room
+from Benchmarks.group_key_bench import POSITIONS_MESSAGE, RecordingClient, open_frame
+from GameRoom import GameRoom
+from Player import Player, RoomClientRole
+from ProtocolHelpers.GameCryptoEngine import NONCE_COUNTER_LIMIT
+from ProtocolHelpers.RoomGroupKey import GROUP_KEY_ROTATE_MARGIN
+
+def create_room() -> tuple[GameRoom, list[Player]]:
+    room = create_bench_room(4)
+    players = [Player(RecordingClient(account_id, True), RoomClientRole.PLAYER) for account_id in range(2)]
+    for player in players:
+        room.on_player_connect(player)
+    return room, players
+
+def test_members_get_the_same_frame():
+    room, players = create_room()
+    plain = Player(RecordingClient(2, False), RoomClientRole.PLAYER)
+    room.on_player_connect(plain)
+    room.send_broadcast(POSITIONS_MESSAGE)
+    frames = [p.client_info.sent[-1] for p in players]
+    assert frames[0] is frames[1]
+    assert all(open_frame(p.client_info, frame) == POSITIONS_MESSAGE for p, frame in zip(players, frames))
+    assert plain.client_info.sent[-1] == POSITIONS_MESSAGE
+
+def test_key_is_replaced_when_a_member_leaves():
+    room, players = create_room()
+    stayer = Player(RecordingClient(2, True), RoomClientRole.PLAYER)
+    room.on_player_connect(stayer)
+    key = room.group_key
+    room.on_client_disconnect(players[0])
+    room.send_broadcast(POSITIONS_MESSAGE)
+    assert room.group_key.key_id != key.key_id
+    assert all(open_frame(p.client_info, p.client_info.sent[-1]) == POSITIONS_MESSAGE for p in [players[1], stayer])
+    with pytest.raises(KeyError):
+        open_frame(players[0].client_info, stayer.client_info.sent[-1])
+
+def wear_out(room: GameRoom):
+    room.group_key._counter = NONCE_COUNTER_LIMIT - GROUP_KEY_ROTATE_MARGIN
+
+def test_fanout_seals_under_the_current_key():
+    room, players = create_room()
+    wear_out(room)
+    key = room.group_key
+    frames = {}
+    fanout = threading.Thread(target=room.group_frame, args=(players[0], POSITIONS_MESSAGE, frames))
+    fanout.start()
+    fanout.join()
+    assert room.group_key is key
+    assert open_frame(players[0].client_info, frames[POSITIONS_MESSAGE]) == POSITIONS_MESSAGE
+
+def test_tick_replaces_a_worn_out_key():
+    room, players = create_room()
+    wear_out(room)
+    key = room.group_key
+    room.tick()
+    assert room.group_key.key_id != key.key_id
+    room.send_broadcast(POSITIONS_MESSAGE)
+    assert all(open_frame(p.client_info, p.client_info.sent[-1]) == POSITIONS_MESSAGE for p in players)
+
+def test_tick_keeps_a_fresh_key():
+    room, _ = create_room()
+    key = room.group_key
+    room.tick()
+    assert room.group_key is key
@@ -0,0 +1,41 @@
+import json
+import pytest
+from ProtocolHelpers.InboundLimiter import InboundLimiter, sniff_msg_type
+from protocol import MsgType, parse_request
+
+# (request, the msgType it's handled as)
+REQUESTS = [
+    ('{"msgType": "update_pos", "data": {"x": 0.1, "y": 0.2}}', "update_pos"),
+    ('  {"data": 1, "msgType": "login"}', "login"),
+    ('{"msgType":"create_room","data":{"name":"msgType"}}', "create_room"),
+    ('{"msgType": "update_pos", "data": {"msgType": "x"}}', "update_pos"),
+    # a msgType nested in the data before the real one
+    ('{"data": {"msgType": "update_pos"}, "msgType": "create_room"}', "create_room"),
+    # a duplicate key - json keeps the last one
+    ('{"msgType": "update_pos", "msgType": "create_room"}', "create_room"),
+    # a duplicate key written with a json escape
+    ('{"msgType": "update_pos", "data": null, "msg\\u0054ype": "create_room"}', "create_room"),
+    ('{"msg\\u0054ype": "create_room", "msgType": "update_pos"}', "update_pos"),
+]
+
+@pytest.mark.parametrize("request_str, handled_as", REQUESTS)
+def test_sniffed_as_handled(request_str: str, handled_as: str):
+    assert sniff_msg_type(request_str) == handled_as
+    assert parse_request(request_str)[0] == MsgType(handled_as)
+
+@pytest.mark.parametrize("request_str", ['[1]', '{"msgType": ["a"]}', 'garbage', '{"msgType": "nope"}', '{"data": 1}'])
+def test_unknown_types(request_str: str):
+    assert sniff_msg_type(request_str) == None
+
+def test_requests_over_the_limit_are_dropped():
+    limiter = InboundLimiter({"update_pos": (1., 3.)}, (1., 2.))
+    allowed = [limiter.allow("update_pos") for _ in range(5)]
+    assert allowed == [True, True, True, False, False]
+    assert limiter.allow("create_room") and limiter.allow("create_room") and not limiter.allow("create_room")
+    assert limiter.get_stats()["dropped"] == {"update_pos": 2, "create_room": 1}
+
+def test_escaped_key_can_not_borrow_a_bucket():
+    limiter = InboundLimiter({"update_pos": (1., 30.)}, (1., 2.))
+    request_str = json.dumps({"msgType": "update_pos", "data": None}).rstrip("}") + ', "msg\\u0054ype": "create_room"}'
+    allowed = sum(limiter.allow(sniff_msg_type(request_str)) for _ in range(10))
+    assert allowed == 2
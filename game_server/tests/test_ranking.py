@@ -0,0 +1,37 @@
+# RANKING distances count the cells of the maze between a player and the finish cell
+import numpy as np
+from Benchmarks.bench_helpers import create_bench_room
+from Benchmarks.tick_bench import BenchClient
+from GameRoom import GameRoom
+from MazeGen.CellType import CellType
+from Player import Player, RoomClientRole
+
+def create_room(num_players: int) -> GameRoom:
+    room = create_bench_room(num_players)
+    for account_id in range(num_players):
+        player = Player(BenchClient(account_id), RoomClientRole.PLAYER)
+        room.players.append(player)
+        room.player_positions.add(player.username)
+    room.start_game()
+    return room
+
+# put the players in cells of the maze - cells: [x, y] of each of them
+def place(room: GameRoom, cells: list[tuple[int, int]]):
+    room.player_positions.xy[:] = np.array(cells) * 2 * room.cell_scale
+
+def test_distance_counts_cells_of_the_maze():
+    room = create_room(3)
+    grid = room.stored_maze.grid
+    finish_x, finish_y = (room.stored_maze.width - 1) // 2, (room.stored_maze.height - 1) // 2
+    # the neighbor the maze opens the finish cell to, and the next cell on the way back from it
+    if grid[finish_y * 2, finish_x * 2 - 1] == CellType.Passage.value: neighbor = (finish_x - 1, finish_y)
+    else: neighbor = (finish_x, finish_y - 1)
+    x, y = neighbor
+    next_cell = next((x + dx, y + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]
+                     if (x + dx, y + dy) != (finish_x, finish_y) and 0 <= x + dx <= finish_x and 0 <= y + dy <= finish_y
+                     and grid[y * 2 + dy, x * 2 + dx] == CellType.Passage.value)
+
+    place(room, [(finish_x, finish_y), neighbor, next_cell])
+    _, ranking = room.compute_ranking()
+    assert ranking[:, 1].tolist() == [0, 1, 2]
+    assert ranking[:, 0].tolist() == [1, 2, 3]
@@ -0,0 +1,56 @@
+# Requests of the members of a room change it only on its tick - on the thread of the tick, in the order they were sent
+import threading
+import pytest
+from Benchmarks.bench_helpers import create_bench_room
+from Benchmarks.room_queue_bench import QueueClient, RecordingRoom
+from protocol import MsgType, build_network_msg
+
+NUM_CLIENTS = 4
+REQUESTS_PER_CLIENT = 500
+
+@pytest.fixture
+def room_and_clients() -> tuple[RecordingRoom, list[QueueClient]]:
+    room = create_bench_room(NUM_CLIENTS, RecordingRoom)
+    clients = [QueueClient(account_id) for account_id in range(NUM_CLIENTS)]
+    for client in clients:
+        room.add_client(client)
+    return room, clients
+
+def test_tick_seats_joining_players(room_and_clients):
+    room, clients = room_and_clients
+    assert len(room.players) == 0
+    assert all(c.curr_room == room.id for c in clients)
+    room.tick()
+    assert len(room.players) == NUM_CLIENTS
+
+def test_requests_run_on_the_tick_in_order(room_and_clients):
+    room, clients = room_and_clients
+    room.tick()
+
+    # every thread sends SET_READY True, False, True, ...
+    def send_requests(client: QueueClient):
+        for i in range(REQUESTS_PER_CLIENT):
+            client.receive(build_network_msg(None, MsgType.SET_READY, i % 2 == 0))
+    threads = [threading.Thread(target=send_requests, args=[client]) for client in clients]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert len(room.fulfilled) == 0
+
+    room.tick()
+    assert len(room.fulfilled) == NUM_CLIENTS * REQUESTS_PER_CLIENT
+    assert all(thread == threading.get_ident() for thread, _, _ in room.fulfilled)
+    for client in clients:
+        sent = [data for _, sender, data in room.fulfilled if sender.client_info is client]
+        assert sent == [i % 2 == 0 for i in range(REQUESTS_PER_CLIENT)]
+    assert all(p.isReady == (REQUESTS_PER_CLIENT % 2 == 1) for p in room.players)
+
+def test_leaving_player_is_in_the_lobby_right_away(room_and_clients):
+    room, clients = room_and_clients
+    room.tick()
+    leaver = clients[0]
+    leaver.receive(build_network_msg(None, MsgType.LEAVE_ROOM))
+    assert leaver.curr_room == None
+    leaver.receive(build_network_msg(None, MsgType.SET_READY, True))
+    room.tick()
+    assert len(room.players) == NUM_CLIENTS - 1
+    assert room.fulfilled[-1][1].client_info is leaver and room.fulfilled[-1][2] == None
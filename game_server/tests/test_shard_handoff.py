@@ -0,0 +1,36 @@
+# A session handed to another process over a ShardChannel continues where it stopped
+import socket
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from Benchmarks.shard_bench import connect, hand_off
+from ProtocolHelpers.GameCryptoEngine import SERVER_NONCE_PREFIX
+from ProtocolHelpers.ShardChannel import ShardChannel
+from protocol import MsgType, build_network_msg
+
+@pytest.fixture
+def listener():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        yield listener
+
+def test_handed_off_session_continues(listener):
+    front_door, worker_sock = ShardChannel.pair()
+    worker = ShardChannel(worker_sock)
+    client, secure_sock = connect(listener, AESGCM.generate_key(bit_length=256))
+
+    first, second = build_network_msg(None, MsgType.JOIN_ROOM, {"id": "room"}), build_network_msg(None, MsgType.SET_READY, True)
+    secure_sock.send_str(first)
+    client.send(first, second) # a request and the next one, in a single write
+    assert secure_sock.recv_str() == first
+    continued = hand_off(secure_sock, front_door, worker)
+    assert continued.recv_str() == second # the bytes read by the front door came along
+    continued.send_str(second)
+    (nonce1, msg1), (nonce2, msg2) = client.recv(), client.recv()
+    assert (msg1, msg2) == (first, second)
+    assert nonce1 == SERVER_NONCE_PREFIX + (0).to_bytes(8, "big")
+    assert nonce2 == SERVER_NONCE_PREFIX + (1).to_bytes(8, "big")
+    continued.close()
+    client.sock.close()
+    front_door.close()
+    worker.close()
@@ -0,0 +1,59 @@
+# The UDP position channel on localhost - a real UDP socket plays the client
+import json
+import os
+import socket
+import time
+from types import SimpleNamespace
+import pytest
+from Benchmarks.udp_bench import update_pos_msg
+from ProtocolHelpers.GameCryptoEngine import SERVER_NONCE_PREFIX
+from ProtocolHelpers.UdpChannel import CLIENT_NONCE_PREFIX, UdpPositionChannel, UdpSession
+from protocol import MsgType, build_network_msg
+
+RECV_TIMEOUT_SEC = 1.
+
+def wait_for(condition) -> bool:
+    deadline = time.monotonic() + RECV_TIMEOUT_SEC
+    while not condition() and time.monotonic() < deadline: time.sleep(0.001)
+    return condition()
+
+# (channel, server end of the session, client end of the session, client socket, positions received by the server)
+@pytest.fixture
+def udp():
+    channel = UdpPositionChannel("127.0.0.1", 0)
+    channel.start()
+    received: list[str] = []
+    session_key = os.urandom(32)
+    server_session = channel.register(SimpleNamespace(emit_udp_position=received.append), session_key)
+    client_session = UdpSession(session_key, server_session.channel_id, CLIENT_NONCE_PREFIX, SERVER_NONCE_PREFIX)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(RECV_TIMEOUT_SEC)
+    sock.connect(("127.0.0.1", channel.port))
+    yield channel, server_session, client_session, sock, received
+    sock.close()
+    channel.close()
+
+def test_ping_activates_the_channel(udp):
+    _, server_session, client_session, sock, _ = udp
+    assert not server_session.is_active
+    sock.send(client_session.seal(build_network_msg(None, MsgType.UDP_PING).encode()))
+    pong = client_session.open(sock.recv(2048))
+    assert json.loads(pong)["msgType"] == MsgType.UDP_PING.value
+    assert server_session.is_active
+
+def test_stale_forged_and_unknown_datagrams_are_dropped(udp):
+    channel, server_session, client_session, sock, received = udp
+    positions = [update_pos_msg(0.1 * i, 0.2) for i in range(3)]
+    datagrams = [client_session.seal(p) for p in positions]
+    for datagram in datagrams:
+        sock.send(datagram)
+    assert wait_for(lambda: len(received) == len(positions))
+    assert [m.encode() for m in received] == positions
+
+    sock.send(datagrams[1]) # replayed
+    forged = bytearray(client_session.seal(update_pos_msg(0.9, 0.9)))
+    forged[-1] ^= 1
+    sock.send(bytes(forged))
+    sock.send(os.urandom(8) + forged[8:]) # a channel that doesn't exist
+    assert wait_for(lambda: server_session.stale_count == 1 and server_session.rejected_count == 1 and channel.unknown_count == 1)
+    assert len(received) == len(positions)